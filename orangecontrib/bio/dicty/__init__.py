@@ -37,8 +37,14 @@ except AttributeError:
 
 import Orange
 
+try:
+    from Orange.data.util import SharedComputeValue
+except ImportError:
+    SharedComputeValue = None
+
 from ..utils.compat import *
 from ..utils import serverfiles
+from ..utils import stats
 from . import phenotypes
 
 
@@ -153,6 +159,12 @@ def median(l):
     else:
         return numpy.median(l)
 
+
+#: Averaging functions (of known values) with an equivalent reduction
+#: in :func:`stats.group_reduce`
+_GROUP_REDUCTIONS = {median: "median", numpy.median: "median",
+                     numpy.mean: "mean", min: "min", max: "max"}
+
 socket.setdefaulttimeout(60)
 
 verbose = 0
@@ -1372,6 +1384,16 @@ def averageAttributes(data, joinc="DDB", fn=median):
     if verbose:
         print("Averaging attributes")
 
+    how = _GROUP_REDUCTIONS.get(fn)
+    if OR3 and how is not None:
+        # code the rows by their join value and reduce the groups at once
+        codes = {}
+        groups = [codes.setdefault(str(ex[joinc]), len(codes))
+                  for ex in data]
+        valueso = sorted(codes, key=codes.get)
+        X = stats.group_reduce(data.X, groups, how, ngroups=len(codes))
+        return create_table(data.domain, X, None, [[v] for v in valueso])
+
     valueso = []
     valuess = set(valueso)
 
@@ -1601,6 +1623,50 @@ def join_ats(atts, fnshow=None):
                 od[k] = fnshow([ at[k] for at in atts ])
     return od
 
+class _GroupMedians(object):
+    """
+    Compute the medians of groups of attributes (columns) of the data.
+    """
+    def __init__(self, groups, ngroups):
+        self.groups = groups
+        self.ngroups = ngroups
+
+    def __call__(self, data):
+        X = numpy.asarray(data.X)
+        return stats.group_reduce(X.T, self.groups, "median",
+                                  ngroups=self.ngroups).T
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and
+                self.ngroups == other.ngroups and
+                numpy.array_equal(self.groups, other.groups))
+
+    def __hash__(self):
+        return hash((type(self), self.ngroups, self.groups.tobytes()))
+
+
+if SharedComputeValue is not None:
+    class _JoinedReplicates(SharedComputeValue):
+        """
+        The median of a group of replicates (one column of the shared
+        :class:`_GroupMedians` result).
+        """
+        def __init__(self, compute_shared, index):
+            SharedComputeValue.__init__(self, compute_shared)
+            self.index = index
+
+        def compute(self, data, shared_data):
+            return shared_data[:, self.index]
+
+        def __eq__(self, other):
+            return (type(self) is type(other) and
+                    self.compute_shared == other.compute_shared and
+                    self.index == other.index)
+
+        def __hash__(self):
+            return hash((type(self), self.compute_shared, self.index))
+
+
 def join_replicates(data, ignorenames=["replicate", "id", "name", "map_stop1"], namefn=None, avg=median, fnshow=None):
     """ Join replicates by median. 
     Default parameters work for PIPA data.
@@ -1637,6 +1703,14 @@ def join_replicates(data, ignorenames=["replicate", "id", "name", "map_stop1"],
 
     natts = []
 
+    if OR3 and SharedComputeValue is not None:
+        # the medians of all groups are computed at once and shared by
+        # the joined attributes
+        groups = numpy.zeros(len(data.domain.attributes), dtype=int)
+        for i, elements in enumerate(d.values()):
+            groups[elements] = i
+        group_medians = _GroupMedians(groups, len(d))
+
     def nativeOrNone(val):
         if val == NAN: 
             return None
@@ -1692,8 +1766,12 @@ def join_replicates(data, ignorenames=["replicate", "id", "name", "map_stop1"],
             def avgel(ex, el):
                 return Orange.data.Value(avgnone([ nativeOrNone(ex[ind]) for ind in el ]))
             a.getValueFrom = lambda ex,rw,el=elements: avgel(ex,el)
+        elif SharedComputeValue is not None:
+            a = ContinuousVariable(
+                name=aname,
+                compute_value=_JoinedReplicates(group_medians, len(natts)))
         else:
-            a = ContinuousVariable(name=aname, compute_value=lambda d,el=elements: numpy.nanmedian(data[:,el], axis=1))
+            a = ContinuousVariable(name=aname, compute_value=lambda d,el=elements: numpy.nanmedian(d.X[:,el], axis=1))
         a.attributes.update(atdic)
         natts.append(a)
 
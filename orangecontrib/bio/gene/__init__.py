@@ -3,7 +3,8 @@ import sys
 import os
 import time
 
-from ..utils import serverfiles
+from ..utils import serverfiles, arrayfile
+from ..utils.lineindex import LineIndex
 
 from .. import taxonomy as obiTaxonomy
 from .. import kegg as obiKEGG
@@ -35,6 +36,10 @@ except ImportError:
     from ..utils import environ
 
 from functools import reduce
+from bisect import bisect_left
+
+import numpy
+import scipy.sparse
 
 default_database_path = serverfiles.localpath("NCBI_geneinfo")
 
@@ -81,13 +86,61 @@ class GeneHistory(object):
             setattr(self, attr, value)
 
 
+class GeneHistoryMap(object):
+    """
+    A read only mapping of discontinued gene ids to :class:`GeneHistory`
+    objects (lines are parsed on access).
+    """
+    def __init__(self, index):
+        self.index = index
+
+    def __getitem__(self, key):
+        return GeneHistory(self.index.line(key))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def keys(self):
+        return list(self.index)
+
+    def values(self):
+        return [self[key] for key in self.index]
+
+    def items(self):
+        return [(key, self[key]) for key in self.index]
+
+
 class NCBIGeneInfo(dict):
+    """
+    A dictionary like object mapping NCBI gene ids to :class:`GeneInfo`
+    objects.
+
+    Gene info lines are indexed by gene id (see
+    :class:`~orangecontrib.bio.utils.lineindex.LineIndex`) and are only
+    read and parsed when requested. Entries added with item assignment
+    are kept in memory.
+    """
     TAX_MAP = {
             "2104": "272634",  # Mycoplasma pneumoniae
             "4530": "39947",  # Oryza sativa
             "5833": "36329",  # Plasmodium falciparum
             "4932": "559292",  # Saccharomyces cerevisiae
             }
+
+    #: Tags whose values are stored in the gene info index
+    INDEXED_TAGS = ("symbol", "locus_tag", "chromosome", "type")
        
     def __init__(self, organism, genematcher=None):
         """ An dictionary like object for accessing NCBI gene info
@@ -102,27 +155,40 @@ class NCBIGeneInfo(dict):
 
 
         fname = serverfiles.localpath_download("NCBI_geneinfo", "gene_info.%s.db" % self.taxid)
-        file = open(fname, "rt")
-        self.update(dict([(line.split("\t", 3)[1], line) for line in file.read().splitlines() if line.strip() and not line.startswith("#")]))
+        tags = GeneInfo.NCBI_GENEINFO_TAGS
+        self._index = LineIndex.open(
+            fname, tags.index("gene_id"),
+            columns=[tags.index(tag) for tag in self.INDEXED_TAGS])
 
+        # targets are set on first use of the matcher
         self.matcher = genematcher
-        if self.matcher == None:
+
+    def _get_matcher(self):
+        if self._matcher == None:
             if self.taxid == '352472':
-                self.matcher = matcher([GMNCBI(self.taxid), GMDicty(), [GMNCBI(self.taxid), GMDicty()]])
+                self._matcher = matcher([GMNCBI(self.taxid), GMDicty(), [GMNCBI(self.taxid), GMDicty()]])
             else:
-                self.matcher = matcher([GMNCBI(self.taxid)])
+                self._matcher = matcher([GMNCBI(self.taxid)])
+        if not self._matcher_targets:
+            #if this is done with a gene matcher, pool target names
+            self._matcher.set_targets(self.keys())
+            self._matcher_targets = True
+        return self._matcher
+
+    def _set_matcher(self, matcher):
+        self._matcher = matcher
+        self._matcher_targets = False
+
+    matcher = property(_get_matcher, _set_matcher)
 
-        #if this is done with a gene matcher, pool target names
-        self.matcher.set_targets(self.keys())
-        
     def history(self):
         if getattr(self, "_history", None) is None:
             fname = serverfiles.localpath_download("NCBI_geneinfo", "gene_history.%s.db" % self.taxid)
             try:
-                self._history = dict([(line.split("\t")[2], GeneHistory(line)) for line in open(fname, "rb").read().splitlines()])
-                
+                self._history = GeneHistoryMap(LineIndex.open(
+                    fname, GeneHistory.NCBI_GENE_HISTORY_TAGS.index("discontinued_gene_id")))
             except Exception as ex:
-                print >> sys.srderr, "Loading NCBI gene history failed.", ex
+                sys.stderr.write("Loading NCBI gene history failed. %s\n" % ex)
                 self._history = {}
         return self._history
         
@@ -177,7 +243,48 @@ class NCBIGeneInfo(dict):
 
     def __getitem__(self, key):
 #        return self.get(gene_id, self.matcher[gene_id])
-        return GeneInfo(dict.__getitem__(self, key))
+        if dict.__contains__(self, key):
+            return GeneInfo(dict.__getitem__(self, key))
+        return GeneInfo(self._index.line(key))
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self._index
+
+    def __len__(self):
+        return len(self._index) + len(self._extra_keys())
+
+    def _extra_keys(self):
+        # keys of assigned entries not in the index
+        return [key for key in dict.keys(self) if key not in self._index]
+
+    def __iter__(self):
+        for key in self._index:
+            yield key
+        for key in self._extra_keys():
+            yield key
+
+    def iterkeys(self):
+        return iter(self)
+
+    def keys(self):
+        return list(self)
+
+    def field_values(self, tag, gene_ids):
+        """
+        Return a list of `tag` values (one of
+        :obj:`GeneInfo.NCBI_GENEINFO_TAGS`) for all `gene_ids` (None for
+        unknown genes). Values of :obj:`INDEXED_TAGS` are read from
+        the index without reading the gene info lines.
+        """
+        gene_ids = list(gene_ids)
+        if tag not in self.INDEXED_TAGS or dict.__len__(self):
+            infos = [self.get(gene_id) for gene_id in gene_ids]
+            return [getattr(info, tag) if info is not None else None
+                    for info in infos]
+
+        col = GeneInfo.NCBI_GENEINFO_TAGS.index(tag)
+        values = self._index.column_values(col, gene_ids)
+        return [None if value == "-" else value for value in values]
 
     def __setitem__(self, key, value):
         if type(value) == str:
@@ -192,8 +299,8 @@ class NCBIGeneInfo(dict):
             return def_
 
     def itervalues(self):
-        for val in dict.itervalues(self):
-            yield GeneInfo(val)
+        for key in self:
+            yield self[key]
 
     def iteritems(self):
         for key, val in zip(self.iterkeys(), self.itervalues()):
@@ -207,10 +314,10 @@ class NCBIGeneInfo(dict):
             return list(self.iteritems())
     else:
         def values(self):
-            return map(GeneInfo, super().values())
+            return self.itervalues()
 
         def items(self):
-            return ((key, GeneInfo(value)) for key, value in super().items())
+            return self.iteritems()
 
     @staticmethod
     def get_geneinfo_from_ncbi(file, progressCallback=None):
@@ -447,6 +554,248 @@ def join_sets_l(lsets, lower=False):
         current = join_sets(current, b, lower=lower)
     return current
 
+def join_aliases(sources, lower=False):
+    """
+    Join groups of aliases from all `sources` (lists of sets of gene
+    aliases). Groups are joined if they share at least one alias,
+    either directly or through other groups (the joined groups are
+    connected components, found with a disjoint-set forest). If lower
+    is True, lower case forms of gene aliases are compared.
+
+    Returns a list of joined sets of aliases.
+    """
+    groups = [group for source in sources for group in source]
+    parent = list(range(len(groups)))
+
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:  # path compression
+            parent[i], i = root, parent[i]
+        return root
+
+    first = {}  # alias: index of the first group containing it
+    for i, group in enumerate(groups):
+        for alias in group:
+            j = first.setdefault(alias.lower() if lower else alias, i)
+            if j != i:
+                ri, rj = find(i), find(j)
+                if ri != rj:
+                    parent[max(ri, rj)] = min(ri, rj)
+
+    joined = {}
+    for i, group in enumerate(groups):
+        root = find(i)
+        if root in joined:
+            joined[root].update(group)
+        else:
+            joined[root] = set(group)
+    return [joined[root] for root in sorted(joined)]
+
+
+try:
+    _intern = sys.intern
+except AttributeError:
+    _intern = intern
+
+
+class AliasIndex(object):
+    """
+    A compact mapping of gene aliases to indices of groups of aliases
+    (built by :func:`create_alias_index`).
+
+    Aliases are stored in a sorted sequence `names`, and the group
+    indices of the i-th alias are ``groups[offsets[i]:offsets[i + 1]]``.
+    Missing aliases map to an empty list.
+    """
+    def __init__(self, names, offsets, groups, ngroups=None):
+        self.names = names
+        self.offsets = offsets
+        self.groups = groups
+        if ngroups is None:
+            ngroups = int(groups.max()) + 1 if len(groups) else 0
+        self.ngroups = ngroups
+        self._names_array = None
+
+    def _position(self, alias):
+        i = bisect_left(self.names, alias)
+        if i < len(self.names) and self.names[i] == alias:
+            return i
+        return -1
+
+    def __getitem__(self, alias):
+        i = self._position(alias)
+        if i < 0:
+            return []
+        return self.groups[self.offsets[i]:self.offsets[i + 1]].tolist()
+
+    get = __getitem__
+
+    def __contains__(self, alias):
+        return self._position(alias) >= 0
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def positions(self, aliases):
+        """
+        Return an array of positions of `aliases` in :obj:`names`
+        (-1 for aliases not in the index).
+        """
+        if self._names_array is None:
+            self._names_array = numpy.array(list(self.names), dtype=object)
+        names = self._names_array
+        keys = numpy.empty(len(aliases), dtype=object)
+        keys[:] = aliases
+        if not len(names):
+            return numpy.full(len(keys), -1, dtype=int)
+        pos = numpy.searchsorted(names, keys)
+        pos[pos == len(names)] = 0
+        return numpy.where(names[pos] == keys, pos, -1)
+
+    def membership(self, aliases):
+        """
+        Return a sparse (aliases x groups) matrix of group memberships
+        of `aliases`.
+        """
+        pos = self.positions(aliases)
+        found = numpy.flatnonzero(pos >= 0)
+        starts = self.offsets[pos[found]]
+        counts = self.offsets[pos[found] + 1] - starts
+        rows = numpy.repeat(found, counts)
+        # positions of all groups of found aliases in `groups`
+        shifts = numpy.arange(counts.sum()) - \
+            numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        cols = self.groups[numpy.repeat(starts, counts) + shifts]
+        return scipy.sparse.csr_matrix(
+            (numpy.ones(len(rows), dtype=numpy.int32), (rows, cols)),
+            shape=(len(pos), self.ngroups))
+
+
+def create_alias_index(groups, lower=False):
+    """
+    Return an :class:`AliasIndex` of aliases to the group index (a compact
+    equivalent of :func:`create_mapping`). If lower is True, lower case
+    forms of gene aliases are indexed.
+    """
+    aliases = []
+    ids = []
+    for i, group in enumerate(groups):
+        for alias in group:
+            aliases.append(alias.lower() if lower else alias)
+            ids.append(i)
+
+    aliases = numpy.array(aliases, dtype=object)
+    ids = numpy.array(ids, dtype=numpy.int32)
+    order = numpy.argsort(aliases, kind="mergesort")
+    aliases, ids = aliases[order], ids[order]
+
+    # drop repeated (alias, group) pairs (only possible with lower)
+    new_alias = numpy.ones(len(aliases), dtype=bool)
+    new_alias[1:] = aliases[1:] != aliases[:-1]
+    keep = new_alias.copy()
+    keep[1:] |= ids[1:] != ids[:-1]
+    ids = ids[keep]
+    new_alias = new_alias[keep]
+
+    starts = numpy.flatnonzero(new_alias)
+    offsets = numpy.append(starts, len(ids)).astype(numpy.int64)
+    names = [_intern(alias) for alias in aliases[keep][starts]]
+    return AliasIndex(names, offsets, ids)
+
+
+class AliasGroups(object):
+    """
+    A read only sequence of sets of aliases stored in packed arrays (as
+    loaded by :func:`load_alias_index`). The sets are built on access.
+    """
+    def __init__(self, aliases, offsets):
+        self.aliases = aliases
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return set(self.aliases[i] for i in range(start, end))
+
+    def __iter__(self):
+        aliases = list(self.aliases)
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield set(aliases[start:end])
+
+
+#: Version of the alias index file format
+ALIAS_INDEX_VERSION = 1
+
+
+def save_alias_index(filename, version, aliases, index, lower):
+    """
+    Save gene `aliases` (a list of sets) and their :class:`AliasIndex`
+    to `filename`.
+    """
+    flat = [alias for group in aliases for alias in group]
+    group_offsets = numpy.zeros(len(aliases) + 1, dtype=numpy.int64)
+    group_offsets[1:] = numpy.cumsum([len(group) for group in aliases])
+    arrays = {"group_offsets": group_offsets,
+              "offsets": numpy.asarray(index.offsets, dtype=numpy.int64),
+              "groups": numpy.asarray(index.groups, dtype=numpy.int32)}
+    arrayfile.save_strings(arrays, "aliases", flat)
+    arrayfile.save_strings(arrays, "names", index.names)
+    meta = {"format": ALIAS_INDEX_VERSION, "version": version,
+            "lower": bool(lower), "ngroups": index.ngroups}
+    arrayfile.save(filename, arrays, meta=meta)
+
+
+def load_alias_index(filename, version, lower, mmap=True):
+    """
+    Load gene aliases and their index saved with :func:`save_alias_index`.
+    Return an (:class:`AliasGroups`, :class:`AliasIndex`) tuple. Raise
+    :class:`~orangecontrib.bio.utils.arrayfile.FormatError` if the file
+    is incompatible (or if its version does not match `version`, unless
+    `version` is None).
+
+    With `mmap` the arrays are memory mapped (and shared between
+    processes loading the same file).
+    """
+    meta, arrays = arrayfile.load(filename, mmap=mmap)
+    if not meta or meta.get("format") != ALIAS_INDEX_VERSION or \
+            meta.get("lower") != bool(lower) or \
+            (version is not None and meta.get("version") != version):
+        raise arrayfile.FormatError("Incompatible alias index")
+    aliases = AliasGroups(arrayfile.load_strings(arrays, "aliases"),
+                          arrays["group_offsets"])
+    index = AliasIndex(arrayfile.load_strings(arrays, "names"),
+                       arrays["offsets"], arrays["groups"],
+                       ngroups=meta["ngroups"])
+    return aliases, index
+
+
+def auto_alias_index(filename, version, func, lower):
+    """
+    Load gene aliases and their index from `filename` (see
+    :func:`load_alias_index`). If the file does not exist or has a
+    different version, create aliases with `func` and save them first.
+    """
+    try:
+        return load_alias_index(filename, version, lower)
+    except Exception:
+        pass
+
+    aliases = [set(group) for group in func()]
+    index = create_alias_index(aliases, lower)
+    save_alias_index(filename, version, aliases, index, lower)
+    return aliases, index
+
+
 class Matcher(object):
     """
     Matches an input gene to some target gene (set in advance).
@@ -472,6 +821,23 @@ class Matcher(object):
         mat = self.match(gene)
         return mat[0] if len(mat) == 1 else None
 
+    def match_many(self, genes):
+        """Return a list of matches (as returned by :obj:`match`) for all `genes`."""
+        return self.matcho.match_many(genes)
+
+    def umatch_many(self, genes):
+        """Return a list of unique matching target genes (or None) for all `genes`."""
+        return self.matcho.umatch_many(genes)
+
+    def umatch_indices(self, genes):
+        """
+        Return a tuple of arrays (indices, ambiguous) for all `genes`:
+        indices of the unique matching genes in the targets (-1 if a gene
+        has no or multiple matches) and flags of genes with multiple
+        matches.
+        """
+        return self.matcho.umatch_indices(genes)
+
     def explain(self, gene):
         """ 
         Return gene matches with explanations as lists of tuples:
@@ -540,7 +906,7 @@ class MatcherAliases(Matcher):
     def __init__(self, aliases, ignore_case=True):
         self.aliases = aliases
         self.ignore_case = ignore_case
-        self.mdict = create_mapping(self.aliases, self.ignore_case)
+        self.mdict = create_alias_index(self.aliases, self.ignore_case)
 
     def to_ids(self, gene):
         """ Return ids of sets of aliases the gene belongs to. """
@@ -548,11 +914,20 @@ class MatcherAliases(Matcher):
             gene = gene.lower()
         return self.mdict[gene]
 
+    def membership(self, genes):
+        """
+        Return a sparse (genes x sets of aliases) membership matrix.
+        """
+        if self.ignore_case:
+            genes = [gene.lower() for gene in genes]
+        return self.mdict.membership(genes)
+
     def set_targets(self, targets):
         """
         A reverse dictionary is made according to each target's membership
         in the sets of aliases.
         """
+        targets = list(targets) #used twice
         d = defaultdict(list)
         #d = id: [ targets ], where id is index of the set of aliases
         for target in targets:
@@ -560,7 +935,7 @@ class MatcherAliases(Matcher):
             if ids != None:
                 for id in ids:
                     d[id].append(target)
-        mo = MatchAliases(d, self)
+        mo = MatchAliases(d, self, targets)
         self.matcho = mo #backward compatibility - default match object
         return mo
 
@@ -572,16 +947,58 @@ class MatcherAliases(Matcher):
 
 class Match(object):
 
+    def __init__(self, targets=()):
+        self.targets = list(targets)
+
     def umatch(self, gene):
         """Returns an unique (only one matching target) target or None"""
         mat = self.match(gene)
         return mat[0] if len(mat) == 1 else None
- 
+
+    def match_many(self, genes):
+        """Returns a list of matches for all genes"""
+        return [self.match(gene) for gene in genes]
+
+    def umatch_many(self, genes):
+        """Returns a list of unique targets (or None) for all genes"""
+        indices, _ = self.umatch_indices(genes)
+        targets = self.targets
+        return [targets[i] if i >= 0 else None for i in indices.tolist()]
+
+    def umatch_indices(self, genes):
+        """
+        Returns a tuple of arrays (indices, ambiguous): indices of unique
+        targets (-1 if none) and flags of genes with multiple matches.
+        """
+        counts, indices = self._match_counts(list(genes))
+        return numpy.where(counts == 1, indices, -1), counts > 1
+
+    def _target_index(self):
+        # target: index of its first occurrence in targets
+        index = {}
+        for i, target in enumerate(self.targets):
+            index.setdefault(target, i)
+        return index
+
+    def _match_counts(self, genes):
+        """
+        Return arrays of numbers of matches for genes and indices of
+        (any) matching targets (-1 if none).
+        """
+        index = self._target_index()
+        matches = self.match_many(genes)
+        counts = numpy.array([len(m) for m in matches], dtype=int)
+        indices = numpy.array([index[m[0]] if m else -1 for m in matches],
+                              dtype=int)
+        return counts, indices
+
 class MatchAliases(Match):
 
-    def __init__(self, to_targets, parent):
+    def __init__(self, to_targets, parent, targets=()):
+        Match.__init__(self, targets)
         self.to_targets = to_targets
         self.parent = parent
+        self._to_unique = None
 
     def match(self, gene):
         """
@@ -591,9 +1008,43 @@ class MatchAliases(Match):
         """
         inputgeneids = self.parent.to_ids(gene)
         #return target genes with same ids
-        return list(set( \
-            reduce(lambda x,y: x+y, 
-                [ self.to_targets[igid] for igid in inputgeneids ], [])))
+        return list(set(target for igid in inputgeneids
+                        for target in self.to_targets.get(igid, ())))
+
+    def _unique_targets(self):
+        """
+        Return a tuple (unique targets, indices of their first occurrence
+        in targets, sparse (sets of aliases x unique targets) matrix).
+        """
+        if self._to_unique is None:
+            index = self._target_index()
+            unique = sorted(index, key=index.get)
+            first = numpy.array([index[t] for t in unique], dtype=int)
+            membership = self.parent.membership(unique).T.tocsr()
+            self._to_unique = unique, first, membership
+        return self._to_unique
+
+    def _match_matrix(self, genes):
+        # sparse (genes x unique targets) matrix of matches
+        _, _, targets = self._unique_targets()
+        return self.parent.membership(genes).dot(targets).tocsr()
+
+    def match_many(self, genes):
+        unique, _, _ = self._unique_targets()
+        matches = self._match_matrix(list(genes))
+        indices = [unique[j] for j in matches.indices.tolist()]
+        indptr = matches.indptr.tolist()
+        return [indices[start:end]
+                for start, end in zip(indptr[:-1], indptr[1:])]
+
+    def _match_counts(self, genes):
+        _, first, _ = self._unique_targets()
+        matches = self._match_matrix(genes)
+        counts = numpy.diff(matches.indptr)
+        indices = numpy.full(len(counts), -1, dtype=int)
+        matched = numpy.flatnonzero(counts)
+        indices[matched] = first[matches.indices[matches.indptr[matched]]]
+        return counts, indices
 
     def explain(self, gene):
         inputgeneids = self.parent.to_ids(gene)
@@ -609,6 +1060,9 @@ class MatcherAliasesPickled(MatcherAliases):
     Loading of gene aliases is done lazily: they are loaded when they are
     needed. Loading of aliases for components of joined matchers is often 
     unnecessary and is therefore avoided. 
+
+    Aliases and their index are saved in a binary file in the buffer path,
+    which is memory mapped on load (see :func:`load_alias_index`).
     """
     
     def set_aliases(self, aliases):
@@ -616,7 +1070,7 @@ class MatcherAliasesPickled(MatcherAliases):
 
     def get_aliases(self):
         if not self.saved_aliases: #loads aliases if not loaded
-            self.aliases = self.load_aliases()
+            self.aliases, self.mdict = self.load_index()
         #print "size of aliases ", len(self.saved_aliases)
         return self.saved_aliases
 
@@ -625,7 +1079,11 @@ class MatcherAliasesPickled(MatcherAliases):
     def get_mdict(self):
         """ Creates mdict. Aliases are loaded if needed. """
         if not self.saved_mdict:
-            self.saved_mdict = create_mapping(self.aliases, self.ignore_case)
+            if self.saved_aliases:
+                self.saved_mdict = create_alias_index(self.aliases,
+                                                      self.ignore_case)
+            else:
+                self.aliases, self.mdict = self.load_index()
         return self.saved_mdict
 
     def set_mdict(self, mdict):
@@ -636,6 +1094,15 @@ class MatcherAliasesPickled(MatcherAliases):
     def set_targets(self, targets):
         return MatcherAliases.set_targets(self, targets)
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if isinstance(state.get("saved_aliases"), AliasGroups):
+            # do not copy memory mapped aliases; they are mapped again
+            # from the buffer file when needed
+            state["saved_aliases"] = []
+            state["saved_mdict"] = {}
+        return state
+
     def filename(self):
         """ Returns file name for saving aliases. """
         notImplemented()
@@ -661,6 +1128,20 @@ class MatcherAliasesPickled(MatcherAliases):
             #if either file version of version is None, do not pickle
             return self.create_aliases()
 
+    def load_index(self):
+        """
+        Return a tuple of aliases and their index. Both are stored in
+        a memory mapped binary file in the buffer path (unless aliases
+        are loaded from a given file or can not be stored).
+        """
+        fn = self.filename()
+        if fn is None or isinstance(fn, tuple):
+            aliases = list(self.load_aliases())
+            return aliases, create_alias_index(aliases, self.ignore_case)
+        filename = os.path.join(buffer_path(), fn + ".bin")
+        return auto_alias_index(filename, self.create_aliases_version(),
+                                self.create_aliases, self.ignore_case)
+
     def __init__(self, ignore_case=True):
         self.aliases = []
         self.mdict = {}
@@ -747,11 +1228,11 @@ class MatcherAliasesDictyBase(MatcherAliasesPickled):
         #db.info, db.mappings
         infoa = [ set([id,name]) | set(aliases) for id,(name,aliases,_) in db.info.items() ]
         mappingsa = [ set(filter(None, a)) for a in db.mappings ]
-        joineda = join_sets(infoa, mappingsa, lower=True)
+        joineda = join_aliases([infoa, mappingsa], lower=True)
         return joineda
 
     def create_aliases_version(self):
-        return "v1." + obiDicty.DictyBase.version()
+        return "v2." + obiDicty.DictyBase.version()
 
     def filename(self):
         return "dictybase" 
@@ -842,7 +1323,8 @@ class MatcherAliasesEnsembl(MatcherAliasesPickled):
 class MatcherAliasesPickledJoined(MatcherAliasesPickled):
     """
     Creates a new matcher by joining gene aliases from different data sets.
-    Sets of aliases are joined if they contain common genes.
+    Sets of aliases are joined if they contain common genes (also through
+    other sets, see :func:`join_aliases`).
 
     The joined gene matcher can only be pickled if the source gene
     matchers are picklable.
@@ -859,11 +1341,11 @@ class MatcherAliasesPickledJoined(MatcherAliasesPickled):
             return None
 
     def create_aliases(self):
-        return join_sets_l([ mat.aliases for mat in self.matchers ], lower=self.ignore_case)
+        return join_aliases([ mat.aliases for mat in self.matchers ], lower=self.ignore_case)
 
     def create_aliases_version(self):
         try:
-            return "v4_" + "__".join([ mat.create_aliases_version() for mat in self.matchers ])
+            return "v5_" + "__".join([ mat.create_aliases_version() for mat in self.matchers ])
         except:
             return None
 
@@ -899,7 +1381,7 @@ class MatcherSequence(Matcher):
                                 #be problematic if a generator was passed
         for matcher in self.matchers:
             ms.append(matcher.set_targets(targets))
-        om = MatchSequence(ms)
+        om = MatchSequence(ms, targets)
         self.matcho = om
         return om
 
@@ -912,7 +1394,8 @@ class MatcherSequence(Matcher):
 
 class MatchSequence(Match):
 
-    def __init__(self, ms):
+    def __init__(self, ms, targets=()):
+        Match.__init__(self, targets)
         self.ms = ms
 
     def match(self, gene):
@@ -922,6 +1405,33 @@ class MatchSequence(Match):
                 return m
         return []
 
+    def match_many(self, genes):
+        genes = list(genes)
+        matches = [[] for _ in genes]
+        remaining = list(range(len(genes)))
+        for match in self.ms:
+            if not remaining:
+                break
+            ms = match.match_many([genes[i] for i in remaining])
+            for i, m in zip(remaining, ms):
+                matches[i] = m
+            remaining = [i for i, m in zip(remaining, ms) if not m]
+        return matches
+
+    def _match_counts(self, genes):
+        counts = numpy.zeros(len(genes), dtype=int)
+        indices = numpy.full(len(genes), -1, dtype=int)
+        remaining = numpy.arange(len(genes))
+        for match in self.ms:
+            if not len(remaining):
+                break
+            c, ind = match._match_counts([genes[i] for i in remaining])
+            matched = c > 0
+            counts[remaining[matched]] = c[matched]
+            indices[remaining[matched]] = ind[matched]
+            remaining = remaining[~matched]
+        return counts, indices
+
     def explain(self, gene):
         for match in self.ms:
             m = match.match(gene)
@@ -25,6 +25,8 @@ else:
 
 from .utils import serverfiles
 from .utils import compat
+from .utils import arrayfile
+from .utils import stats
 from . import taxonomy
 
 
@@ -117,6 +119,274 @@ class GeneData:
         self.gene_name = gene_name
         self.data = d
 
+
+class SOFTData(object):
+    """
+    Parsed contents of a GDS SOFT file.
+
+    :ivar dict info: Data set information.
+    :ivar list spots: Spot ids (sorted).
+    :ivar list genes: Gene names (sorted).
+    :ivar numpy.ndarray gene_codes: Index into `genes` for each spot.
+    :ivar numpy.ndarray X: A float32 matrix of expressions (spots x
+        samples). Unknown values are NaN.
+    """
+    def __init__(self, info, spots, genes, gene_codes, X):
+        self.info = info
+        self.spots = spots
+        self.genes = genes
+        self.gene_codes = gene_codes
+        self.X = X
+
+    @property
+    def mask(self):
+        """A boolean mask of unknown values in `X`."""
+        return numpy.isnan(self.X)
+
+    def select(self, indices):
+        """
+        Return the :class:`SOFTData` with only the spots at `indices`
+        (and their genes).
+        """
+        indices = numpy.asarray(indices)
+        used, codes = numpy.unique(self.gene_codes[indices],
+                                   return_inverse=True)
+        return SOFTData(self.info, [self.spots[i] for i in indices],
+                        [self.genes[i] for i in used],
+                        codes.astype(numpy.int32).ravel(), self.X[indices])
+
+    def spot2gene(self):
+        """Return a dictionary mapping spot ids to gene names."""
+        genes = self.genes
+        return dict((spot, genes[code]) for spot, code in
+                    zip(self.spots, self.gene_codes.tolist()))
+
+    def gene2spots(self):
+        """Return a dictionary mapping gene names to lists of spot ids."""
+        gene2spots = defaultdict(list)
+        genes = self.genes
+        for spot, code in zip(self.spots, self.gene_codes.tolist()):
+            gene2spots[genes[code]].append(spot)
+        return dict(gene2spots)
+
+
+def _parse_soft_info(lines):
+    """
+    Parse the data set information from `lines` (an iterator over the
+    lines of a SOFT file). Consume the lines up to (and including) the
+    data table header.
+    """
+    getstate = lambda x: x.split(" ")[0][1:]
+    getid = lambda x: x.rstrip().split(" ")[2]
+
+    state = None; previous_state = None
+
+    info = {"subsets" : []}
+    subset = None
+
+    # GDS information part
+    for line in lines:
+        if line[0] == "^":
+            previous_state = state; state = getstate(line)
+            if state == "SUBSET":
+                if subset:
+                    info["subsets"] += [subset]
+                subset = {"id" : getid(line)}
+            if state == "DATASET":
+                info["dataset_id"] = getid(line)
+            continue
+        if state == "DATASET":
+            if previous_state == "DATABASE":
+                tag, value = tagvalue(line)
+                info[tag] = value
+            else:
+                if subset:
+                    info["subsets"] += [subset]
+                break
+        if state == "SUBSET":
+            tag, value = tagvalue(line)
+            if tag == "description" or tag == "type":
+                subset[tag] = value
+            if tag == "sample_id":
+                subset[tag] = value.split(",")
+    for t,v in info.items():
+        if "count" in t:
+            info[t] = int(v)
+
+    # sample information
+    state = None
+    for line in lines:
+        if state == "header":
+            info["samples"] = line.rstrip().split("\t")[2:]
+            break
+        if line.startswith("!dataset_table_begin"):
+            state = "header"
+    return info
+
+
+def _soft_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return float("nan")
+
+
+def parse_soft(lines):
+    """
+    Parse a GDS SOFT file in a single pass and return :class:`SOFTData`.
+
+    :param lines: An iterator over the (text) lines of the file.
+    """
+    lines = iter(lines)
+    info = _parse_soft_info(lines)
+    nsamples = len(info.get("samples", []))
+
+    # preallocate for the reported number of spots (grown if needed)
+    X = numpy.empty((info.get("feature_count", 0), nsamples),
+                    dtype=numpy.float32)
+    spots = []
+    gene_code = {}
+    gene_codes = []
+
+    for line in lines:
+        if line.startswith("!dataset_table_end"):
+            break
+        d = line.rstrip("\r\n").split("\t", 2)
+        d += [""] * (3 - len(d))
+        spot, gene, values = d
+        try:
+            # 'null' is the only non numeric value in a valid file
+            row = list(map(float, values.replace("null", "nan").split("\t")))
+        except ValueError:
+            row = [_soft_float(v) for v in values.split("\t")]
+        if len(row) != nsamples:
+            row = (row + [float("nan")] * nsamples)[:nsamples]
+
+        i = len(spots)
+        if i >= X.shape[0]:
+            X = numpy.resize(X, (max(1024, 2 * X.shape[0]), nsamples))
+        X[i] = row
+        spots.append(spot)
+        gene_codes.append(gene_code.setdefault(gene, len(gene_code)))
+    X = X[:len(spots)]
+
+    # sort the spots (the last of the repeated spot ids is kept)
+    spots_array = numpy.empty(len(spots), dtype=object)
+    spots_array[:] = spots
+    order = numpy.argsort(spots_array, kind="mergesort")
+    spots_array = spots_array[order]
+    last = numpy.ones(len(order), dtype=bool)
+    last[:-1] = spots_array[1:] != spots_array[:-1]
+    order = order[last]
+
+    # code genes by their position in the sorted list of gene names
+    # (genes whose spots were all repeated are dropped)
+    genes = sorted(gene_code)
+    recode = numpy.empty(len(genes), dtype=numpy.int32)
+    recode[[gene_code[g] for g in genes]] = numpy.arange(len(genes))
+    gene_codes = recode[numpy.array(gene_codes, dtype=numpy.int32)[order]]
+    used, gene_codes = numpy.unique(gene_codes, return_inverse=True)
+
+    return SOFTData(info, spots_array[last].tolist(),
+                    [genes[i] for i in used],
+                    gene_codes.astype(numpy.int32).ravel(), X[order])
+
+
+def _open_soft(filename):
+    f = gzip.open(filename, "rb")
+    if six.PY3:
+        f = io.TextIOWrapper(f, encoding=SOFT_ENCODING)
+    return f
+
+
+#: Version of the binary cache of parsed data sets
+CACHE_VERSION = 1
+
+#: Merge functions with cached results (by name)
+CACHED_MERGE_FUNCTIONS = {"mean": spots_mean, "median": spots_median,
+                          "min": spots_min, "max": spots_max}
+
+
+def _merge_function_name(merge_function):
+    """
+    Return the name of the module `merge_function` (or None for other
+    functions).
+    """
+    for name, f in CACHED_MERGE_FUNCTIONS.items():
+        if f is merge_function:
+            return name
+    return None
+
+
+def cache_filename(filename, *options):
+    """
+    Return the name of a binary cache file for the SOFT file `filename`
+    in the ``cache`` subdirectory of its directory (e.g.
+    ``GEO/GDS1.soft.gz`` -> ``GEO/cache/GDS1.genes.mean.bin``).
+    """
+    dirname, base = os.path.split(filename)
+    for ext in [".gz", ".soft"]:
+        if base.endswith(ext):
+            base = base[:-len(ext)]
+    return os.path.join(dirname, "cache",
+                        ".".join([base] + [str(o) for o in options] + ["bin"]))
+
+
+def _cache_meta(filename, **options):
+    st = os.stat(filename)
+    return dict(options, version=CACHE_VERSION, source_size=st.st_size,
+                source_mtime=int(st.st_mtime))
+
+
+def _save_cache(cachename, arrays, meta):
+    try:
+        dirname = os.path.dirname(cachename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        arrayfile.save(cachename, arrays, meta=meta)
+    except (IOError, OSError):
+        pass
+
+
+def _load_cache(cachename, meta):
+    saved_meta, arrays = arrayfile.load(cachename)
+    for key, value in meta.items():
+        if saved_meta.get(key) != value:
+            raise arrayfile.FormatError("Outdated cache")
+    return saved_meta, arrays
+
+
+def read_soft(filename, cache=True):
+    """
+    Return :class:`SOFTData` for a (gzipped) SOFT file `filename`.
+
+    If `cache` is True the parsed data is stored in (and on later calls
+    memory mapped from) a binary cache file (see
+    :func:`cache_filename`).
+    """
+    if not cache:
+        with _open_soft(filename) as f:
+            return parse_soft(f)
+
+    cachename = cache_filename(filename, "data")
+    meta = _cache_meta(filename)
+    try:
+        saved_meta, arrays = _load_cache(cachename, meta)
+        return SOFTData(saved_meta["info"],
+                        arrayfile.load_strings(arrays, "spots").tolist(),
+                        arrayfile.load_strings(arrays, "genes").tolist(),
+                        arrays["gene_codes"], arrays["X"])
+    except Exception:
+        pass
+
+    with _open_soft(filename) as f:
+        data = parse_soft(f)
+    arrays = {"X": data.X, "gene_codes": data.gene_codes}
+    arrayfile.save_strings(arrays, "spots", data.spots)
+    arrayfile.save_strings(arrays, "genes", data.genes)
+    _save_cache(cachename, arrays, dict(meta, info=data.info))
+    return data
+
 class GDS():
     """ 
     Retrieval of a specific GEO DataSet as a :obj:`Orange.data.Table`.
@@ -132,26 +402,42 @@ class GDS():
 
     :param force_download: Force the download.
 
+    :param cache: Cache the parsed data set and the expressions merged
+      into genes (see :func:`read_soft`).
+
     """
 
-    def __init__(self, gdsname, verbose=False, force_download=False):
+    def __init__(self, gdsname, verbose=False, force_download=False,
+                 cache=True):
         self.gdsname = gdsname
         self.verbose = verbose
         self.force_download = force_download
+        self.cache = cache
         self.filename = serverfiles.localpath(DOMAIN, self.gdsname + ".soft.gz")
         d = os.path.dirname(self.filename)
         if not os.path.exists(d):
             os.makedirs(d)
-        self._getinfo() # to get the info
+        self._download()
+        self.soft = read_soft(self.filename, cache=cache)
+        self.info = dict(self.soft.info)
         taxid = taxonomy.search(self.info["sample_organism"], exact=True)
         self.info["taxid"] = taxid[0] if len(taxid)==1 else None
-        self._getspotmap() # to get gene->spot and spot->gene mapping
-        self.genes = sorted(self.gene2spots.keys())        
-        self.spots = sorted(self.spot2gene.keys())        
+        self.genes = self.soft.genes
+        self.spots = self.soft.spots
         self.info["gene_count"] = len(self.genes)
         self.gdsdata = None
         self.data = None
-        
+
+    @property
+    def spot2gene(self):
+        """A dictionary mapping spot ids to gene names."""
+        return (self.gdsdata or self.soft).spot2gene()
+
+    @property
+    def gene2spots(self):
+        """A dictionary mapping gene names to lists of spot ids."""
+        return (self.gdsdata or self.soft).gene2spots()
+
     def _download(self):
         """Download GDS data file if not in local cache or forced download requested."""
         localpath = serverfiles.localpath(DOMAIN)
@@ -171,82 +457,6 @@ class GDS():
                     f.read() #verify the download
                 os.rename(targetfn + "2", targetfn)
 
-    def _getinfo(self):
-        """Parse GDS data file and return a dictionary with info."""
-        getstate = lambda x: x.split(" ")[0][1:] 
-        getid = lambda x: x.rstrip().split(" ")[2]
-        self._download()
-        f = gzip.open(self.filename, "rb")
-        if six.PY3:
-            f = io.TextIOWrapper(f, encoding=SOFT_ENCODING)
-
-        state = None; previous_state = None
-    
-        info = {"subsets" : []}
-        subset = None
-    
-        # GDS information part
-        for line in f:
-            if line[0] == "^":
-                previous_state = state; state = getstate(line)
-                if state == "SUBSET":
-                    if subset:
-                        info["subsets"] += [subset]
-                    subset = {"id" : getid(line)}
-                if state == "DATASET":
-                    info["dataset_id"] = getid(line)
-                continue
-            if state == "DATASET":
-                if previous_state == "DATABASE":
-                    tag, value = tagvalue(line)
-                    info[tag] = value
-                else:
-                    if subset:
-                        info["subsets"] += [subset]
-                    break
-            if state == "SUBSET":
-                tag, value = tagvalue(line)
-                if tag == "description" or tag == "type":
-                    subset[tag] = value
-                if tag == "sample_id":
-                    subset[tag] = value.split(",")
-        for t,v in info.items():
-            if "count" in t:
-                info[t] = int(v)
-                
-        # sample information
-        state = None
-        for line in f:
-            if state == "header":
-                info["samples"] = line.rstrip().split("\t")[2:]
-                break
-            if line.startswith("!dataset_table_begin"):
-                state = "header"
-        self.info = info
-
-    def _getspotmap(self, include_spots=None):
-        """Return gene to spot and spot to genes mapings."""
-        f = gzip.open(self.filename, "rb")
-        if six.PY3:
-            f = io.TextIOWrapper(f, encoding=SOFT_ENCODING)
-        for line in f:
-            if line.startswith("!dataset_table_begin"):
-                break
-        f.readline() # skip header
-        spot2gene = {}
-        gene2spots = {}
-        for line in f:
-            if line.startswith("!dataset_table_end"):
-                break
-            spot, gene = line.rstrip().split("\t")[0:2]
-            if include_spots and (spot not in include_spots):
-                continue 
-            spot2gene[spot] = gene
-            gene2spots[gene] = gene2spots.get(gene, []) + [spot]
-    
-        self.spot2gene = spot2gene
-        self.gene2spots = gene2spots
-        
     def sample_annotations(self, sample_type=None):
         """Return a dictionary with sample annotation."""
         annotation = {}
@@ -268,34 +478,77 @@ class GDS():
         return set([info["type"] for info in self.info["subsets"]])
     
     def _parse_soft(self, remove_unknown=None):
-        """Parse GDS data, returns data dictionary."""
-        f = gzip.open(self.filename, "rb")
-        if six.PY3:
-            f = io.TextIOWrapper(f, encoding=SOFT_ENCODING)
-
-        mfloat = lambda x: float(x) if x != 'null' else compat.unknown
-    
-        data = {}
-        # find the start of the data part
-        for line in f:
-            if line.startswith("!dataset_table_begin"):
-                break
-        f.readline()
-        
-        # load data
-        for line in f:
-            if line.startswith("!dataset_table_end"):
-                break
-            d = line.rstrip().split("\t")
-            if remove_unknown and (float(d[2:].count('null')) / len(d[2:]) > remove_unknown):
-#                print "ZZZ", float(d[2:].count('null')) / len(d[2:]), d[2:]
-                continue 
-            data[d[0]] = GeneData(d[0], d[1], [mfloat(v) for v in d[2:]])
+        """
+        Select the parsed GDS data (without spots with too many unknown
+        values) into :obj:`gdsdata`.
+        """
+        data = self.soft
+        if remove_unknown and data.X.shape[1]:
+            unknown = data.mask.mean(axis=1)
+            data = data.select(numpy.flatnonzero(unknown <= remove_unknown))
         self.gdsdata = data
-    
+        # normalized (None, 0 and 0.0 all keep every spot) for the cache
+        self._remove_unknown = float(remove_unknown) if remove_unknown \
+            else None
+
+    def _expressions(self, report_genes=True, merge_function=spots_mean):
+        """
+        Return a matrix of expressions (genes or spots x samples) and the
+        list of gene names or spot ids for its rows.
+        """
+        data = self.gdsdata
+        if not report_genes:
+            # a copy; the parsed data can be a read only memory map
+            return numpy.array(data.X), data.spots
+
+        name = _merge_function_name(merge_function)
+        if not self.cache or name is None:
+            return self._merge_spots(merge_function)
+
+        remove_unknown = getattr(self, "_remove_unknown", None)
+        cachename = cache_filename(self.filename, "genes", name,
+                                   remove_unknown or 0)
+        meta = _cache_meta(self.filename, merge_function=name,
+                           remove_unknown=remove_unknown)
+        try:
+            _, arrays = _load_cache(cachename, meta)
+            genes = arrayfile.load_strings(arrays, "genes").tolist()
+            # copy the (read only) memory map for a writable table
+            return numpy.array(arrays["X"]), genes
+        except Exception:
+            pass
+
+        X, genes = self._merge_spots(merge_function)
+        arrays = {"X": X}
+        arrayfile.save_strings(arrays, "genes", genes)
+        _save_cache(cachename, arrays, meta)
+        return X, genes
+
+    def _merge_spots(self, merge_function):
+        """Merge the expressions of spots into genes."""
+        data = self.gdsdata
+        name = _merge_function_name(merge_function)
+        if name is not None:
+            # NaN aware reductions of all genes at once
+            X = stats.group_reduce(data.X, data.gene_codes, name,
+                                   ngroups=len(data.genes))
+            return X, data.genes
+
+        order = numpy.argsort(data.gene_codes, kind="mergesort")
+        bounds = numpy.searchsorted(data.gene_codes[order],
+                                    numpy.arange(len(data.genes) + 1))
+        X = numpy.empty((len(data.genes), data.X.shape[1]))
+        for g in range(len(data.genes)):
+            rows = data.X[order[bounds[g]:bounds[g + 1]]].astype(float)
+            X[g] = [merge_function(x) for x in rows.T.tolist()]
+        return X, data.genes
+
     def _to_ExampleTable(self, report_genes=True, merge_function=spots_mean,
                                 sample_type=None, transpose=False):
         """Convert parsed GEO format to orange, save by genes or by spots."""
+        X, names = self._expressions(report_genes, merge_function)
+        if not compat.OR3:
+            X = X.tolist()
         if transpose: # samples in rows
             sample2class = self.sample_to_class(sample_type)
             cvalues = sorted(set(sample2class.values()))
@@ -314,20 +567,16 @@ class GDS():
                 sample_type = list(ad.keys())[0]
 
             classvar = DiscreteVariable(name=sample_type or "class", values=cvalues)
-            spots = self.genes if report_genes else self.spots
-            atts = [ContinuousVariable(name=gene) for gene in spots]
+            atts = [ContinuousVariable(name=gene) for gene in names]
     
             metasvar = [ DiscreteVariable(name=n, values=sorted(values)) 
                 for n,values in ad.items() if n != sample_type ]
 
-            X = []
+            X = numpy.transpose(X) if compat.OR3 else \
+                [list(x) for x in zip(*X)]
             Y = []
             metas = []
-            for (i, sampleid) in enumerate(self.info["samples"]):
-                vals = [ ( (merge_function([self.gdsdata[spot].data[i] for spot in self.gene2spots[gene]]) )
-                         if report_genes else self.gdsdata[gene].data[i] ) 
-                         for gene in spots ]
-                X.append(vals)
+            for sampleid in self.info["samples"]:
                 Y.append(sample2class.get(sampleid, None))
                 metas.append([samp_ann[sampleid].get(n, None) for n,_ in ad.items() if n != sample_type ])
 
@@ -342,17 +591,7 @@ class GDS():
 
             geneatname = "gene" if report_genes else "spot"
             metasvar = [ StringVariable(geneatname) ]
-            nameval = self.genes if report_genes else self.spots
-
-            X = []
-            metas = []
-            for g in nameval:
-                if report_genes:
-                    X.append(list(map(lambda *x: merge_function(x),
-                        *[self.gdsdata[spot].data for spot in self.gene2spots[g]])))
-                else:
-                    X.append(self.gdsdata[g].data)
-            metas = [ [a] for a in nameval]
+            metas = [ [a] for a in names]
             domain = compat.create_domain(atts, None, metasvar)
             return compat.create_table(domain, X, None, metas)
 
@@ -383,11 +622,7 @@ class GDS():
           ``remove_unknown``. If None, nothing is removed.
         """
         if self.verbose: print("Reading data ...")
-#        if not self.gdsdata:
         self._parse_soft(remove_unknown = remove_unknown)
-#        if remove_unknown:
-            # some spots were filtered out, need to revise spot<>gene mappings
-        self._getspotmap(include_spots=set(self.gdsdata.keys()))
         if self.verbose: print("Converting to example table ...")
         self.data = self._to_ExampleTable(merge_function=merge_function,
                                           sample_type=sample_type, transpose=transpose,
@@ -405,6 +640,30 @@ class GDS():
                )
 
 
+def cache_datasets(gdsnames, merge_functions=(spots_mean,),
+                   remove_unknown=(None,), verbose=False):
+    """
+    Download the GEO DataSets `gdsnames` and fill the binary cache with
+    the parsed data and the expressions merged into genes by each of
+    `merge_functions` (for each `remove_unknown` threshold).
+
+    Return a list of names of data sets that could not be cached.
+    """
+    failed = []
+    for gdsname in gdsnames:
+        try:
+            gds = GDS(gdsname, verbose=verbose)
+            for threshold in remove_unknown:
+                gds._parse_soft(remove_unknown=threshold)
+                for merge_function in merge_functions:
+                    gds._expressions(True, merge_function)
+        except Exception as ex:
+            if verbose:
+                print("%s: %s" % (gdsname, ex))
+            failed.append(gdsname)
+    return failed
+
+
 def _float_or_na(x):
     if compat.isunknown(x):
         return compat.unknown
@@ -7,6 +7,7 @@ Gene Ontology (:mod:`go`)
 from __future__ import absolute_import
 
 import os
+import hashlib
 import tarfile
 import gzip
 import re
@@ -31,6 +32,14 @@ from gzip import GzipFile
 from collections import defaultdict
 from operator import attrgetter
 
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
+
+import numpy
+import scipy.sparse
+
 from orangecontrib.bio.utils import progress_bar_milestones
 
 try:
@@ -47,11 +56,16 @@ except NameError:
 
 from orangecontrib.bio.utils import serverfiles
 from orangecontrib.bio.utils import stats
+from orangecontrib.bio.utils import arrayfile
 
 from orangecontrib.bio import gene as obiGene, taxonomy as obiTaxonomy
 
 default_database_path = os.path.join(serverfiles.localpath(), "GO")
 
+#: Directory where compiled (binary) ontology files are cached (set to
+#: `None` to disable the cache).
+compiled_cache_path = os.path.join(default_database_path, "compiled")
+
 _CVS_REVISION_RE = re.compile(r"^(rev)?(\d+\.\d+)+$")
 
 evidenceTypes = {
@@ -267,6 +281,251 @@ class Instance(OBOObject):
     pass
 
 
+class OntologyClosure(object):
+    """
+    A precomputed transitive closure of the ontology's relations.
+
+    Terms are numbered and the ancestors (including the term itself)
+    of each term are stored as sorted integer arrays in CSR form (see
+    :obj:`ancestor_ptr` and :obj:`ancestors`), along with their
+    transpose (descendants), a topological order and minimum term depths.
+
+    :param list ids: Term ids.
+    :param parent_ptr: Parent CSR index pointer array.
+    :param parents: Parent (term index) array.
+
+    """
+    def __init__(self, ids, parent_ptr, parents, ancestor_ptr=None,
+                 ancestors=None, depth=None, order=None):
+        #: A list of term ids
+        self.ids = list(ids)
+        self.index = dict((id, i) for i, id in enumerate(self.ids))
+        self.parent_ptr = numpy.asarray(parent_ptr, dtype=numpy.int64)
+        self.parents = numpy.asarray(parents, dtype=numpy.int32)
+
+        if ancestors is None:
+            order, ancestor_ptr, ancestors, depth = self._closure()
+
+        #: Topological order of term indices (parents first)
+        self.order = numpy.asarray(order, dtype=numpy.int32)
+        self.ancestor_ptr = numpy.asarray(ancestor_ptr, dtype=numpy.int64)
+        self.ancestors = numpy.asarray(ancestors, dtype=numpy.int32)
+        #: Minimum depth of each term (top level terms have depth 1)
+        self.depth = numpy.asarray(depth, dtype=numpy.int32)
+
+        # descendants (the transposed ancestors)
+        rows = numpy.repeat(numpy.arange(len(self.ids), dtype=numpy.int32),
+                            numpy.diff(self.ancestor_ptr))
+        order = numpy.argsort(self.ancestors, kind="mergesort")
+        self.descendants = rows[order]
+        self.descendant_ptr = numpy.zeros(len(self.ids) + 1,
+                                          dtype=numpy.int64)
+        self.descendant_ptr[1:] = numpy.cumsum(
+            numpy.bincount(self.ancestors, minlength=len(self.ids)))
+        self.child_ptr = numpy.zeros(len(self.ids) + 1, dtype=numpy.int64)
+        self.child_ptr[1:] = numpy.cumsum(
+            numpy.bincount(self.parents, minlength=len(self.ids)))
+        order = numpy.argsort(self.parents, kind="mergesort")
+        self.children = numpy.repeat(
+            numpy.arange(len(self.ids), dtype=numpy.int32),
+            numpy.diff(self.parent_ptr))[order]
+
+    @classmethod
+    def from_ontology(cls, ontology):
+        """
+        Compute the closure of `ontology`'s relations.
+        """
+        ids = list(ontology.terms)
+        index = dict((id, i) for i, id in enumerate(ids))
+        ptr, parents = [0], []
+        for id in ids:
+            parents.extend(sorted(set(index[p] for _, p in
+                                      ontology.terms[id].related)))
+            ptr.append(len(parents))
+        return cls(ids, ptr, parents)
+
+    def _closure(self):
+        n = len(self.ids)
+        parent_ptr = self.parent_ptr.tolist()
+        parents = self.parents.tolist()
+        child_count = [0] * n
+        for p in parents:
+            child_count[p] += 1
+
+        # Kahn's algorithm over the child -> parent edges, i.e. ordering
+        # leaves first (reversed at the end)
+        pending_children = list(child_count)
+        queue = [i for i in range(n) if pending_children[i] == 0]
+        order = []
+        while queue:
+            i = queue.pop()
+            order.append(i)
+            for p in parents[parent_ptr[i]:parent_ptr[i + 1]]:
+                pending_children[p] -= 1
+                if pending_children[p] == 0:
+                    queue.append(p)
+        # terms on cycles (if any) are appended in index order
+        seen = set(order)
+        order = order[::-1] + [i for i in range(n) if i not in seen]
+
+        ancestors = [None] * n
+        depth = [0] * n
+        for i in order:
+            term_parents = parents[parent_ptr[i]:parent_ptr[i + 1]]
+            anc = set([i])
+            stack = list(term_parents)
+            while stack:
+                p = stack.pop()
+                if p in anc:
+                    continue
+                if ancestors[p] is not None:
+                    anc.update(ancestors[p])
+                else:
+                    anc.add(p)
+                    stack.extend(parents[parent_ptr[p]:parent_ptr[p + 1]])
+            ancestors[i] = sorted(anc)
+            depth[i] = min([depth[p] + 1 for p in term_parents
+                            if depth[p] > 0] or [1])
+
+        ancestor_ptr = numpy.zeros(n + 1, dtype=numpy.int64)
+        ancestor_ptr[1:] = numpy.cumsum([len(a) for a in ancestors])
+        ancestors = numpy.array([a for anc in ancestors for a in anc],
+                                dtype=numpy.int32)
+        return order, ancestor_ptr, ancestors, depth
+
+    @staticmethod
+    def _gather(ptr, values, indices):
+        # concatenate the CSR rows for indices
+        indices = numpy.asarray(indices, dtype=numpy.int64)
+        start, stop = ptr[indices], ptr[indices + 1]
+        lengths = stop - start
+        offsets = numpy.cumsum(lengths) - lengths
+        positions = (numpy.arange(lengths.sum()) -
+                     numpy.repeat(offsets - start, lengths))
+        return values[positions]
+
+    def term_indices(self, terms):
+        """
+        Return an array of indices of `terms`.
+        """
+        return numpy.array([self.index[t] for t in terms], dtype=numpy.int64)
+
+    def ancestor_indices(self, indices):
+        """
+        Return a sorted array of all ancestors of (and including) terms
+        with `indices`.
+        """
+        return numpy.unique(
+            self._gather(self.ancestor_ptr, self.ancestors, indices))
+
+    def descendant_indices(self, indices):
+        """
+        Return a sorted array of all descendants of (and including) terms
+        with `indices`.
+        """
+        return numpy.unique(
+            self._gather(self.descendant_ptr, self.descendants, indices))
+
+    def parent_indices(self, indices):
+        return numpy.unique(
+            self._gather(self.parent_ptr, self.parents, indices))
+
+    def child_indices(self, indices):
+        return numpy.unique(
+            self._gather(self.child_ptr, self.children, indices))
+
+    def is_ancestor(self, a, b):
+        """
+        Return a boolean array indicating if terms with indices `a` are
+        ancestors of (or equal to) terms with indices `b` (the arguments
+        are broadcast against each other).
+        """
+        a, b = numpy.broadcast_arrays(numpy.asarray(a, dtype=numpy.int64),
+                                      numpy.asarray(b, dtype=numpy.int64))
+        n = len(self.ids)
+        if n == 0:
+            return numpy.zeros(a.shape, dtype=bool)
+        if not hasattr(self, "_ancestor_keys"):
+            rows = numpy.repeat(numpy.arange(n, dtype=numpy.int64),
+                                numpy.diff(self.ancestor_ptr))
+            # sorted since rows are sorted and so is each row's slice
+            self._ancestor_keys = rows * n + self.ancestors
+        keys = b * n + a
+        pos = numpy.searchsorted(self._ancestor_keys, keys)
+        pos = numpy.minimum(pos, len(self._ancestor_keys) - 1)
+        return self._ancestor_keys[pos] == keys
+
+    def matrix(self):
+        """
+        Return a sparse `ancestor x term` boolean incidence matrix.
+        """
+        return scipy.sparse.csc_matrix(
+            (numpy.ones(len(self.ancestors), dtype=bool), self.ancestors,
+             self.ancestor_ptr), shape=(len(self.ids), len(self.ids)))
+
+    def arrays(self):
+        """
+        Return a dictionary of arrays for persisting the closure (see
+        :func:`from_arrays`).
+        """
+        return {"closure_parent_ptr": self.parent_ptr,
+                "closure_parents": self.parents,
+                "closure_order": self.order,
+                "closure_ancestor_ptr": self.ancestor_ptr,
+                "closure_ancestors": self.ancestors,
+                "closure_depth": self.depth}
+
+    @classmethod
+    def from_arrays(cls, ids, arrays):
+        return cls(ids, arrays["closure_parent_ptr"],
+                   arrays["closure_parents"],
+                   ancestor_ptr=arrays["closure_ancestor_ptr"],
+                   ancestors=arrays["closure_ancestors"],
+                   depth=arrays["closure_depth"],
+                   order=arrays["closure_order"])
+
+
+class _CompiledTerms(Mapping):
+    """
+    A read only `term id -> Term` mapping backed by a compiled ontology
+    file (see :func:`Ontology._load_compiled`). :class:`Term` instances
+    are parsed from their stanzas on first access.
+    """
+    def __init__(self, ontology, meta, arrays):
+        self.ontology = ontology
+        self.relations = [intern(str(r)) for r in meta["relations"]]
+        self.arrays = arrays
+        #: A list of all term ids
+        self.ids = [intern(id) for id in
+                    arrayfile.load_strings(arrays, "ids")]
+        self.index = dict((id, i) for i, id in enumerate(self.ids))
+        self.stanzas = arrayfile.load_strings(arrays, "stanzas")
+        self._terms = {}
+
+    def __getitem__(self, id):
+        term = self._terms.get(id)
+        if term is None:
+            i = self.index[id]
+            term = Term(self.stanzas[i], self.ontology)
+            arrays = self.arrays
+            start, end = arrays["child_ptr"][i], arrays["child_ptr"][i + 1]
+            term.related_to = set(
+                (self.relations[t], self.ids[c]) for c, t in
+                zip(arrays["children"][start:end].tolist(),
+                    arrays["child_type"][start:end].tolist()))
+            self._terms[id] = term
+        return term
+
+    def __contains__(self, id):
+        return id in self.index
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+
 class Ontology(object):
     """
     :class:`Ontology` is the class representing a gene ontology.
@@ -297,6 +556,8 @@ class Ontology(object):
         self.alias_mapper = {}
         self.reverse_alias_mapper = defaultdict(set)
         self.header = ""
+        self._closure = None
+        self._compiled_arrays = None
 
         if filename is not None:
             self.parse_file(filename, progress_callback)
@@ -340,7 +601,30 @@ class Ontology(object):
         """ Parse the file. file can be a filename string or an open filelike
         object. The optional progressCallback will be called with a single
         argument to report on the progress.
+
+        If `file` is a filename, the parsed ontology is cached in a
+        compiled binary form in :obj:`compiled_cache_path` (keyed by the
+        file's path and contents), and subsequently loaded from there.
+
         """
+        self._closure = None
+        self._compiled_arrays = None
+
+        compiled = None
+        if isinstance(file, basestring) and os.path.isfile(file) and \
+                compiled_cache_path is not None:
+            path_key = hashlib.sha1(
+                os.path.realpath(file).encode("utf-8")).hexdigest()[:16]
+            compiled = os.path.join(
+                compiled_cache_path,
+                "ontology-%s-%s.bin" % (path_key, arrayfile.file_hash(file)))
+            if os.path.isfile(compiled):
+                try:
+                    self._load_compiled(compiled)
+                    return
+                except (ValueError, KeyError, IOError, OSError):
+                    pass
+
         if isinstance(file, basestring):
             if os.path.isfile(file) and tarfile.is_tarfile(file):
                 f = tarfile.open(file).extractfile("gene_ontology_edit.obo")
@@ -354,22 +638,19 @@ class Ontology(object):
             f = file
 
         data = f.readlines()
+        if data and not isinstance(data[0], str):
+            data = [line.decode("utf-8") for line in data]
         data = "".join([line for line in data if not line.startswith("!")])
         self.header = data[: data.index("[Term]")]
-        c = re.compile("\[.+?\].*?\n\n", re.DOTALL)
+        c = re.compile(r"\[.+?\].*?\n\n", re.DOTALL)
         data = c.findall(data)
 
+        stanzas = {}
         milestones = progress_bar_milestones(len(data), 90)
         for i, block in enumerate(builtinOBOObjects + data):
-            if block.startswith("[Term]"):
-                term = Term(block, self)
-                self.terms[term.id] = term
-            elif block.startswith("[Typedef]"):
-                typedef = Typedef(block, self)
-                self.typedefs[typedef.id] = typedef
-            elif block.startswith("[Instance]"):
-                instance = Instance(block, self)
-                self.instances[instance.id] = instance
+            obj = self._add_stanza(block)
+            if i >= len(builtinOBOObjects) and obj is not None:
+                stanzas[obj.id] = block
             if progress_callback and i in milestones:
                 progress_callback(90.0 * i / len(data))
 
@@ -382,12 +663,153 @@ class Ontology(object):
             try:
                 self.alias_mapper.update([(alt_id, id)
                                           for alt_id in term.alt_id])
-                self.reverse_alias_mapper[id].union_update(term.alt_id)
+                self.reverse_alias_mapper[id].update(term.alt_id)
             except AttributeError:
                 pass
             if progress_callback and i in milestones:
                 progress_callback(90.0 + 10.0 * i / len(self.terms))
 
+        if compiled is not None:
+            try:
+                self._save_compiled(compiled, stanzas)
+            except (IOError, OSError):
+                pass
+
+    def _add_stanza(self, block):
+        if block.startswith("[Term]"):
+            obj = Term(block, self)
+            self.terms[obj.id] = obj
+        elif block.startswith("[Typedef]"):
+            obj = Typedef(block, self)
+            self.typedefs[obj.id] = obj
+        elif block.startswith("[Instance]"):
+            obj = Instance(block, self)
+            self.instances[obj.id] = obj
+        else:
+            obj = None
+        return obj
+
+    #: Version of the compiled ontology file format.
+    COMPILED_VERSION = 3
+
+    def _save_compiled(self, filename, stanzas):
+        """
+        Save the ontology in a compiled binary form to `filename`
+        (``ontology-<path key>-<content hash>.bin``) and remove the
+        compiled files of previous versions of the same source file.
+
+        `stanzas` must map all term (and typedef and instance) ids to
+        their OBO stanzas.
+
+        """
+        ids = list(self.terms)
+        index = dict((id, i) for i, id in enumerate(ids))
+        relations = sorted(set(typeId for term in self.terms.values()
+                               for typeId, _ in term.related))
+        rel_index = dict((r, i) for i, r in enumerate(relations))
+
+        src, dst, rtype = [], [], []
+        for i, id in enumerate(ids):
+            for typeId, parent in sorted(self.terms[id].related):
+                src.append(i)
+                dst.append(index[parent])
+                rtype.append(rel_index[typeId])
+        src = numpy.array(src, dtype=numpy.int32)
+        dst = numpy.array(dst, dtype=numpy.int32)
+        rtype = numpy.array(rtype, dtype=numpy.int8)
+        # children sorted by parent
+        order = numpy.argsort(dst, kind="mergesort")
+
+        def indptr(rows):
+            ptr = numpy.zeros(len(ids) + 1, dtype=numpy.int64)
+            ptr[1:] = numpy.cumsum(numpy.bincount(rows, minlength=len(ids)))
+            return ptr
+
+        aliases = sorted(self.alias_mapper.items())
+        arrays = {
+            "parent_ptr": indptr(src),
+            "parents": dst,
+            "parent_type": rtype,
+            "child_ptr": indptr(dst),
+            "children": src[order],
+            "child_type": rtype[order],
+            "alias_target": numpy.array(
+                [index[id] for _, id in aliases], dtype=numpy.int32)
+        }
+        arrayfile.save_strings(arrays, "ids", ids)
+        arrayfile.save_strings(
+            arrays, "names", [getattr(self.terms[id], "name", "")
+                              for id in ids])
+        arrayfile.save_strings(
+            arrays, "namespaces", [getattr(self.terms[id], "namespace", "")
+                                   for id in ids])
+        arrayfile.save_strings(arrays, "stanzas",
+                               [stanzas[id] for id in ids])
+        arrayfile.save_strings(arrays, "aliases",
+                               [alias for alias, _ in aliases])
+        arrays.update(self.closure.arrays())
+        arrayfile.save_strings(arrays, "header", [self.header])
+        arrayfile.save_strings(
+            arrays, "other_stanzas",
+            [stanzas[id] for id in list(self.typedefs) + list(self.instances)
+             if id in stanzas])
+        meta = {
+            "version": self.COMPILED_VERSION,
+            "relations": relations,
+        }
+        dirname, basename = os.path.split(filename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        arrayfile.save(filename, arrays, meta)
+
+        prefix = basename.rsplit("-", 1)[0] + "-"
+        for name in os.listdir(dirname):
+            if name.startswith(prefix) and name.endswith(".bin") and \
+                    name != basename:
+                try:
+                    os.remove(os.path.join(dirname, name))
+                except OSError:
+                    # e.g. still memory mapped (on Windows)
+                    pass
+
+    def _load_compiled(self, filename):
+        """
+        Load the ontology saved with :func:`_save_compiled`. The
+        :class:`Term` objects are only created on first access.
+        """
+        meta, arrays = arrayfile.load(filename)
+        if meta.get("version") != self.COMPILED_VERSION:
+            raise arrayfile.FormatError("Incompatible compiled ontology")
+
+        self.header = arrayfile.load_strings(arrays, "header")[0]
+        other = arrayfile.load_strings(arrays, "other_stanzas").tolist()
+        for block in builtinOBOObjects + other:
+            self._add_stanza(block)
+
+        self.terms = _CompiledTerms(self, meta, arrays)
+        ids = self.terms.ids
+        self.alias_mapper = dict(
+            zip(map(intern, arrayfile.load_strings(arrays, "aliases")),
+                [ids[i] for i in arrays["alias_target"].tolist()]))
+        self.reverse_alias_mapper = defaultdict(set)
+        for alias, id in six.iteritems(self.alias_mapper):
+            self.reverse_alias_mapper[id].add(alias)
+        self._compiled_arrays = arrays
+
+    @property
+    def closure(self):
+        """
+        An :class:`OntologyClosure` of the ontology (computed on first
+        access or loaded from the compiled ontology file).
+        """
+        if self._closure is None:
+            if self._compiled_arrays is not None:
+                self._closure = OntologyClosure.from_arrays(
+                    self.terms.ids, self._compiled_arrays)
+            else:
+                self._closure = OntologyClosure.from_ontology(self)
+        return self._closure
+
     def defined_slims_subsets(self):
         """
         Return a list of defined subsets in the ontology.
@@ -448,6 +870,14 @@ class Ontology(object):
                              visited)
         return slims
 
+    def _closure_indices(self, terms):
+        closure = self.closure
+        try:
+            return closure.term_indices(
+                self.alias_mapper.get(t, t) for t in terms)
+        except KeyError as err:
+            raise KeyError(err.args[0])
+
     def extract_super_graph(self, terms):
         """
         Return all super terms of `terms` up to the most general one.
@@ -455,15 +885,11 @@ class Ontology(object):
         :param list terms: A list of term IDs.
 
         """
-        terms = [terms] if isinstance(terms, basestring) else terms
-        visited = set()
-        queue = set(terms)
-        while queue:
-            term = queue.pop()
-            visited.add(term)
-            queue.update(set(tid for _, tid in self[term].related) -
-                         visited)
-        return visited
+        terms = [terms] if isinstance(terms, basestring) else list(terms)
+        closure = self.closure
+        parents = closure.parent_indices(self._closure_indices(terms))
+        ancestors = closure.ancestor_indices(parents).tolist()
+        return set(terms).union([closure.ids[i] for i in ancestors])
 
     def extract_sub_graph(self, terms):
         """
@@ -472,28 +898,21 @@ class Ontology(object):
         :param list terms: A list of term IDs.
 
         """
-        terms = [terms] if type(terms) == str else terms
-        visited = set()
-        queue = set(terms)
-        while queue:
-            term = queue.pop()
-            visited.add(term)
-            queue.update(set(tid for _, tid in self[term].related_to) -
-                         visited)
-        return visited
+        terms = [terms] if isinstance(terms, basestring) else list(terms)
+        closure = self.closure
+        children = closure.child_indices(self._closure_indices(terms))
+        descendants = closure.descendant_indices(children).tolist()
+        return set(terms).union([closure.ids[i] for i in descendants])
 
-    def term_depth(self, term, cache_={}):
+    def term_depth(self, term):
         """
         Return the minimum depth of a `term`.
 
         (length of the shortest path to this term from the top level term).
 
         """
-        if term not in cache_:
-            cache_[term] = min([self.term_depth(parent) + 1
-                                for _, parent in self[term].related] or
-                               [1])
-        return cache_[term]
+        index = self._closure_indices([term])[0]
+        return int(self.closure.depth[index])
 
     def __getitem__(self, termid):
         """
@@ -620,6 +1039,356 @@ class AnnotationRecord(_AnnotationRecordBase):
         return list(map(intern, self.DB_Object_Synonym.split("|")))
 
 
+
+class _AnnotationStore(object):
+    """
+    Column-wise storage of annotation records.
+
+    The records are kept as packed (utf-8 encoded) GAF lines, and the
+    gene, GO id, evidence code and aspect columns as integer codes into
+    per column category lists. :class:`AnnotationRecord` instances are
+    only created on access.
+
+    """
+    #: Categorical columns and their index in a GAF line.
+    COLUMNS = [("DB_Object_Symbol", 2), ("GO_ID", 4),
+               ("Evidence_Code", 6), ("Aspect", 8)]
+
+    #: Approximate number of bytes read from a file at a time.
+    CHUNK_SIZE = 2 ** 22
+
+    def __init__(self):
+        #: A list of distinct values for each categorical column
+        self.categories = dict((name, []) for name, _ in self.COLUMNS)
+        self._category_codes = dict((name, {}) for name, _ in self.COLUMNS)
+        # (data, offsets, codes) array tuples
+        self._chunks = []
+        # (line, codes) of individually appended records
+        self._pending = []
+        self._groups = {}
+
+    def _line_codes(self, line):
+        """
+        Return the column codes for a GAF `line` or None if the line
+        does not define a (positive) gene annotation.
+        """
+        fields = line.split("\t", 9)
+        fields += [""] * (9 - len(fields))
+        if not fields[2] or not fields[4] or fields[3] == "NOT":
+            return None
+        codes = []
+        for name, i in self.COLUMNS:
+            value = fields[i]
+            code = self._category_codes[name].get(value)
+            if code is None:
+                code = len(self.categories[name])
+                self._category_codes[name][intern(value)] = code
+                self.categories[name].append(intern(value))
+            codes.append(code)
+        return codes
+
+    def _add_chunk(self, lines, codes):
+        if lines:
+            data, offsets = arrayfile.pack_strings(lines)
+            codes = numpy.array(codes, dtype=numpy.int32)
+            self._chunks.append(
+                (data, offsets, codes.reshape(-1, len(self.COLUMNS))))
+        self._groups = {}
+
+    def parse(self, f, progress_callback=None, size=None):
+        """
+        Read the annotations from an open GAF file `f` (`size` bytes
+        long if known) one chunk at a time. Return the file's header.
+        """
+        header = []
+        read = 0
+        for chunk in iter(lambda: f.readlines(self.CHUNK_SIZE), []):
+            lines, codes = [], []
+            for line in chunk:
+                read += len(line)
+                if not isinstance(line, str):
+                    line = line.decode("utf-8")
+                line = line.rstrip("\r\n")
+                if not line.strip():
+                    continue
+                elif line.startswith("!"):
+                    header.append(line + "\n")
+                    continue
+                line_codes = self._line_codes(line)
+                if line_codes is not None:
+                    lines.append(line)
+                    codes.extend(line_codes)
+            self._add_chunk(lines, codes)
+            if progress_callback and size:
+                progress_callback(min(100.0 * read / size, 100.0))
+        return "".join(header)
+
+    def append(self, record):
+        """
+        Append an :class:`AnnotationRecord`.
+        """
+        line = "\t".join(record)
+        codes = self._line_codes(line)
+        if codes is not None:
+            self._pending.append((line, codes))
+            self._groups = {}
+
+    def _arrays(self):
+        """
+        Return the consolidated (data, offsets, codes) arrays.
+        """
+        if self._pending:
+            lines, codes = zip(*self._pending)
+            self._pending = []
+            self._add_chunk(lines, [c for cc in codes for c in cc])
+        if len(self._chunks) > 1:
+            datas, offsets, codes = zip(*self._chunks)
+            base = numpy.cumsum([0] + [len(d) for d in datas])
+            offsets = numpy.concatenate(
+                [off[:-1] + b for off, b in zip(offsets, base)] +
+                [base[-1:]])
+            self._chunks = [(numpy.concatenate(datas), offsets,
+                             numpy.concatenate(codes))]
+        if not self._chunks:
+            return (numpy.zeros(0, dtype=numpy.uint8),
+                    numpy.zeros(1, dtype=numpy.int64),
+                    numpy.zeros((0, len(self.COLUMNS)), dtype=numpy.int32))
+        return self._chunks[0]
+
+    def __len__(self):
+        return (sum(len(codes) for _, _, codes in self._chunks) +
+                len(self._pending))
+
+    def record(self, i):
+        """
+        Return the i-th record as an :class:`AnnotationRecord`.
+        """
+        data, offsets, _ = self._arrays()
+        line = arrayfile.native_str(data[offsets[i]:offsets[i + 1]].tobytes())
+        fields = line.split("\t")
+        fields += [""] * (len(annotationFields) - len(fields))
+        return AnnotationRecord._make(map(intern, fields))
+
+    def records(self, rows):
+        return [self.record(i) for i in rows]
+
+    def codes(self, column):
+        """
+        Return an array of codes (into :obj:`categories`) for `column`.
+        """
+        index = [name for name, _ in self.COLUMNS].index(column)
+        return self._arrays()[2][:, index]
+
+    def rows(self, column, value):
+        """
+        Return (in order) the indices of all rows with `value` in `column`.
+        """
+        if column not in self._groups:
+            codes = self.codes(column)
+            order = numpy.argsort(codes, kind="mergesort")
+            bounds = numpy.zeros(len(self.categories[column]) + 1,
+                                 dtype=numpy.int64)
+            bounds[1:] = numpy.cumsum(
+                numpy.bincount(codes, minlength=len(bounds) - 1))
+            self._groups[column] = (order, bounds)
+        code = self._category_codes[column].get(value)
+        if code is None:
+            return numpy.zeros(0, dtype=numpy.int64)
+        order, bounds = self._groups[column]
+        return order[bounds[code]:bounds[code + 1]]
+
+
+class _AnnotationList(Sequence):
+    """
+    A read only sequence view of :class:`AnnotationRecord` instances in
+    an :class:`_AnnotationStore`.
+    """
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.store.records(range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.store.record(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.store.record(i)
+
+
+class _AnnotationGroups(Mapping):
+    """
+    A read only view mapping values of a `column` to lists of
+    :class:`AnnotationRecord` with that value (an empty list for
+    unknown values).
+    """
+    def __init__(self, store, column):
+        self.store = store
+        self.column = column
+
+    def __getitem__(self, key):
+        return self.store.records(self.store.rows(self.column, key))
+
+    def __contains__(self, key):
+        return key in self.store._category_codes[self.column]
+
+    def __iter__(self):
+        return iter(list(self.store.categories[self.column]))
+
+    def __len__(self):
+        return len(self.store.categories[self.column])
+
+
+class TermGeneIndex(object):
+    """
+    A precomputed index of genes annotated to ontology terms.
+
+    Genes and terms are mapped to integer ids and the (propagated) term
+    annotations are stored in a sparse boolean `terms x genes` matrix, so
+    that counting annotated genes of a gene list for all terms reduces to
+    a single sparse matrix-vector product.
+
+    :param annotations: :class:`Annotations` instance.
+    :param evidence_codes: Evidence codes to consider (default all).
+    :param aspect: A set of aspects to consider (default all).
+
+    .. note:: The index is not updated when new annotations are added.
+
+    """
+    def __init__(self, annotations, evidence_codes=None, aspect=None):
+        ontology = annotations.ontology
+        evidence_codes = set(evidence_codes or evidenceDict.keys())
+
+        self.alias_mapper = dict(ontology.alias_mapper)
+        #: A list of (sorted) gene names
+        self.genes = sorted(annotations.gene_names)
+        self.gene_index = dict((g, i) for i, g in enumerate(self.genes))
+        closure = ontology.closure
+        #: A list of term ids
+        self.terms = closure.ids
+        self.term_index = closure.index
+
+        store = annotations._store
+        categories = store.categories
+
+        def lookup(column, func, dtype=int):
+            # map column codes through func applied to its categories
+            return numpy.array([func(c) for c in categories[column]],
+                               dtype=dtype)[store.codes(column)]
+
+        mask = lookup("Evidence_Code", lambda e: e in evidence_codes, bool)
+        if aspect is not None:
+            mask &= lookup("Aspect", lambda a: a in aspect, bool)
+        term_ids = lookup("GO_ID", lambda t: self.term_index.get(
+            self.alias_mapper.get(t, t), -1))
+        gene_ids = lookup("DB_Object_Symbol", self.gene_index.get)
+        mask &= term_ids >= 0
+        term_ids, gene_ids = term_ids[mask], gene_ids[mask]
+
+        shape = (len(self.terms), len(self.genes))
+        #: Direct term annotations
+        self.direct = self._bool_matrix(term_ids, gene_ids, shape)
+
+        #: Annotations propagated to all ancestor terms
+        self.matrix = self._bool_matrix_from(
+            closure.matrix().astype(numpy.int32) *
+            self.direct.astype(numpy.int32))
+
+    @staticmethod
+    def _bool_matrix(rows, cols, shape):
+        m = scipy.sparse.csr_matrix(
+            (numpy.ones(len(rows), dtype=numpy.int32), (rows, cols)),
+            shape=shape)
+        return TermGeneIndex._bool_matrix_from(m)
+
+    @staticmethod
+    def _bool_matrix_from(m):
+        m = scipy.sparse.csr_matrix(m, dtype=bool)
+        m.sum_duplicates()
+        m.eliminate_zeros()
+        m.sort_indices()
+        return m
+
+    def gene_ids(self, genes):
+        """
+        Return an array of integer ids of `genes` (unknown genes are
+        skipped).
+        """
+        return numpy.array(sorted(set(self.gene_index[g] for g in genes
+                                      if g in self.gene_index)),
+                           dtype=int)
+
+    def genes_mask(self, genes):
+        """
+        Return a boolean mask over :obj:`genes` for `genes`.
+        """
+        mask = numpy.zeros(len(self.genes), dtype=bool)
+        mask[self.gene_ids(genes)] = True
+        return mask
+
+    def term_ids(self, terms):
+        """
+        Return an array of integer ids of `terms` (alternative term ids
+        are mapped to their primary term).
+        """
+        return numpy.array([self.term_index[self._alias(t)] for t in terms],
+                           dtype=int)
+
+    def _alias(self, term):
+        return self.alias_mapper.get(term, term)
+
+    def counts(self, mask, term_ids=None):
+        """
+        Return the number of genes in `mask` annotated to each term in
+        `term_ids` (default all terms).
+        """
+        m = self.matrix if term_ids is None else self.matrix[term_ids]
+        return m.dot(mask.astype(numpy.int32))
+
+    def term_genes(self, term):
+        """
+        Return a list of all genes annotated to `term` (or its sub terms).
+        """
+        i = self.term_index[self._alias(term)]
+        row = self.matrix.indices[self.matrix.indptr[i]:
+                                  self.matrix.indptr[i + 1]]
+        return [self.genes[g] for g in row]
+
+
+#: A single enriched term record as returned by
+#: :func:`Annotations.get_enriched_terms_batch`
+EnrichedTerm = namedtuple(
+    "EnrichedTerm",
+    ["list_index", "term", "genes", "p_value", "reference_count"]
+)
+
+_EnrichmentReference = namedtuple(
+    "_EnrichmentReference",
+    ["size", "mask", "index", "evidence_codes", "aspects", "slims_only"]
+)
+
+# Annotations instance and arguments for get_enriched_terms_batch
+# worker processes
+_enrichment_worker_state = None
+
+
+def _enrichment_worker_init(annotations, args):
+    global _enrichment_worker_state
+    _enrichment_worker_state = (annotations, args)
+
+
+def _enrichment_worker(genes):
+    annotations, args = _enrichment_worker_state
+    return annotations._enriched_terms(genes, *args)
+
+
 class Annotations(object):
     """
     :class:`Annotations` object holds the annotations.
@@ -646,13 +1415,8 @@ class Annotations(object):
                  progress_callback=None, rev=None):
         self.ontology = ontology
 
-        #: A dictionary mapping a gene name (DB_Object_Symbol) to a
-        #: set of all annotations of that gene.
-        self.gene_annotations = defaultdict(list)
-
-        #: A dictionary mapping a GO term id to a set of annotations that
-        #: are directly annotated to that term
-        self.term_anotations = defaultdict(list)
+        # Column-wise storage of all annotations
+        self._store = _AnnotationStore()
 
         self.all_annotations = defaultdict(list)
 
@@ -660,8 +1424,6 @@ class Annotations(object):
         self._gene_names_dict = None
         self._alias_mapper = None
 
-        #: A list of all :class:`AnnotationRecords` instances.
-        self.annotations = []
         self.header = ""
         self.genematcher = genematcher
         self.taxid = None
@@ -715,6 +1477,23 @@ class Annotations(object):
         if self.genematcher:
             self.genematcher.set_targets(self.gene_names)
 
+    @property
+    def annotations(self):
+        """A list of all :class:`AnnotationRecord` instances."""
+        return _AnnotationList(self._store)
+
+    @property
+    def gene_annotations(self):
+        """A dictionary mapping a gene name (DB_Object_Symbol) to a
+        list of all annotations of that gene."""
+        return _AnnotationGroups(self._store, "DB_Object_Symbol")
+
+    @property
+    def term_anotations(self):
+        """A dictionary mapping a GO term id to a list of annotations
+        that are directly annotated to that term."""
+        return _AnnotationGroups(self._store, "GO_ID")
+
     @classmethod
     def organism_name_search(cls, org):
         ids = to_taxid(org)
@@ -751,6 +1530,7 @@ class Annotations(object):
         """Set the ontology to use in the annotations mapping.
         """
         self.all_annotations = defaultdict(list)
+        self._term_gene_index = {}
         self._ontology = ontology
 
     def get_ontology(self):
@@ -798,32 +1578,28 @@ class Annotations(object):
             - an open file-like object of the association file
 
         """
+        size = None
         if isinstance(file, basestring):
             if os.path.isfile(file) and tarfile.is_tarfile(file):
-                f = tarfile.open(file).extractfile("gene_association")
+                tar = tarfile.open(file)
+                size = tar.getmember("gene_association").size
+                f = tar.extractfile("gene_association")
             elif os.path.isfile(file) and file.endswith(".gz"):
                 f = gzip.open(file)
             elif os.path.isfile(file):
+                size = os.path.getsize(file)
                 f = open(file)
             elif os.path.isdir(file):
-                f = open(os.path.join(file, "gene_association"))
+                file = os.path.join(file, "gene_association")
+                size = os.path.getsize(file)
+                f = open(file)
             else:
                 raise ValueError("Cannot open %r for parsing." % file)
         else:
             f = file
-        lines = [line for line in f.read().splitlines() if line.strip()]
-
-        milestones = progress_bar_milestones(len(lines), 100)
-        for i, line in enumerate(lines):
-            if line.startswith("!"):
-                self.header = self.header + line + "\n"
-                continue
-
-            a = AnnotationRecord.from_string(line)
-            self.add_annotation(a)
 
-            if progress_callback and i in milestones:
-                progress_callback(100.0 * i / len(lines))
+        self.header += self._store.parse(f, progress_callback, size)
+        self._invalidate()
 
     def add_annotation(self, a):
         """Add a single :class:`AnotationRecord` instance to this object.
@@ -833,10 +1609,13 @@ class Annotations(object):
         if not a.geneName or not a.GOId or a.Qualifier == "NOT":
             return
 
-        self.gene_annotations[a.geneName].append(a)
-        self.annotations.append(a)
-        self.term_anotations[a.GOId].append(a)
+        self._store.append(a)
+        self._invalidate()
+
+    def _invalidate(self):
+        # Invalidate all cached annotation views
         self.all_annotations = defaultdict(list)
+        self._term_gene_index = {}
 
         self._gene_names_dict = None
         self._gene_names = None
@@ -853,7 +1632,7 @@ class Annotations(object):
     @property
     def gene_names(self):
         if self._gene_names is None:
-            self._gene_names = set([ann.geneName for ann in self.annotations])
+            self._gene_names = set(self._store.categories["DB_Object_Symbol"])
         return self._gene_names
 
     @property
@@ -871,37 +1650,28 @@ class Annotations(object):
         to `genes`.
 
         """
-        def alias(gene):
-            if self.genematcher:
-                return self.genematcher.umatch(gene)
-            else:
-                return (gene if gene in self.gene_names
-                        else self.alias_mapper.get(gene, None))
+        genes = list(genes)
+        if self.genematcher:
+            aliases = self.genematcher.umatch_many(genes)
+        else:
+            aliases = [gene if gene in self.gene_names
+                       else self.alias_mapper.get(gene, None)
+                       for gene in genes]
 
-        return dict([(alias(gene), gene) for gene in genes if alias(gene)])
+        return dict([(alias, gene) for alias, gene in zip(aliases, genes)
+                     if alias])
 
-    def _collect_annotations(self, id, visited):
-        """ Recursive function collects and caches all annotations for id
+    def _collect_annotations(self, id, visited=None):
+        """ Return a list of annotation lists for term `id` and all its
+        sub terms (including annotations to alternative term ids).
         """
-        if id not in self.all_annotations and id not in visited:
-            if id in self.ontology.reverse_alias_mapper:
-                annotations = [self.term_anotations.get(alt_id, [])
-                               for alt_id in
-                               self.ontology.reverse_alias_mapper[id]] + \
-                              [self.term_anotations[id]]
-            else:
-                ## annotations for this term alone
-                annotations = [self.term_anotations[id]]
-            visited.add(id)
-            for typeId, child in self.ontology[id].related_to:
-                aa = self._collect_annotations(child, visited)
-                if type(aa) == set:
-                    ## if it was already reduced in get_all_annotations
-                    annotations.append(aa)
-                else:
-                    annotations.extend(aa)
-            self.all_annotations[id] = annotations
-        return self.all_annotations[id]
+        annotations = []
+        for term in self.ontology.extract_sub_graph([id]):
+            annotations.append(self.term_anotations[term])
+            annotations.extend(
+                self.term_anotations[alt_id] for alt_id in
+                self.ontology.reverse_alias_mapper.get(term, ()))
+        return annotations
 
     _CollectAnnotations = _collect_annotations
 
@@ -922,6 +1692,23 @@ class Annotations(object):
             self.all_annotations[id] = annot_set
         return self.all_annotations[id]
 
+    def get_term_gene_index(self, evidence_codes=None, aspect=None):
+        """
+        Return a (cached) :class:`TermGeneIndex` of the annotations
+        filtered by `evidence_codes` and `aspect`.
+
+        :param list-of-strings evidence_codes:
+            List of evidence codes to consider (default all).
+        :param aspect: A set of aspects to consider (default all).
+
+        """
+        self._ensure_ontology()
+        key = (frozenset(evidence_codes or evidenceDict.keys()),
+               frozenset(aspect) if aspect is not None else None)
+        if key not in self._term_gene_index:
+            self._term_gene_index[key] = TermGeneIndex(self, *key)
+        return self._term_gene_index[key]
+
     def get_all_genes(self, id, evidence_codes=None):
         """ Return a list of genes annotated by specified `evidence_codes`
         to GO term 'id' and all it's subterms."
@@ -933,10 +1720,8 @@ class Annotations(object):
             to terms.
 
         """
-        evidence_codes = set(evidence_codes or evidenceDict.keys())
-        annotations = self.get_all_annotations(id)
-        return list(set([ann.geneName for ann in annotations
-                         if ann.Evidence_Code in evidence_codes]))
+        index = self.get_term_gene_index(evidence_codes)
+        return index.term_genes(id)
 
     def get_enriched_terms(self, genes, reference=None, evidence_codes=None,
                            slims_only=False, aspect=None,
@@ -956,9 +1741,74 @@ class Annotations(object):
             Which aspects to use. Use all by default. "P", "F", "C"
             or a set containing these elements.
 
+        .. seealso:: :func:`get_enriched_terms_batch`
+
+        """
+        ref = self._enrichment_reference(reference, evidence_codes,
+                                         slims_only, aspect)
+        return self._enriched_terms(genes, ref, prob, use_fdr,
+                                    progress_callback)
+
+    def get_enriched_terms_batch(self, gene_lists, reference=None,
+                                 evidence_codes=None, slims_only=False,
+                                 aspect=None, prob=stats.Binomial(),
+                                 use_fdr=True, n_jobs=1,
+                                 progress_callback=None):
+        """ Run :func:`get_enriched_terms` on each list in `gene_lists`.
+
+        The reference gene translation and filtering is shared between
+        all the lists. Return a list of :class:`EnrichedTerm` records
+        (one for each term annotated by genes in each list), ordered by
+        the list index.
+
+        :param gene_lists: A list of gene lists.
+        :param int n_jobs:
+            Number of worker processes to use (default 1, i.e. all lists
+            are processed in this process).
+
+        See :func:`get_enriched_terms` for other parameters.
+
+        """
+        ref = self._enrichment_reference(reference, evidence_codes,
+                                         slims_only, aspect)
+        gene_lists = list(gene_lists)
+        args = (ref, prob, use_fdr)
+        if n_jobs > 1 and len(gene_lists) > 1:
+            import multiprocessing
+            pool = multiprocessing.Pool(
+                min(n_jobs, len(gene_lists)),
+                initializer=_enrichment_worker_init,
+                initargs=(self, args))
+            try:
+                results = pool.imap(_enrichment_worker, gene_lists)
+                results = self._enriched_terms_table(
+                    results, len(gene_lists), progress_callback)
+            finally:
+                pool.terminate()
+        else:
+            results = (self._enriched_terms(genes, *args)
+                       for genes in gene_lists)
+            results = self._enriched_terms_table(
+                results, len(gene_lists), progress_callback)
+        return results
+
+    @staticmethod
+    def _enriched_terms_table(results, count, progress_callback=None):
+        table = []
+        milestones = progress_bar_milestones(count, 100)
+        for i, res in enumerate(results):
+            table.extend(EnrichedTerm(i, term, genes, p, ref)
+                         for term, (genes, p, ref) in sorted(res.items()))
+            if progress_callback and i in milestones:
+                progress_callback(100.0 * i / count)
+        return table
+
+    def _enrichment_reference(self, reference, evidence_codes, slims_only,
+                              aspect):
+        """
+        Prepare the reference (gene list independent) part of the
+        enrichment analysis.
         """
-        revGenesDict = self.get_gene_names_translator(genes)
-        genes = set(revGenesDict.keys())
         if reference:
             refGenesDict = self.get_gene_names_translator(reference)
             reference = set(refGenesDict.keys())
@@ -973,21 +1823,6 @@ class Annotations(object):
             aspects_set = aspect
 
         evidence_codes = set(evidence_codes or evidenceDict.keys())
-        annotations = [ann
-                       for gene in genes for ann in self.gene_annotations[gene]
-                       if ann.Evidence_Code in evidence_codes and
-                       ann.Aspect in aspects_set]
-
-        refAnnotations = set(
-            [ann
-             for gene in reference for ann in self.gene_annotations[gene]
-             if ann.Evidence_Code in evidence_codes and
-             ann.Aspect in aspects_set]
-        )
-
-        annotationsDict = defaultdict(set)
-        for ann in annotations:
-            annotationsDict[ann.GO_ID].add(ann)
 
         self._ensure_ontology()
         if slims_only and not self.ontology.slims_subset:
@@ -995,6 +1830,30 @@ class Annotations(object):
                           "Using 'goslim_generic' subset", UserWarning)
             self.ontology.set_slims_subset("goslim_generic")
 
+        index = self.get_term_gene_index(evidence_codes, aspects_set)
+        ref_mask = index.genes_mask(reference)
+        return _EnrichmentReference(len(reference), ref_mask, index,
+                                    evidence_codes, aspects_set,
+                                    slims_only)
+
+    def _enriched_terms(self, genes, ref, prob=stats.Binomial(),
+                        use_fdr=True, progress_callback=None):
+        """
+        Return the enriched terms for `genes` (see
+        :func:`get_enriched_terms`) given a prepared reference `ref`.
+        """
+        revGenesDict = self.get_gene_names_translator(genes)
+        genes = set(revGenesDict.keys())
+
+        annotations = [ann
+                       for gene in genes for ann in self.gene_annotations[gene]
+                       if ann.Evidence_Code in ref.evidence_codes and
+                       ann.Aspect in ref.aspects]
+
+        annotationsDict = defaultdict(set)
+        for ann in annotations:
+            annotationsDict[ann.GO_ID].add(ann)
+
         terms = annotationsDict.keys()
         filteredTerms = [term for term in terms if term in self.ontology]
 
@@ -1005,27 +1864,37 @@ class Annotations(object):
                           UserWarning)
 
         terms = self.ontology.extract_super_graph(filteredTerms)
-        res = {}
+        if ref.slims_only:
+            terms = [term for term in terms
+                     if term in self.ontology.slims_subset]
+        terms = list(terms)
+
+        index = ref.index
+        term_ids = index.term_ids(terms)
+        gene_ids = index.gene_ids(genes)
+        # only genes in the reference are counted
+        gene_ids = gene_ids[ref.mask[gene_ids]]
+
+        ref_counts = index.counts(ref.mask, term_ids)
+        # the term x genes sub matrix for the gene list
+        mapped = index.matrix[term_ids][:, gene_ids].tocsr()
+        counts = numpy.diff(mapped.indptr)
+
+        # compute all the p-values in a single (vectorized) pass
+        p_values = stats.p_values(prob, counts, ref.size,
+                                  ref_counts, len(genes))
 
+        res = {}
         milestones = progress_bar_milestones(len(terms), 100)
         for i, term in enumerate(terms):
-            if slims_only and term not in self.ontology.slims_subset:
-                continue
-            allAnnotations = self.get_all_annotations(term).intersection(refAnnotations)
-##            allAnnotations.intersection_update(refAnnotations)
-            allAnnotatedGenes = set([ann.geneName for ann in allAnnotations])
-            mappedGenes = genes.intersection(allAnnotatedGenes)
-
-            if len(reference) > len(allAnnotatedGenes):
-                mappedReferenceGenes = reference.intersection(allAnnotatedGenes)
-            else:
-                mappedReferenceGenes = allAnnotatedGenes.intersection(reference)
+            mappedGenes = [index.genes[gene_ids[j]] for j in
+                           mapped.indices[mapped.indptr[i]:
+                                          mapped.indptr[i + 1]]]
             res[term] = ([revGenesDict[g] for g in mappedGenes],
-                         prob.p_value(len(mappedGenes), len(reference),
-                                      len(mappedReferenceGenes), len(genes)),
-                         len(mappedReferenceGenes))
+                         float(p_values[i]), int(ref_counts[i]))
             if progress_callback and i in milestones:
                 progress_callback(100.0 * i / len(terms))
+
         if use_fdr:
             res = sorted(res.items(), key=lambda x: x[1][1])
             res = dict([(id, (genes, p, ref))
@@ -1116,7 +1985,7 @@ class Annotations(object):
         return self.annotations[index]
 
     def __getslice__(self, *args):
-        return self.annotations.__getslice__(*args)
+        return self.annotations[slice(*args)]
 
     def add(self, line):
         """ Add one annotation
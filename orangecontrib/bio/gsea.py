@@ -5,6 +5,7 @@ import random
 import time
 
 import numpy
+import scipy.sparse
 
 import orange
 import Orange
@@ -38,7 +39,18 @@ def rankingFromOrangeMeas(meas):
     results in a list. Ranking function is build out of 
     orange.MeasureAttribute.
     """
-    return lambda d: [ meas(i,d) for i in range(len(d.domain.attributes)) ]
+    return MeasRanking(meas)
+
+class MeasRanking(object):
+    """
+    Ranks all attributes with an orange.MeasureAttribute. Unlike a
+    lambda it can be pickled (and sent to worker processes).
+    """
+    def __init__(self, meas):
+        self.meas = meas
+
+    def __call__(self, d):
+        return [ self.meas(i,d) for i in range(len(d.domain.attributes)) ]
 
 def orderedPointersCorr(lcor):
     """
@@ -69,7 +81,7 @@ def enrichmentScoreRanked(subset, lcor, ordered, p=1.0, rev2=None):
 
     subset = set(subset)
 
-    if rev2 == None:
+    if rev2 is None:
         def rev(l):
             return numpy.argsort(l)
         rev2 = rev(ordered)
@@ -216,8 +228,192 @@ def enrichmentScore(data, subset, rankingf):
     es,l = enrichmentScoreRanked(subset, lcor, ordered)
     return es,l
 
+def geneSetMembership(subsets, ngenes):
+    """
+    Return gene set membership as a sparse (sets x genes) matrix. The
+    genes of each row are kept in the iteration order of ``set(subset)``,
+    which is the order enrichmentScoreRanked sums their weights in.
+    """
+    subsets = [ list(set(subset)) for subset in subsets ]
+    indptr = numpy.zeros(len(subsets) + 1, dtype=int)
+    indptr[1:] = numpy.cumsum([ len(subset) for subset in subsets ])
+    indices = numpy.array([ i for subset in subsets for i in subset ], dtype=int)
+    data = numpy.ones(len(indices), dtype=bool)
+    return scipy.sparse.csr_matrix((data, indices, indptr),
+                                   shape=(len(subsets), ngenes))
+
+def rankedPositions(rankings):
+    """
+    Return positions of genes when ordered by descending rankings, for
+    each row of a 2-D array of rankings (one row per permutation).
+    Equivalent to numpy.argsort(orderedPointersCorr(r)) for each row r.
+    """
+    order = numpy.argsort(-rankings, axis=1, kind="mergesort") # stable, like list.sort
+    positions = numpy.empty_like(order)
+    rows = numpy.arange(rankings.shape[0])[:, None]
+    positions[rows, order] = numpy.arange(rankings.shape[1])
+    return positions
+
+def _runningSumExtremes(positions, weights, notInA, ngenes):
+    """
+    Enrichment scores for gene sets of equal size given positions and
+    weights (arrays of shape (..., size)) of their genes. The running
+    sum is accumulated in the same order as in enrichmentScoreRanked.
+    """
+    sumcors = numpy.cumsum(weights, axis=-1)[..., -1]
+
+    order = numpy.argsort(positions, axis=-1)
+    positions = numpy.take_along_axis(positions, order, axis=-1)
+    weights = numpy.take_along_axis(weights, order, axis=-1)
+
+    #interleaved steps: genes not in the set before each set gene,
+    #the set gene and finally the genes after the last set gene
+    steps = numpy.empty(positions.shape[:-1] + (2*positions.shape[-1] + 1,))
+    steps[..., 0] = positions[..., 0]
+    steps[..., 2:-1:2] = numpy.diff(positions, axis=-1) - 1
+    steps[..., -1] = ngenes - positions[..., -1] - 1
+    steps[..., ::2] *= notInA
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        steps[..., 1::2] = (1./sumcors)[..., None] * weights
+
+    csum = numpy.cumsum(steps, axis=-1)
+    maxSum = numpy.maximum(csum[..., 1::2].max(axis=-1), 0.0)
+    minSum = numpy.minimum(csum[..., ::2].min(axis=-1), 0.0)
+    es = numpy.where(numpy.abs(maxSum) > numpy.abs(minSum), maxSum, minSum)
+    es[sumcors == 0.0] = 0.0
+    return es
+
+def enrichmentScoresRanked(membership, rankings, p=1.0, block=2**22):
+    """
+    Vectorized enrichmentScoreRanked for many gene sets and rankings.
+
+    membership: sparse (sets x genes) matrix from geneSetMembership.
+    rankings: 2-D array of correlations, one row per permutation.
+    block: approximate number of running sum elements to compute
+        at once.
+
+    Returns a (sets x permutations) array of enrichment scores.
+    """
+    rankings = numpy.atleast_2d(numpy.asarray(rankings, dtype=float))
+    nperm, ngenes = rankings.shape
+    positions = rankedPositions(rankings)
+    weights = numpy.abs(rankings)**p
+
+    indptr, indices = membership.indptr, membership.indices
+    sizes = numpy.diff(indptr)
+    scores = numpy.zeros((len(sizes), nperm))
+
+    #gene sets of equal size are stacked into dense arrays
+    for size in numpy.unique(sizes[sizes > 0]):
+        rows = numpy.flatnonzero(sizes == size)
+        members = indices[indptr[rows][:, None] + numpy.arange(size)]
+        notInA = -(1. / (ngenes - size))
+        step = max(1, block // (nperm * (2*size + 1)))
+        for start in range(0, len(rows), step):
+            chunk = members[start:start+step]
+            es = _runningSumExtremes(positions[:, chunk], weights[:, chunk],
+                                     notInA, ngenes)
+            scores[rows[start:start+step]] = es.T
+
+    return scores
+
+def shuffledRankings(rankings, seeds):
+    """
+    Return a 2-D array of rankings, where i-th row is equal to
+    shuffleList(rankings, random.Random(seeds[i])).
+    """
+    rankings = numpy.asarray(rankings, dtype=float)
+    indices = list(range(len(rankings)))
+    return numpy.array([ rankings[shuffleList(indices, random.Random(seed))]
+                         for seed in seeds ]).reshape(-1, len(rankings))
+
+class ShuffledRankings(object):
+    """
+    Permuted rankings for permutations of genes (see shuffledRankings).
+    """
+    def __init__(self, rankings):
+        self.rankings = rankings
+
+    def __call__(self, seeds):
+        return shuffledRankings(self.rankings, seeds)
+
+class ShuffledClassRankings(object):
+    """
+    Permuted rankings for permutations of class values: rankings
+    computed with rankingf on shuffleClass(data, seed) for each seed.
+    """
+    def __init__(self, data, rankingf):
+        self.data = data
+        self.rankingf = rankingf
+
+    def __call__(self, seeds):
+        return numpy.array([ self.rankingf(shuffleClass(self.data, seed))
+                             for seed in seeds ])
+
+#membership and permuted rankings function for worker processes
+_nullsWorkerState = None
+
+def _nullsWorkerInit(membership, permuted):
+    global _nullsWorkerState
+    _nullsWorkerState = (membership, permuted)
+
+def _nullsWorker(seeds):
+    membership, permuted = _nullsWorkerState
+    return enrichmentScoresRanked(membership, permuted(seeds))
+
+PERMUTATION_BLOCK = 100
+
+def enrichmentNulls(membership, permuted, n, callback=None,
+        block=PERMUTATION_BLOCK, n_jobs=1):
+    """
+    Sample null distributions of enrichment scores of all gene sets
+    in membership. Callable permuted(seeds) returns a 2-D array of
+    rankings for a list of permutation seeds. Permutations are
+    processed in blocks of block permutations.
+
+    With n_jobs > 1 the blocks are distributed among n_jobs worker
+    processes (permuted needs to be picklable). Each permutation
+    is determined by its seed only, so the results are the same as
+    with a single process. The callback is called once for every 
+    finished permutation.
+
+    Returns a (sets x n) array.
+    """
+    if n_jobs > 1:
+        #smaller blocks balance the load and report progress more often
+        block = max(1, min(block, -(-n // (4*n_jobs))))
+
+    #fixed permutations
+    seeds = [ [ 2000+i for i in range(start, min(n, start + block)) ]
+              for start in range(0, n, block) ]
+
+    nulls = numpy.zeros((membership.shape[0], n))
+
+    def collect(results):
+        start = 0
+        for bseeds, scores in zip(seeds, results):
+            nulls[:, start:start+len(bseeds)] = scores
+            start += len(bseeds)
+            for _ in bseeds:
+                runOptCallbacks(callback)
+
+    if n_jobs > 1 and len(seeds) > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(min(n_jobs, len(seeds)),
+                                    initializer=_nullsWorkerInit,
+                                    initargs=(membership, permuted))
+        try:
+            collect(pool.imap(_nullsWorker, seeds))
+        finally:
+            pool.terminate()
+    else:
+        collect(enrichmentScoresRanked(membership, permuted(bseeds))
+                for bseeds in seeds)
+
+    return nulls
+
 def gseaE(data, subsets, rankingf=None, \
-        n=100, permutation="class", callback=None):
+        n=100, permutation="class", callback=None, n_jobs=1):
     """
     Run GSEA algorithm on an example table.
 
@@ -228,51 +424,29 @@ def gseaE(data, subsets, rankingf=None, \
     n: number of random permutations to sample null distribution.
     permutation: "class" for permutating class, else permutate attribute 
         order.
+    n_jobs: number of worker processes for permutations.
 
     """
 
     if not rankingf:
         rankingf=rankingFromOrangeMeas(MA_signalToNoise())
 
-    enrichmentScores = []
- 
     lcor = rankingf(data)
-    #print lcor
+    membership = geneSetMembership(subsets, len(lcor))
 
-    ordered = orderedPointersCorr(lcor)
-
-    def rev(l):
-        return numpy.argsort(l)
-
-    rev2 = rev(ordered)
-
-    for subset in subsets:
-        es = enrichmentScoreRanked(subset, lcor, ordered, rev2=rev2)[0]
-        enrichmentScores.append(es)
+    enrichmentScores = enrichmentScoresRanked(membership, [lcor])[:, 0]
 
     runOptCallbacks(callback)
 
-    #print "PERMUTATION", permutation
-
-    enrichmentNulls = [ [] for a in range(len(subsets)) ]
-
-    for i in range(n):
-
-        if permutation == "class":
-            d2 = shuffleClass(data, 2000+i) #fixed permutation
-            r2 = rankingf(d2)
-        else:
-            r2 = shuffleList(lcor, random.Random(2000+i))
-
-        ordered2 = orderedPointersCorr(r2)
-        rev22 = rev(ordered2)
-        for si,subset in enumerate(subsets):
-            esn = enrichmentScoreRanked(subset, r2, ordered2, rev2=rev22)[0]
-            enrichmentNulls[si].append(esn)
+    if permutation == "class":
+        permuted = ShuffledClassRankings(data, rankingf)
+    else:
+        permuted = ShuffledRankings(lcor)
 
-        runOptCallbacks(callback)
+    nulls = enrichmentNulls(membership, permuted, n, callback=callback,
+                            n_jobs=n_jobs)
 
-    return gseaSignificance(enrichmentScores, enrichmentNulls)
+    return gseaSignificance(enrichmentScores, nulls)
 
 
 def runOptCallbacks(callback):
@@ -282,108 +456,78 @@ def runOptCallbacks(callback):
         except:
             callback()            
 
-def gseaR(rankings, subsets, n, callback=None):
+def gseaR(rankings, subsets, n, callback=None, n_jobs=1):
     """
     """
-    enrichmentScores = []
-    ordered = orderedPointersCorr(rankings)
-    
-    def rev(l):
-        return numpy.argsort(l)
-
-    rev2 = rev(ordered)
-
-    for subset in subsets:
+    membership = geneSetMembership(subsets, len(rankings))
 
-        es = enrichmentScoreRanked(subset, rankings, ordered, rev2=rev2)[0]
-        enrichmentScores.append(es)
+    enrichmentScores = enrichmentScoresRanked(membership, [rankings])[:, 0]
     
     runOptCallbacks(callback)
 
-    enrichmentNulls = [ [] for a in range(len(subsets)) ]
+    nulls = enrichmentNulls(membership, ShuffledRankings(rankings), n,
+                            callback=callback, n_jobs=n_jobs)
 
-    for i in range(n):
-        
-        r2 = shuffleList(rankings, random.Random(2000+i))
-        ordered2 = orderedPointersCorr(r2)
-        rev22 = rev(ordered2)
-
-        for si,subset in enumerate(subsets):
-
-            esn = enrichmentScoreRanked(subset, r2, ordered2, rev2=rev22)[0]
-            enrichmentNulls[si].append(esn)
-
-        runOptCallbacks(callback)
+    return gseaSignificance(enrichmentScores, nulls)
 
-    return gseaSignificance(enrichmentScores, enrichmentNulls)
 
+def _signedMeans(nulls):
+    """
+    Means of non-negative and of negative values in each row of a 2-D
+    array of null enrichment scores (NaN if there are none). The sums
+    are accumulated in the same order as sum() would.
+    """
+    def sums(a):
+        if a.shape[1] == 0:
+            return numpy.zeros(a.shape[0])
+        return numpy.cumsum(a, axis=1)[:, -1]
+
+    pos = nulls >= 0
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        meanPos = sums(numpy.where(pos, nulls, 0.0)) / pos.sum(axis=1)
+        meanNeg = sums(numpy.where(pos, 0.0, nulls)) / (~pos).sum(axis=1)
+    return meanPos, meanNeg
+
+def _normalizeScores(scores, meanPos, meanNeg):
+    """
+    Rescale positive and negative enrichment scores separately by the
+    (positive and negative) mean of the null distribution. Scores for 
+    which the mean is not calculable become 0.
+    """
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        nes = numpy.where(scores >= 0, scores / meanPos, -scores / meanNeg)
+    nes[(scores == 0) | ~numpy.isfinite(nes)] = 0.0
+    return nes
 
 def gseaSignificance(enrichmentScores, enrichmentNulls):
+    """
+    Compute normalized enrichment scores, nominal p-values and FDR.
 
-    #print enrichmentScores
-
-    import time
-
-    tb1 = time.time()
-
-    enrichmentPVals = []
-    nEnrichmentScores = []
-    nEnrichmentNulls = []
-
-    for i in range(len(enrichmentScores)):
-        es = enrichmentScores[i]
-        enrNull = enrichmentNulls[i]
-        #print es, enrNull
-
-        enrichmentPVals.append(gseapval(es, enrNull))
-
-        #normalize the ES(S,pi) and the observed ES(S), separetely rescaling
-        #the positive and negative scores by divident by the mean of the 
-        #ES(S,pi)
-
-        #print es, enrNull
-
-        def normalize(s):
-            try:
-                if s == 0:
-                    return 0.0
-                if s >= 0:
-                    meanPos = mean([a for a in enrNull if a >= 0])
-                    #print s, meanPos
-                    return s/meanPos
-                else:
-                    meanNeg = mean([a for a in enrNull if a < 0])
-                    #print s, meanNeg
-                    return -s/meanNeg
-            except:
-                return 0.0 #return if according mean value is uncalculable
-
-
-        nes = normalize(es)
-        nEnrichmentScores.append(nes)
-        
-        nenrNull = [ normalize(s) for s in enrNull ]
-        nEnrichmentNulls.append(nenrNull)
- 
-
-    #print "First part", time.time() - tb1
-
-    #FDR computation
-    #create a histogram of all NES(S,pi) over all S and pi
-    vals = reduce(lambda x,y: x+y, nEnrichmentNulls, [])
-
+    enrichmentScores: observed enrichment scores of gene sets.
+    enrichmentNulls: a (sets x permutations) array (or lists) of their
+        null enrichment scores.
 
-    def shorten(l, p=10000):
-        """
-        Take each len(l)/p element, if len(l)/p >= 2.
-        """
-        e = len(l)/p
-        if e <= 1:
-            return l
-        else:
-            return [ l[i] for i in xrange(0, len(l), e) ]
+    Returns a list of (es, nes, p, fdr) tuples.
+    """
 
-    #vals = shorten(vals) -> this can speed up second part. is it relevant TODO?
+    es = numpy.asarray(enrichmentScores, dtype=float)
+    nulls = numpy.asarray(enrichmentNulls, dtype=float).reshape(len(es), -1) \
+        if len(es) else numpy.zeros((0, 0))
+
+    #nominal p-values (see gseapval): use the positive or negative portion
+    #of the null distribution corresponding to the sign of the observed ES
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        pvals = numpy.where(es < 0,
+            (nulls <= es[:, None]).sum(axis=1) / (nulls < 0).sum(axis=1).astype(float),
+            (nulls >= es[:, None]).sum(axis=1) / (nulls >= 0).sum(axis=1).astype(float))
+    pvals[~numpy.isfinite(pvals)] = 1.0
+
+    #normalize the ES(S,pi) and the observed ES(S), separetely rescaling
+    #the positive and negative scores by divident by the mean of the 
+    #ES(S,pi)
+    meanPos, meanNeg = _signedMeans(nulls)
+    nes = _normalizeScores(es, meanPos, meanNeg)
+    nnulls = _normalizeScores(nulls, meanPos[:, None], meanNeg[:, None])
 
     """
     Use this null distribution to compute an FDR q value, for a given NES(S) =
@@ -393,79 +537,28 @@ def gseaSignificance(enrichmentScores, enrichmentNulls):
     = NES* <= 0.
     """
 
-    nvals = numpy.array(sorted(vals))
-    nnes = numpy.array(sorted(nEnrichmentScores))
-
-    #print "LEN VALS", len(vals), len(nEnrichmentScores)
-
-    fdrs = []
-
-    import operator
-
-    for i in range(len(enrichmentScores)):
-
-        nes = nEnrichmentScores[i]
-
-        """
-        #Strighfoward but slow implementation follows in comments.
-        #Useful as code description.
-        
-        if nes >= 0:
-            op0 = operator.ge
-            opn = operator.ge
-        else:
-            op0 = operator.lt
-            opn = operator.le
-
-        allPos = [a for a in vals if op0(a,0)]
-        allHigherAndPos = [a for a in allPos if opn(a,nes) ]
+    nvals = numpy.sort(nnulls, axis=None)
+    nnes = numpy.sort(nes)
 
-        nesPos = [a for a in nEnrichmentScores if op0(a,0) ]
-        nesHigherAndPos = [a for a in nesPos if opn(a,nes) ]
+    def counts(sortedvals):
+        """ (allPos, allHigherAndPos) for every NES. """
+        zero = numpy.searchsorted(sortedvals, 0, side="left")
+        return (numpy.where(neg, zero, len(sortedvals) - zero),
+                numpy.where(neg,
+                    numpy.searchsorted(sortedvals, nes, side="right"),
+                    len(sortedvals) - numpy.searchsorted(sortedvals, nes, side="left")))
 
-        top = len(allHigherAndPos)/float(len(allPos)) #p value
-        down = len(nesHigherAndPos)/float(len(nesPos))
-        
-        l1 = [ len(allPos), len(allHigherAndPos), len(nesPos), len(nesHigherAndPos)]
-
-        allPos = allHigherAndPos = nesPos =  nesHigherAndPos = 1
-
-        """
+    neg = nes < 0
+    allPos, allHigherAndPos = counts(nvals)
+    nesPos, nesHigherAndPos = counts(nnes)
 
-        #this could be speed up twice with the same accuracy! 
-        if nes >= 0:
-            allPos = int(len(vals) - numpy.searchsorted(nvals, 0, side="left"))
-            allHigherAndPos = int(len(vals) - numpy.searchsorted(nvals, nes, side="left"))
-            nesPos = len(nnes) - int(numpy.searchsorted(nnes, 0, side="left"))
-            nesHigherAndPos = len(nnes) - int(numpy.searchsorted(nnes, nes, side="left"))
-        else:
-            allPos = int(numpy.searchsorted(nvals, 0, side="left"))
-            allHigherAndPos = int(numpy.searchsorted(nvals, nes, side="right"))
-            nesPos = int(numpy.searchsorted(nnes, 0, side="left"))
-            nesHigherAndPos = int(numpy.searchsorted(nnes, nes, side="right"))
-           
-        """
-        #Comparing results
-        l2 = [ allPos, allHigherAndPos, nesPos, nesHigherAndPos ]
-        diffs = [ l1[i]-l2[i] for i in range(len(l1)) ]
-        sumd = sum( [ abs(a) for a in diffs ] )
-        if sumd > 0:
-            print(nes > 0)
-            print("orig", l1)
-            print("modi", l2)
-        """
-
-        try:
-            top = allHigherAndPos/float(allPos) #p value
-            down = nesHigherAndPos/float(nesPos)
-
-            fdrs.append(top/down)
-        except:
-            fdrs.append(1000000000.0)
-    
-    #print "Whole part", time.time() - tb1
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        top = allHigherAndPos / allPos.astype(float) #p value
+        down = nesHigherAndPos / nesPos.astype(float)
+        fdrs = top / down
+    fdrs[(allPos == 0) | (nesPos == 0) | (down == 0)] = 1000000000.0
 
-    return zip(enrichmentScores, nEnrichmentScores, enrichmentPVals, fdrs)
+    return list(zip(es.tolist(), nes.tolist(), pvals.tolist(), fdrs.tolist()))
 
 
 def nth(l,n): return [ a[n] for a in l ]
@@ -896,9 +989,9 @@ class GSEA(object):
         genes and match results.
         """
         for g in obiGeneSets.GeneSets(genesets):
-            genes = g.genes
+            genes = list(g.genes)
             datamatch = filter(lambda x: x[1] != None, 
-                [ (gene, self.gm.umatch(gene)) for gene in genes])
+                zip(genes, self.gm.umatch_many(genes)))
             self.genesets[g] = datamatch
 
     def selectGenesets(self, minSize=3, maxSize=1000, minPart=0.1):
@@ -930,7 +1023,7 @@ class GSEA(object):
         """
         return dict( (gs, self.genesIndices(nth(self.genesets[gs],1))) for gs in gsets)
 
-    def compute(self, minSize=3, maxSize=1000, minPart=0.1, n=100, callback=None, rankingf=None, permutation="class"):
+    def compute(self, minSize=3, maxSize=1000, minPart=0.1, n=100, callback=None, rankingf=None, permutation="class", n_jobs=1):
 
         subsetsok = self.selectGenesets(minSize=minSize, maxSize=maxSize, minPart=minPart)
 
@@ -944,10 +1037,10 @@ class GSEA(object):
             return {} # quick return if no genesets
 
         if len(itOrFirst(self.data)) > 1:
-            gseal = gseaE(self.data, nth(gsetsnumit,1), n=n, callback=callback, permutation=permutation, rankingf=rankingf)
+            gseal = gseaE(self.data, nth(gsetsnumit,1), n=n, callback=callback, permutation=permutation, rankingf=rankingf, n_jobs=n_jobs)
         else:
             rankings = [ self.data[0][at].native() for at in self.data.domain.attributes ]
-            gseal = gseaR(rankings, nth(gsetsnumit,1), n, callback=None)
+            gseal = gseaR(rankings, nth(gsetsnumit,1), n, callback=None, n_jobs=n_jobs)
 
         res = {}
 
@@ -965,7 +1058,7 @@ class GSEA(object):
         return res
 
 def direct(data, gene_sets, matcher, min_size=3, max_size=1000, min_part=0.1,
-    gene_desc=None, n=100, callback=None):
+    gene_desc=None, n=100, callback=None, n_jobs=1):
     """ Gene Set Enrichment analysis for pre-computed correlations
     between genes and phenotypes. 
     
@@ -980,11 +1073,12 @@ def direct(data, gene_sets, matcher, min_size=3, max_size=1000, min_part=0.1,
 
     assert len(data.domain.attributes) == 1 or len(data) == 1
     return runGSEA(data, geneSets=gene_sets, matcher=matcher, minSize=min_size, 
-        maxSize=max_size, minPart=min_part, n=n, geneVar=gene_desc, callback=callback)
+        maxSize=max_size, minPart=min_part, n=n, geneVar=gene_desc, callback=callback,
+        n_jobs=n_jobs)
 
 def run(data, gene_sets, matcher, min_size=3, max_size=1000, min_part=0.1,
     at_least=3, phenotypes=None, gene_desc=None, phen_desc=None, n=100, 
-    permutation="phenotype", callback=None, rankingf=None):
+    permutation="phenotype", callback=None, rankingf=None, n_jobs=1):
     """ Run Gene Set Enrichment Analysis.
 
     :param Orange.data.Table data: Gene expression data.  
@@ -997,6 +1091,8 @@ def run(data, gene_sets, matcher, min_size=3, max_size=1000, min_part=0.1,
     :param n: Number of permutations for significance computation. Default: 100.
     :param str permutation: Permutation type, "phenotype" (default) for 
         phenotypes, "gene" for genes.
+    :param int n_jobs: Number of worker processes for permutations. The
+        results do not depend on it. Default: 1.
     :param int min_size:
     :param int max_size: Minimum and maximum allowed number of genes from
         gene set also the data set. Defaults: 3 and 1000.
@@ -1033,19 +1129,19 @@ def run(data, gene_sets, matcher, min_size=3, max_size=1000, min_part=0.1,
     return runGSEA(data, geneSets=gene_sets, matcher=matcher, minSize=min_size, 
         maxSize=max_size, minPart=min_part, n=n, permutation=permutation, 
         geneVar=gene_desc, callback=callback, phenVar=phen_desc, 
-        classValues=phenotypes)
+        classValues=phenotypes, n_jobs=n_jobs)
 
 def runGSEA(data, organism=None, classValues=None, geneSets=None, n=100, 
         permutation="class", minSize=3, maxSize=1000, minPart=0.1, atLeast=3, 
         matcher=None, geneVar=None, phenVar=None, caseSensitive=False, 
-        rankingf=None, callback=None):
+        rankingf=None, callback=None, n_jobs=1):
     gso = GSEA(data, organism=organism, matcher=matcher, 
         classValues=classValues, atLeast=atLeast, caseSensitive=caseSensitive,
         geneVar=geneVar, phenVar=phenVar)
     gso.addGenesets(geneSets)
     res1 = gso.compute(n=n, permutation=permutation, minSize=minSize,
         maxSize=maxSize, minPart=minPart, rankingf=rankingf,
-        callback=callback)
+        callback=callback, n_jobs=n_jobs)
     return res1
 
 def etForAttribute(datal,a):
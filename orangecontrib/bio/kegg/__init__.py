@@ -53,7 +53,7 @@ import os
 import sys
 import threading
 
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from itertools import chain
 from datetime import datetime
 from contextlib import contextmanager
@@ -68,6 +68,7 @@ from orangecontrib.bio.kegg.brite import BriteEntry, Brite
 from orangecontrib.bio.kegg import api
 from orangecontrib.bio.kegg import conf
 from orangecontrib.bio.kegg import pathway
+from orangecontrib.bio.kegg.index import GenePathwayIndex
 
 from functools import reduce
 
@@ -85,6 +86,13 @@ KEGGPathway = pathway.Pathway
 
 DEFAULT_CACHE_DIR = conf.params["cache.path"]
 
+#: A single enriched pathway record as returned by
+#: :func:`Organism.get_enriched_pathways_batch`
+EnrichedPathway = namedtuple(
+    "EnrichedPathway",
+    ["list_index", "pathway", "genes", "p_value", "reference_count"]
+)
+
 
 class Organism(object):
     """
@@ -161,7 +169,7 @@ class Organism(object):
         Return a list of all pathways for this organism.
         """
         if with_ids is not None:
-            return self.api.get_pathways_by_genes(with_ids)
+            return self.get_pathways_by_genes(with_ids)
         else:
             return [p.entry_id for p in self.api.list_pathways(self.org_code)]
 
@@ -176,6 +184,18 @@ class Organism(object):
         # NOTE: remove/deprecate and use pathways()
         return self.pathways()
 
+    def gene_pathway_index(self):
+        """
+        Return a :class:`~.index.GenePathwayIndex` for this organism.
+
+        The index is built from a single (cached) KEGG link query and
+        is stored in the cache directory.
+        """
+        if getattr(self, "_gene_pathway_index", None) is None:
+            self._gene_pathway_index = GenePathwayIndex.for_organism(
+                self.org_code, self.api)
+        return self._gene_pathway_index
+
     def get_linked_pathways(self, pathway_id):
         self.api.get_linked_pathways(pathway_id)
 
@@ -189,40 +209,50 @@ class Organism(object):
         and (list_of_genes, p_value, num_of_reference_genes) tuples
         as items.
 
+        .. seealso:: :func:`get_enriched_pathways_batch`
+
+        """
+        table = self.get_enriched_pathways_batch(
+            [genes], reference=reference, prob=prob, callback=callback)
+        return dict([(rec.pathway, (rec.genes, rec.p_value,
+                                    rec.reference_count))
+                     for rec in table])
+
+    def get_enriched_pathways_batch(self, gene_lists, reference=None,
+                                    prob=utils.stats.Binomial(),
+                                    callback=None):
+        """
+        Run :func:`get_enriched_pathways` on each list in `gene_lists`.
+
+        Gene to pathway links are looked up in :func:`gene_pathway_index`
+        and reference counts are computed only once for all the lists.
+        Return a list of :class:`EnrichedPathway` records ordered by the
+        list index.
+
         """
+        gene_lists = [list(genes) for genes in gene_lists]
         if reference is None:
             reference = self.genes.keys()
         reference = set(reference)
 
-        allPathways = defaultdict(lambda: [[], 1.0, []])
-        milestones = progress_bar_milestones(len(genes), 100)
-        pathways_db = KEGGPathways()
-
-        pathways_for_gene = []
-        for i, gene in enumerate(genes):
-            pathways_for_gene.append(self.pathways([gene]))
+        index = self.gene_pathway_index()
+        reference_count = index.counts(reference)
+
+        table = []
+        milestones = progress_bar_milestones(len(gene_lists), 100)
+        for i, genes in enumerate(gene_lists):
+            mapped = index.mapped_genes(genes)
+            p_values = utils.stats.p_values(
+                prob, [len(m) for _, m in mapped], len(reference),
+                reference_count[[j for j, _ in mapped]], len(genes))
+
+            table.extend(
+                EnrichedPathway(i, index.pathways[j], m, p,
+                                int(reference_count[j]))
+                for (j, m), p in zip(mapped, p_values.tolist()))
             if callback and i in milestones:
-                callback(i * 50.0 / len(genes))
-
-        # pre-cache for speed
-        pathways_db.pre_cache([pid for pfg in pathways_for_gene
-                               for pid in pfg])
-        for i, (gene, pathways) in enumerate(zip(genes, pathways_for_gene)):
-            for pathway in pathways:
-                if pathways_db.get_entry(pathway).gene:
-                    allPathways[pathway][0].append(gene)
-            if callback and i in milestones:
-                callback(50.0 + i * 50.0 / len(genes))
-
-        pItems = allPathways.items()
-
-        for i, (p_id, entry) in enumerate(pItems):
-            pathway = pathways_db.get_entry(p_id)
-            entry[2].extend(reference.intersection(pathway.gene or []))
-            entry[1] = prob.p_value(len(entry[0]), len(reference),
-                                    len(entry[2]), len(genes))
-        return dict([(pid, (genes, p, len(ref)))
-                     for pid, (genes, p, ref) in allPathways.items()])
+                callback(i * 100.0 / len(gene_lists))
+        return table
 
     def get_genes_by_enzyme(self, enzyme):
         enzyme = KEGGEnzyme().get_entry(enzyme)
@@ -239,12 +269,8 @@ class Organism(object):
 
     def get_pathways_by_genes(self, gene_ids):
         """ Pathways that include all genes in gene_ids. """
-        l = self.api.get_genes_pathway_organism(self.org_code)
-        gene_ids = set(gene_ids)
-        gtp = defaultdict(set)
-        for a,b in l:
-            gtp[a].add(b)
-        pathways = [ gtp[g] for g in gene_ids ]
+        index = self.gene_pathway_index()
+        pathways = [set(index.pathways_of(g)) for g in set(gene_ids)]
         pathways = reduce(set.intersection, pathways)
         return sorted(pathways)
 
@@ -359,8 +359,13 @@ class CachedKeggApi(KeggApi):
         from . import conf
         path = conf.params["cache.path"]
         touch_dir(path)
-        return caching.Sqlite3Store(os.path.join(path,
-                                                 "kegg_api_cache_2.sqlite3"))
+        max_size = float(conf.params["cache.max_size"]) * 2 ** 20
+        return caching.Sqlite3Store(
+            os.path.join(path, "kegg_api_cache_2.sqlite3"),
+            compress=conf.params["cache.compress"].lower() in
+            ("1", "yes", "true", "on"),
+            max_size=int(max_size) if max_size > 0 else None,
+            release=getattr(self, "default_release", None))
 
     def last_modified(self, args, kwargs=None):
         return getattr(self, "default_release", "")
@@ -400,57 +405,64 @@ class CachedKeggApi(KeggApi):
             raise ValueError("Can batch at most 10 ids at a time.")
 
         get = self.get
-        uncached = []
-        unmatched = set()
+        keys = [get.key_from_args((id,)) for id in ids]
 
         with closing(get.cache_store()) as store:
             # Which ids are already cached
             # TODO: Invalidate entries by release string.
-            for id in ids:
-                key = get.key_from_args((id,))
-                if not get.key_has_valid_cache(key, store):
-                    uncached.append(id)
-
-        if uncached:
-            # in case there are duplicate ids
-            uncached = sorted(set(uncached))
-
-            rval = KeggApi.get(self, uncached)
-
-            if rval is not None:
-                entries = rval.split("///\n")
-            else:
-                entries = []
-
-            if entries and not entries[-1].strip():
-                # Delete the last single newline entry if present
-                del entries[-1]
-
-            if len(entries) != len(uncached):
-                new_uncached, entries = match_by_ids(uncached, entries)
-                unmatched = set(uncached) - set(new_uncached)
-                uncached = new_uncached
-                warnings.warn("Unable to match entries for keys: %s." %
-                              ", ".join(map(repr, unmatched)))
-
-            with closing(get.cache_store()) as store:
-                for id, entry in zip(uncached, entries):
-                    key = get.key_from_args((id,))
-                    if entry is not None:
-                        entry = entry + "///\n"
-                    store[key] = cache_entry(entry, mtime=datetime.now())
-
-        # Finally join all the results, but drop all None objects
-
-        with closing(get.cache_store()):
-            keys = [get.key_from_args((id,)) for id in ids]
-            entries = [store[key].value for key in keys]
+            uncached = [id for id, key in zip(ids, keys)
+                        if not get.key_has_valid_cache(key, store)]
+
+            if uncached:
+                store.update_many(self._fetch_batch(uncached))
+
+            # Finally join all the results, but drop all None objects
+            # (and unmatched ids)
+            cached = store.get_many(keys)
+            entries = [cached[key].value for key in keys if key in cached]
 
         entries = filter(lambda e: e is not None, entries)
 
         rval = "".join(entries)
         return rval
 
+    def _fetch_batch(self, ids):
+        """
+        Retrieve the entries for `ids` (at most 10) from the service and
+        return a list of (cache key, cache entry) pairs for the matched
+        ids. Nothing is stored in the cache.
+        """
+        if len(ids) > 10:
+            raise ValueError("Can batch at most 10 ids at a time.")
+
+        # in case there are duplicate ids
+        ids = sorted(set(ids))
+
+        rval = KeggApi.get(self, ids)
+
+        if rval is not None:
+            entries = rval.split("///\n")
+        else:
+            entries = []
+
+        if entries and not entries[-1].strip():
+            # Delete the last single newline entry if present
+            del entries[-1]
+
+        if len(entries) != len(ids):
+            new_ids, entries = match_by_ids(ids, entries)
+            unmatched = set(ids) - set(new_ids)
+            ids = new_ids
+            warnings.warn("Unable to match entries for keys: %s." %
+                          ", ".join(map(repr, unmatched)))
+
+        key_from_args = self.get.key_from_args
+        now = datetime.now()
+        return [(key_from_args((id,)),
+                 cache_entry(entry + "///\n" if entry is not None else None,
+                             mtime=now))
+                for id, entry in zip(ids, entries)]
+
     @cached_method
     def conv(self, target_db, source):
         return KeggApi.conv(self, target_db, source)
@@ -4,12 +4,15 @@ Caching framework for cached kegg api calls.
 """
 import os
 import sqlite3
+import threading
+import time
+import zlib
 try:
     import cPickle as pickle
 except ImportError:
     import pickle
 
-from contextlib import closing
+from contextlib import closing, contextmanager
 
 from datetime import datetime, date, timedelta
 from . import conf
@@ -19,7 +22,7 @@ import six
 try:
     from UserDict import DictMixin
 except ImportError:
-    from collections import MutableMapping as DictMixin
+    from collections.abc import MutableMapping as DictMixin
 
 class Store(object):
     def __init__(self):
@@ -35,71 +38,341 @@ class Store(object):
         pass
 
 
-class Sqlite3Store(Store, DictMixin):
-
+class _SharedConnection(object):
+    """
+    A sqlite3 connection shared by all stores on the same file (in
+    one process) with a lock serializing its use between threads.
+    """
     def __init__(self, filename):
-        self.filename = filename
-        self.con = sqlite3.connect(filename)
+        self.con = sqlite3.connect(filename, timeout=60,
+                                   check_same_thread=False)
+        # Concurrent readers (e.g. in other processes) do not block on
+        # a writer (and vice versa) with write ahead logging.
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
         self.con.execute("""
             CREATE TABLE IF NOT EXISTS cache
                 (key TEXT UNIQUE,
                  value TEXT
                 )
         """)
+        # Columns added to caches created by older versions
+        columns = [r[1] for r in self.con.execute("PRAGMA table_info(cache)")]
+        for name, decl in [("encoding", "INTEGER DEFAULT 0"),
+                           ("size", "INTEGER DEFAULT 0"),
+                           ("atime", "REAL DEFAULT 0"),
+                           ("release", "TEXT")]:
+            if name not in columns:
+                self.con.execute("ALTER TABLE cache ADD COLUMN %s %s" %
+                                 (name, decl))
+        if "size" not in columns:
+            self.con.execute("UPDATE cache SET size=length(value)")
         self.con.execute("""
             CREATE INDEX IF NOT EXISTS cache_index
             ON cache (key)
         """)
+        self.con.execute("""
+            CREATE INDEX IF NOT EXISTS cache_atime_index
+            ON cache (atime)
+        """)
         self.con.commit()
+        self.lock = threading.RLock()
+        # Nesting level of open transactions
+        self.depth = 0
+        # Statistics (for this process only)
+        self.hits = 0
+        self.misses = 0
+        # Approximate total size of values (computed on first use)
+        self.total_size = None
+
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def _shared_connection(filename):
+    # Connections must not be shared with forked child processes.
+    key = (os.getpid(), os.path.realpath(filename))
+    with _connections_lock:
+        if key not in _connections:
+            _connections[key] = _SharedConnection(filename)
+        return _connections[key]
+
+
+def _close_connections(path):
+    """
+    Close (and forget) the shared connections to databases in `path`.
+    """
+    path = os.path.realpath(path)
+    with _connections_lock:
+        for key in list(_connections):
+            pid, filename = key
+            if os.path.dirname(filename) == path:
+                shared = _connections.pop(key)
+                # connections inherited from a parent process are not ours
+                # to close
+                if pid == os.getpid():
+                    with shared.lock:
+                        shared.con.close()
+
+
+#: Value encodings
+ENCODING_PICKLE, ENCODING_ZLIB = 0, 1
+
+
+class Sqlite3Store(Store, DictMixin):
+    """
+    A persistent (pickling) key value store in a sqlite3 database.
+
+    All stores on the same file use one shared connection per process.
+    Use :func:`transaction` (or :func:`update_many`) to group many writes
+    into a single commit.
+
+    :param str filename: Database filename.
+    :param bool compress: Compress (new) values with zlib.
+    :param int max_size:
+        Maximum total size of (encoded) values in bytes. Least recently
+        used entries are evicted when it is exceeded (default ``None``,
+        unlimited).
+    :param str release:
+        Database release. Entries stored with a different release are
+        treated as missing (default ``None``, entries are never invalid).
+
+    """
+    #: Access times are only updated when older than this (in seconds).
+    ATIME_RESOLUTION = 3600
+
+    #: Evict entries down to this fraction of `max_size`.
+    EVICT_FRACTION = 0.9
+
+    def __init__(self, filename, compress=False, max_size=None,
+                 release=None):
+        Store.__init__(self)
+        self.filename = filename
+        self.compress = compress
+        self.max_size = max_size
+        self.release = release
+        self._shared = _shared_connection(filename)
+        self.con = self._shared.con
+
+    @contextmanager
+    def transaction(self):
+        """
+        A context manager grouping all writes within it into a single
+        transaction, which is committed on exit (or rolled back on
+        error). Transactions can be nested; only the outermost commits.
+        """
+        shared = self._shared
+        with shared.lock:
+            shared.depth += 1
+            try:
+                yield self
+            except BaseException:
+                shared.depth -= 1
+                if shared.depth == 0:
+                    self.con.rollback()
+                raise
+            else:
+                shared.depth -= 1
+                if shared.depth == 0:
+                    self.con.commit()
+
+    def _dumps(self, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.compress:
+            return ENCODING_ZLIB, zlib.compress(data)
+        else:
+            return ENCODING_PICKLE, data
+
+    def _loads(self, key, pickle_str, encoding=ENCODING_PICKLE):
+        if not six.PY3:
+            pickle_str = str(pickle_str)
+        try:
+            if encoding == ENCODING_ZLIB:
+                pickle_str = zlib.decompress(pickle_str)
+            return pickle.loads(pickle_str)
+        except Exception:
+            raise KeyError(key)
+
+    def _select(self, keys):
+        """
+        Return a list of (key, value, encoding) for valid entries in
+        `keys` and update their access times.
+        """
+        keys = list(keys)
+        rows = []
+        with self._shared.lock:
+            # stay below the sqlite's host parameter limit (999)
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                cur = self.con.execute("""
+                    SELECT key, value, encoding, atime, release
+                    FROM cache
+                    WHERE key IN (%s)
+                """ % ", ".join("?" * len(batch)), batch)
+                rows.extend(cur.fetchall())
+
+            now = time.time()
+            if self.release is not None:
+                rows = [r for r in rows if r[4] == self.release]
+            stale = [(now, r[0]) for r in rows
+                     if now - (r[3] or 0) > self.ATIME_RESOLUTION]
+            if stale:
+                with self.transaction():
+                    self.con.executemany("""
+                        UPDATE cache
+                        SET atime=?
+                        WHERE key=?
+                    """, stale)
+            self._shared.hits += len(rows)
+            self._shared.misses += len(set(keys)) - len(rows)
+        return [r[:3] for r in rows]
 
     def __getitem__(self, key):
-        cur = self.con.execute("""
-            SELECT value
-            FROM cache
-            WHERE key=?
-        """, (key,))
-        r = cur.fetchall()
+        r = self._select([key])
         if not r:
             raise KeyError(key)
         else:
-            pickle_str = r[0][0]
-            if not six.PY3:
-                pickle_str = str(pickle_str)
+            _, value, encoding = r[0]
+            return self._loads(key, value, encoding)
+
+    def get_many(self, keys):
+        """
+        Return a dictionary with values of all `keys` present in the
+        store.
+        """
+        rval = {}
+        for key, value, encoding in self._select(keys):
             try:
-                return pickle.loads(pickle_str)
-            except Exception:
-                raise KeyError(key)
+                rval[key] = self._loads(key, value, encoding)
+            except KeyError:
+                pass
+        return rval
 
     def __setitem__(self, key, value):
-        value = pickle.dumps(value)
-        self.con.execute("""
-            INSERT OR REPLACE INTO cache
-            VALUES (?, ?)
-        """, (key, value))
-        self.con.commit()
+        self.update_many([(key, value)])
+
+    def update_many(self, items):
+        """
+        Insert or replace all (key, value) pairs in `items` in a single
+        transaction.
+        """
+        now = time.time()
+        rows = []
+        for key, value in items:
+            encoding, data = self._dumps(value)
+            rows.append((key, sqlite3.Binary(data), encoding, len(data),
+                         now, self.release))
+
+        shared = self._shared
+        with self.transaction():
+            self.con.executemany("""
+                INSERT OR REPLACE INTO cache
+                    (key, value, encoding, size, atime, release)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rows)
+            if shared.total_size is not None:
+                shared.total_size += sum(r[3] for r in rows)
+
+            if self.max_size is not None and \
+                    self._total_size() > self.max_size:
+                self.evict()
+
+    def _total_size(self):
+        shared = self._shared
+        with shared.lock:
+            if shared.total_size is None:
+                shared.total_size = self.con.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            return shared.total_size
+
+    def evict(self, max_size=None, max_age=None):
+        """
+        Remove least recently used entries until the total size is
+        below `max_size` (default ``EVICT_FRACTION * self.max_size``) and
+        all entries not used in the last `max_age` seconds. Return the
+        number of removed entries.
+        """
+        if max_size is None and self.max_size is not None:
+            max_size = int(self.EVICT_FRACTION * self.max_size)
+
+        shared = self._shared
+        removed = 0
+        with self.transaction():
+            if max_age is not None:
+                cur = self.con.execute("""
+                    DELETE FROM cache
+                    WHERE atime < ?
+                """, (time.time() - max_age,))
+                removed += cur.rowcount
+
+            shared.total_size = None
+            total = self._total_size()
+            if max_size is not None and total > max_size:
+                cur = self.con.execute("""
+                    SELECT key, size
+                    FROM cache
+                    ORDER BY atime
+                """)
+                evicted = []
+                for key, size in cur:
+                    if total <= max_size:
+                        break
+                    evicted.append((key,))
+                    total -= size
+                self.con.executemany("""
+                    DELETE FROM cache
+                    WHERE key=?
+                """, evicted)
+                removed += len(evicted)
+                shared.total_size = total
+        return removed
+
+    def stats(self):
+        """
+        Return a dictionary of cache statistics: number of `entries`,
+        total size of values in `bytes` and `hits`, `misses` and
+        `hit_rate` of lookups in this process.
+        """
+        shared = self._shared
+        with shared.lock:
+            entries, size = self.con.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+            ).fetchone()
+            shared.total_size = size
+            lookups = shared.hits + shared.misses
+            return {"entries": entries,
+                    "bytes": size,
+                    "hits": shared.hits,
+                    "misses": shared.misses,
+                    "hit_rate": float(shared.hits) / lookups if lookups else 0.0}
 
     def __delitem__(self, key):
-        self.con.execute("""
-            DELETE FROM cache
-            WHERE key=?
-        """, (key,))
-        self.con.commit()
+        with self.transaction():
+            self.con.execute("""
+                DELETE FROM cache
+                WHERE key=?
+            """, (key,))
+            self._shared.total_size = None
 
     def keys(self):
-        cur = self.con.execute("""
-            SELECT key
-            FROM cache
-        """)
-        return [str(r[0]) for r in cur.fetchall()]
+        with self._shared.lock:
+            cur = self.con.execute("""
+                SELECT key
+                FROM cache
+            """)
+            return [str(r[0]) for r in cur.fetchall()]
 
     def close(self):
+        # The connection is shared
         pass
 
     def __len__(self):
-        return None
+        with self._shared.lock:
+            return self.con.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
 
     def __iter__(self):
-        return None
+        return iter(self.keys())
 
 
 
@@ -178,20 +451,24 @@ class cached_wrapper(object):
     def __call__(self, *args):
         key = self.key_from_args(args)
         with closing(self.cache_store()) as store:
-            if self.key_has_valid_cache(key, store):
-                rval = store[key].value
+            entry = self._valid_entry(key, store)
+            if entry is not None:
+                rval = entry.value
             else:
                 rval = self.function(self.instance, *args)
                 store[key] = cache_entry(rval, datetime.now(), None)
 
         return rval
 
-    def key_has_valid_cache(self, key, store):
-        if key not in store:
-            return False
-        else:
+    def _valid_entry(self, key, store):
+        try:
             entry = store[key]
-            return self.is_entry_valid(entry, None)
+        except KeyError:
+            return None
+        return entry if self.is_entry_valid(entry, None) else None
+
+    def key_has_valid_cache(self, key, store):
+        return self._valid_entry(key, store) is not None
 
     def is_entry_valid(self, entry, args):
         # For now always return True, the caching architecture needs to be
@@ -277,8 +554,13 @@ def clear_cache():
         raise Exception("Non default cache path. Please remove the contents "
                         "of %r manually." % path)
 
-    for cache_filename in glob.glob(os.path.join(path, "*.sqlite3")):
-        os.remove(cache_filename)
+    _close_connections(path)
+    for pattern in ["*.sqlite3", "*.sqlite3-wal", "*.sqlite3-shm"]:
+        for cache_filename in glob.glob(os.path.join(path, pattern)):
+            os.remove(cache_filename)
+
+    for index_filename in glob.glob(os.path.join(path, "*.bin")):
+        os.remove(index_filename)
 
     for ko_filename in glob.glob(os.path.join(path, "*.keg")):
         os.remove(ko_filename)
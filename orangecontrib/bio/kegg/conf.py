@@ -22,7 +22,12 @@ default = """
 # path = %(home)s/.obiKEGG/
 path = %(kegg_dir)s/
 store = sqlite3
+# 'release' invalidates cached entries from other KEGG releases
 invalidate = weekly
+# compress the cached values
+compress = true
+# maximum size of the api cache in megabytes (0 for unlimited)
+max_size = 0
 
 [service]
 transport = urllib2
@@ -49,6 +54,8 @@ _ALL_PARAMS = [
     "cache.path",
     "cache.store",
     "cache.invalidate",
+    "cache.compress",
+    "cache.max_size",
     "service.transport"
 ]
 
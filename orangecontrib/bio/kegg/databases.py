@@ -7,11 +7,14 @@ from __future__ import absolute_import
 
 import sys
 import re
+import time
 from contextlib import closing
+from multiprocessing.pool import ThreadPool
 
 from . import entry
 from .entry import fields
 from . import api
+from . import conf
 
 
 def iter_take(source_iter, n):
@@ -35,6 +38,21 @@ def batch_iter(source_iter, n):
             break
 
 
+def _retry(func, args, retries=2, backoff=1.0):
+    """
+    Return `func(*args)`, retrying at most `retries` times (with an
+    exponentially increasing delay starting at `backoff` seconds) if it
+    raises an exception.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return func(*args)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
 def chain_iter(chains_iter):
     for iter in chains_iter:
         for element in iter:
@@ -74,9 +92,12 @@ class DBDataBase(object):
 
         self.api = api.CachedKeggApi()
         self._info = None
-        #TODO invalidate cache by KEGG release
-        #self.api.set_default_release(self.info.release)
+        if conf.params["cache.invalidate"] == "release":
+            # invalidate cached entries from other KEGG releases
+            self.api.set_default_release(self.info.release)
         self._keys = []
+        # (keys list, frozenset of keys) for constant time membership tests
+        self._key_set = (None, frozenset())
 
     @property
     def info(self): #lazy info loading
@@ -172,10 +193,15 @@ class DBDataBase(object):
             return e
 
     def __contains__(self, key):
-        return key in set(self.keys())
+        keys, key_set = self._key_set
+        if keys is not self._keys:
+            # (re)build the set only when the key list is (re)assigned
+            key_set = frozenset(self._keys)
+            self._key_set = (self._keys, key_set)
+        return key in key_set
 
     def __len__(self):
-        return len(self.keys())
+        return len(self._keys)
 
     def __iter__(self):
         return iter(self.keys())
@@ -204,12 +230,26 @@ class DBDataBase(object):
         res = self.api.find(self.DB, name).splitlines()
         return [r.split(" ", 1)[0] for r in res]
 
-    def pre_cache(self, keys=None, batch_size=10, progress_callback=None):
+    def pre_cache(self, keys=None, batch_size=10, progress_callback=None,
+                  max_workers=1, retries=2, backoff=1.0, write_batch=500):
         """
         Retrieve all the entries for `keys` and cache them locally for faster
         subsequent retrieval. If `keys` is ``None`` then all entries will be
         retrieved.
 
+        :param int batch_size: Number of entries per request (at most 10).
+        :param progress_callback: Called with the progress in percents.
+        :param int max_workers:
+            Maximum number of concurrent requests (default 1).
+        :param int retries:
+            Number of times a failed request is retried.
+        :param float backoff:
+            Delay (in seconds) before the first retry. It is doubled for
+            each consecutive retry.
+        :param int write_batch:
+            Number of retrieved entries written to the cache store in
+            one transaction.
+
         """
         if not isinstance(self.api, api.CachedKeggApi):
             raise TypeError("Not an instance of api.CachedKeggApi")
@@ -220,28 +260,48 @@ class DBDataBase(object):
         if keys is None:
             keys = self.keys()
 
-        keys = map(self._add_db, keys)
+        keys = list(map(self._add_db, keys))
 
         get = self.api.get
 
-        # drop all keys with a valid cache entry to minimize the number
-        # of 'get' requests.
         with closing(get.cache_store()) as store:
-            def is_uncached(key):
-                cache_key = get.key_from_args((key,))
-                return not get.key_has_valid_cache(cache_key, store)
-            keys = [key for key in keys if is_uncached(key)]
+            # drop all keys with a valid cache entry to minimize the number
+            # of 'get' requests.
+            cached = store.get_many(get.key_from_args((key,)) for key in keys)
 
-        start = 0
-
-        while start < len(keys):
-            batch = keys[start: start + batch_size]
-            self.api.get(batch)
-
-            if progress_callback:
-                progress_callback(100.0 * start / len(keys))
+            def is_uncached(key):
+                entry = cached.get(get.key_from_args((key,)))
+                return entry is None or not get.is_entry_valid(entry, None)
 
-            start += batch_size
+            keys = [key for key in keys if is_uncached(key)]
+            batches = list(batch_iter(keys, batch_size))
+
+            def fetch(batch):
+                return _retry(self.api._fetch_batch, (batch,),
+                              retries=retries, backoff=backoff)
+
+            pool = None
+            if max_workers > 1 and len(batches) > 1:
+                pool = ThreadPool(min(max_workers, len(batches)))
+                results = pool.imap_unordered(fetch, batches)
+            else:
+                results = (fetch(batch) for batch in batches)
+
+            pending = []
+            try:
+                for i, items in enumerate(results):
+                    pending.extend(items)
+                    if len(pending) >= write_batch:
+                        store.update_many(pending)
+                        pending = []
+
+                    if progress_callback:
+                        progress_callback(100.0 * (i + 1) / len(batches))
+            finally:
+                # store whatever was retrieved, even on errors
+                store.update_many(pending)
+                if pool is not None:
+                    pool.terminate()
 
     def batch_get(self, keys):
         """
@@ -58,15 +58,78 @@ def entry_decorate(cls):
 class DBEntry(object):
     """
     A DBGET entry object.
+
+    The entry text is parsed lazily; each section is parsed when its
+    field is first accessed (all of them when accessing :obj:`fields`).
     """
     FIELDS = [("ENTRY", fields.DBEntryField)]
     MULTIPLE_FIELDS = []
 
     def __init__(self, text=None):
+        # Unparsed sections ({title: [section text, ...]}) or None if
+        # the text was not yet split into sections
         self._sections = {}
-        self.fields = []
+        self._text = text
+        self._fields = []
         if text is not None:
-            self.parse(text)
+            self._sections = None
+            self._fields = None
+
+    @property
+    def fields(self):
+        """
+        A list of all fields (in the order of the entry text).
+        """
+        if self._fields is None:
+            self.parse(self._text)
+        return self._fields
+
+    @fields.setter
+    def fields(self, fields):
+        self._fields = fields
+
+    def __getattr__(self, name):
+        # Called only for missing attributes; parse the section `name`
+        # if the entry has one.
+        if name.startswith("__") or name in ("_sections", "_text", "_fields",
+                                              "_entry_line"):
+            raise AttributeError(name)
+        if self._sections is None:
+            self._sections = self._split_sections(self._text)
+            entry = self._sections.get("ENTRY", [""])[0]
+            self._entry_line = entry.splitlines(True)[0] if entry else ""
+        if name not in self._sections:
+            raise AttributeError(name)
+
+        text = "".join(self._sections.pop(name))
+        if name != "ENTRY":
+            # the parser needs the ENTRY line to determine the indentation
+            text = self._entry_line + text
+        parsed = self._parse_fields(text)
+        if name != "ENTRY":
+            parsed = parsed[1:]
+        self._set_fields(parsed)
+        return self.__dict__[name]
+
+    @staticmethod
+    def _split_sections(text):
+        """
+        Split the entry `text` into sections. Return a dictionary
+        mapping section titles to lists of section texts.
+        """
+        sections = defaultdict(list)
+        current = None
+        for line in text.splitlines(True):
+            if line.startswith("///"):
+                break
+            elif not line.startswith(" "):
+                title = line.split(" ", 1)[0].rstrip()
+                current = [line]
+                sections[title].append(current)
+            elif current is not None:
+                current.append(line)
+        return dict((title, ["".join(s) for s in texts])
+                    for title, texts in sections.items())
 
     @property
     def entry_key(self):
@@ -79,6 +142,15 @@ class DBEntry(object):
         """
         Parse `text` string containing a formated DBGET entry.
         """
+        self._text = text
+        self._sections = {}
+        self.fields = self._parse_fields(text)
+        self._consolidate()
+
+    def _parse_fields(self, text):
+        """
+        Parse `text` and return a list of all fields.
+        """
         parser = DBGETEntryParser()
         gen = parser.parse_string(text)
         field_constructors = dict(self.FIELDS)
@@ -118,25 +190,29 @@ class DBEntry(object):
             elif event == DBGETEntryParser.ENTRY_END:
                 break
 
-        self.fields = entry_fields
-        self._consolidate()
+        return entry_fields
 
     def _consolidate(self):
         """
         Update mapping to field entries.
         """
+        for title in set(f.TITLE for f in self.fields) & \
+                set(self.MULTIPLE_FIELDS):
+            self.__dict__.pop(title, None)
+        self._set_fields(self.fields)
+
+    def _set_fields(self, entry_fields):
         registered_fields = dict(self.FIELDS)
         multiple_fields = set(self.MULTIPLE_FIELDS)
 
-        for field in self.fields:
+        for field in entry_fields:
             title = field.TITLE
             if title not in registered_fields:
-                import warnings
                 warnings.warn("Nonregisterd field %r in %r" % \
                               (title, type(self)))
 
             if title in multiple_fields:
-                if not hasattr(self, title):
+                if title not in self.__dict__:
                     setattr(self, title, [])
                 getattr(self, title).append(field)
             else:
@@ -0,0 +1,202 @@
+"""
+Compact (persistent) indices over KEGG link data.
+
+"""
+from __future__ import absolute_import
+
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy
+import scipy.sparse
+
+from orangecontrib.bio.utils import arrayfile
+
+from . import conf
+from .caching import touch_dir, _SESSION_START
+
+
+def _invalidate_before():
+    """
+    Return the (posix) time before which cached indices without a known
+    KEGG release are outdated (according to the 'cache.invalidate' setting).
+    """
+    policy = conf.params["cache.invalidate"]
+    if policy == "always":
+        return float("inf")
+    elif policy == "session":
+        since = _SESSION_START
+    elif policy == "daily":
+        since = datetime.now().replace(hour=0, minute=0, second=0,
+                                       microsecond=0)
+    else:
+        since = datetime.now() - timedelta(7)
+    return time.mktime(since.timetuple())
+
+
+class GenePathwayIndex(object):
+    """
+    A gene <-> pathway incidence index for a single organism.
+
+    :param list genes: Sorted list of KEGG gene ids.
+    :param list pathways: Sorted list of KEGG pathway ids.
+    :param matrix: A boolean (genes x pathways) incidence matrix.
+
+    """
+    #: Version of the on disk format
+    VERSION = 1
+
+    def __init__(self, genes, pathways, matrix):
+        self.genes = list(genes)
+        self.pathways = list(pathways)
+        self.gene_index = dict((g, i) for i, g in enumerate(self.genes))
+        self.pathway_index = dict((p, i) for i, p in enumerate(self.pathways))
+        self.matrix = scipy.sparse.csr_matrix(matrix, dtype=bool)
+        self.matrix.sort_indices()
+        self._matrix_csc = None
+
+    @classmethod
+    def from_links(cls, links):
+        """
+        Build the index from a sequence of (gene, pathway) pairs (as
+        returned by :func:`KeggApi.get_genes_pathway_organism`).
+        """
+        links = list(links)
+        genes = sorted(set(g for g, _ in links))
+        pathways = sorted(set(p for _, p in links))
+        gene_index = dict((g, i) for i, g in enumerate(genes))
+        pathway_index = dict((p, i) for i, p in enumerate(pathways))
+        rows = numpy.array([gene_index[g] for g, _ in links], dtype=numpy.int32)
+        cols = numpy.array([pathway_index[p] for _, p in links],
+                           dtype=numpy.int32)
+        matrix = scipy.sparse.coo_matrix(
+            (numpy.ones(len(links), dtype=bool), (rows, cols)),
+            shape=(len(genes), len(pathways))).tocsr()
+        return cls(genes, pathways, matrix)
+
+    @classmethod
+    def for_organism(cls, org_code, api, cache_path=None, release=None):
+        """
+        Return the index for organism `org_code`. The index is loaded
+        from the cache directory or built from ``api`` link data (a
+        :class:`CachedKeggApi` instance) and saved there.
+
+        A cached index is rebuilt when it was built for a different KEGG
+        `release` (by default the ``api``'s default release) or, if the
+        release is unknown, when it is outdated by the 'cache.invalidate'
+        setting.
+        """
+        if cache_path is None:
+            cache_path = conf.params["cache.path"]
+        if release is None:
+            release = getattr(api, "default_release", None)
+        filename = os.path.join(cache_path, "gene_pathway_%s.bin" % org_code)
+        if os.path.exists(filename):
+            try:
+                return cls.load(filename, release=release,
+                                not_before=_invalidate_before())
+            except (arrayfile.FormatError, KeyError, ValueError):
+                pass
+
+        index = cls.from_links(api.get_genes_pathway_organism(org_code))
+        try:
+            touch_dir(cache_path)
+            index.save(filename, release=release)
+        except (IOError, OSError):
+            pass
+        return index
+
+    def save(self, filename, release=None):
+        arrays = {"indptr": self.matrix.indptr.astype(numpy.int64),
+                  "indices": self.matrix.indices.astype(numpy.int32)}
+        arrayfile.save_strings(arrays, "genes", self.genes)
+        arrayfile.save_strings(arrays, "pathways", self.pathways)
+        meta = {"version": self.VERSION, "release": release,
+                "timestamp": time.time()}
+        arrayfile.save(filename, arrays, meta=meta)
+
+    @classmethod
+    def load(cls, filename, release=None, not_before=None):
+        """
+        Load an index saved with :func:`save`. If `release` is given the
+        index must have been saved for the same release, otherwise (if
+        `not_before` is given) it must have been saved after `not_before`
+        (a posix time). Raise :class:`arrayfile.FormatError` if not.
+        """
+        meta, arrays = arrayfile.load(filename, mmap=False)
+        if not meta or meta.get("version") != cls.VERSION:
+            raise arrayfile.FormatError("Incompatible index version")
+        if release is not None:
+            if meta.get("release") != release:
+                raise arrayfile.FormatError("Index from a different release")
+        elif not_before is not None:
+            if meta.get("timestamp", 0) < not_before:
+                raise arrayfile.FormatError("Outdated index")
+        genes = arrayfile.load_strings(arrays, "genes").tolist()
+        pathways = arrayfile.load_strings(arrays, "pathways").tolist()
+        data = numpy.ones(len(arrays["indices"]), dtype=bool)
+        matrix = scipy.sparse.csr_matrix(
+            (data, arrays["indices"], arrays["indptr"]),
+            shape=(len(genes), len(pathways)))
+        return cls(genes, pathways, matrix)
+
+    def __len__(self):
+        return len(self.genes)
+
+    def gene_rows(self, genes):
+        """
+        Return a (positions, rows) tuple of arrays, where positions are
+        the positions of the known `genes` in the sequence and rows
+        their row indices in :obj:`matrix`.
+        """
+        index = self.gene_index
+        pairs = [(i, index[g]) for i, g in enumerate(genes) if g in index]
+        pairs = numpy.array(pairs, dtype=int).reshape(-1, 2)
+        return pairs[:, 0], pairs[:, 1]
+
+    def pathways_of(self, gene):
+        """Return a list of pathways for `gene`."""
+        row = self.gene_index.get(gene)
+        if row is None:
+            return []
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        return [self.pathways[j] for j in self.matrix.indices[start:end]]
+
+    def genes_of(self, pathway):
+        """Return a list of genes in `pathway`."""
+        col = self.pathway_index.get(pathway)
+        if col is None:
+            return []
+        if self._matrix_csc is None:
+            self._matrix_csc = self.matrix.tocsc()
+            self._matrix_csc.sort_indices()
+        csc = self._matrix_csc
+        start, end = csc.indptr[col], csc.indptr[col + 1]
+        return [self.genes[i] for i in csc.indices[start:end]]
+
+    def counts(self, genes):
+        """
+        Return an array with the number of (distinct) `genes` in each
+        pathway.
+        """
+        _, rows = self.gene_rows(set(genes))
+        mask = numpy.zeros(len(self.genes), dtype=bool)
+        mask[rows] = True
+        return numpy.asarray(
+            self.matrix.T.dot(mask.astype(numpy.int32))).ravel()
+
+    def mapped_genes(self, genes):
+        """
+        Return a list of (pathway index, mapped genes) tuples for all
+        pathways that include any of the `genes`. The mapped genes keep
+        their order (and repetitions) from `genes`.
+        """
+        genes = list(genes)
+        positions, rows = self.gene_rows(genes)
+        sub = self.matrix[rows].tocsc()
+        sub.sort_indices()
+        indptr, indices = sub.indptr, sub.indices
+        return [(j, [genes[positions[i]]
+                     for i in indices[indptr[j]:indptr[j + 1]]])
+                for j in numpy.flatnonzero(numpy.diff(indptr))]
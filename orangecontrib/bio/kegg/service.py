@@ -3,6 +3,10 @@
 """
 from __future__ import absolute_import
 
+from contextlib import closing
+
+from six.moves.urllib.request import urlopen
+
 REST_API = "http://rest.kegg.jp/"
 
 
@@ -27,6 +31,48 @@ def slumber_service():
     return slumber_service._cached
 
 
+class _UrlResource(object):
+    """
+    A REST resource at `url` (sub resources are accessed as attributes
+    or by calling it with additional path components).
+    """
+    def __init__(self, url, timeout):
+        self._url = url
+        self._timeout = timeout
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return _UrlResource(self._url + "/" + name, self._timeout)
+
+    def __call__(self, *path):
+        return _UrlResource("/".join([self._url] + list(map(str, path))),
+                            self._timeout)
+
+    def get(self):
+        with closing(urlopen(self._url, timeout=self._timeout)) as stream:
+            return stream.read().decode("utf-8")
+
+
+class _UrlService(object):
+    def __init__(self, base_url, timeout):
+        self._base_url = base_url.rstrip("/")
+        self._timeout = timeout
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return _UrlResource(self._base_url + "/" + name, self._timeout)
+
+
+def urllib_service(base_url=REST_API, timeout=60):
+    """
+    Return a rest based service using only the standard library (with
+    the same interface as :func:`slumber_service`).
+    """
+    return _UrlService(base_url, timeout)
+
+
 from . import conf
 
 default_service = slumber_service
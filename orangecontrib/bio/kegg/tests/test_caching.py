@@ -0,0 +1,136 @@
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import backports.unittest_mock
+    backports.unittest_mock.install()
+    from unittest import mock
+
+from orangecontrib.bio.kegg import caching, conf
+
+
+class TestSqlite3Store(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, "cache.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_store(self):
+        store = caching.Sqlite3Store(self.filename)
+        store["a"] = [1, 2]
+        self.assertEqual(store["a"], [1, 2])
+        self.assertTrue("a" in store)
+        self.assertFalse("b" in store)
+        with self.assertRaises(KeyError):
+            store["b"]
+        del store["a"]
+        self.assertFalse("a" in store)
+
+    def test_shared_connection(self):
+        store1 = caching.Sqlite3Store(self.filename)
+        store2 = caching.Sqlite3Store(self.filename)
+        self.assertIs(store1.con, store2.con)
+        mode, = store1.con.execute("PRAGMA journal_mode").fetchone()
+        self.assertEqual(mode.lower(), "wal")
+
+    def test_update_many(self):
+        store = caching.Sqlite3Store(self.filename)
+        store.update_many(("k%i" % i, i) for i in range(1200))
+        values = store.get_many(["k%i" % i for i in range(0, 1300, 100)])
+        self.assertEqual(values, dict(("k%i" % i, i)
+                                      for i in range(0, 1200, 100)))
+        self.assertEqual(len(store.keys()), 1200)
+
+    def test_transaction(self):
+        store = caching.Sqlite3Store(self.filename)
+        other = sqlite3.connect(self.filename)
+
+        def committed():
+            return [k for k, in other.execute("SELECT key FROM cache")]
+
+        with store.transaction():
+            store["a"] = 1
+            with store.transaction():
+                store["b"] = 2
+            self.assertEqual(committed(), [])
+        self.assertEqual(sorted(committed()), ["a", "b"])
+
+        with self.assertRaises(ValueError):
+            with store.transaction():
+                store["c"] = 3
+                raise ValueError
+        self.assertFalse("c" in store)
+        other.close()
+
+    def test_compress(self):
+        store = caching.Sqlite3Store(self.filename, compress=True)
+        value = "ENTRY " * 1000
+        store["a"] = value
+        size, = store.con.execute(
+            "SELECT size FROM cache WHERE key='a'").fetchone()
+        self.assertLess(size, 200)
+        # readable regardless of the compress setting
+        self.assertEqual(caching.Sqlite3Store(self.filename)["a"], value)
+
+    def test_migrate(self):
+        con = sqlite3.connect(self.filename)
+        con.execute("CREATE TABLE cache (key TEXT UNIQUE, value TEXT)")
+        con.execute("INSERT INTO cache VALUES (?, ?)",
+                    ("a", sqlite3.Binary(pickle.dumps([1]))))
+        con.commit()
+        con.close()
+        store = caching.Sqlite3Store(self.filename)
+        self.assertEqual(store["a"], [1])
+        self.assertGreater(store.stats()["bytes"], 0)
+
+    def test_evict(self):
+        store = caching.Sqlite3Store(self.filename, max_size=10000)
+        store.ATIME_RESOLUTION = 0
+        for i in range(5):
+            store["k%i" % i] = "x" * 1500
+            store.con.execute("UPDATE cache SET atime=? WHERE key=?",
+                              (i + 1, "k%i" % i))
+        store["k0"]  # k0 is now the most recently used
+        store.update_many([("k5", "x" * 1500), ("k6", "x" * 1500)])
+        self.assertLessEqual(store.stats()["bytes"], 9000)
+        self.assertEqual(sorted(store), ["k0", "k3", "k4", "k5", "k6"])
+
+        self.assertEqual(store.evict(max_age=3600), 2)
+        self.assertEqual(len(store), 3)
+
+    def test_release(self):
+        caching.Sqlite3Store(self.filename, release="81.0")["a"] = 1
+        self.assertEqual(
+            caching.Sqlite3Store(self.filename, release="81.0")["a"], 1)
+        self.assertEqual(caching.Sqlite3Store(self.filename)["a"], 1)
+        self.assertFalse(
+            "a" in caching.Sqlite3Store(self.filename, release="82.0"))
+
+    def test_stats(self):
+        store = caching.Sqlite3Store(self.filename)
+        store.update_many([("a", 1), ("b", 2)])
+        store.get_many(["a", "b", "c"])
+        stats = store.stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+        self.assertAlmostEqual(stats["hit_rate"], 2. / 3)
+
+    def test_clear_cache(self):
+        filename = os.path.join(self.path, "api.sqlite3")
+        caching.Sqlite3Store(filename)["a"] = 1
+        with mock.patch.dict(conf.params, {"cache.path": self.path}), \
+                mock.patch.object(conf, "kegg_dir", self.path):
+            caching.clear_cache()
+        self.assertEqual(os.listdir(self.path), [])
+        store = caching.Sqlite3Store(filename)
+        self.assertFalse("a" in store)
+        store["b"] = 2
+        self.assertEqual(caching.Sqlite3Store(filename)["b"], 2)
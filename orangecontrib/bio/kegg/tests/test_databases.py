@@ -1,9 +1,23 @@
 import os
+import shutil
+import tempfile
+import threading
 import unittest
+import warnings
+
 import six
+from six.moves import BaseHTTPServer, socketserver
+
+try:
+    from unittest import mock
+except ImportError:
+    import backports.unittest_mock
+    backports.unittest_mock.install()
+    from unittest import mock
 
 from orangecontrib.bio.kegg import databases
 from orangecontrib.bio.kegg import pathway
+from orangecontrib.bio.kegg import conf, service
 
 
 class RemoteResourceTest(unittest.TestCase):
@@ -98,3 +112,97 @@ class TestUtils(unittest.TestCase):
         for exp, batch in zip(expected,
                               databases.batch_iter(iter, 10)):
             self.assertEqual(exp, batch)
+
+
+class StubKeggHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves `list/cpd` and `get/<ids>` requests for a small compound
+    database (the first `get` request fails).
+    """
+    COMPOUNDS = ["C%05i" % i for i in range(1, 96)]
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            fail = self.path.startswith("/get/") and not server.failed
+            server.failed = server.failed or fail
+
+        if self.path == "/list/cpd":
+            body = "".join("cpd:%s\tcompound %s\n" % (c, c)
+                           for c in self.COMPOUNDS)
+        elif self.path.startswith("/get/") and not fail:
+            ids = self.path[len("/get/"):].split("+")
+            body = "".join("ENTRY       %s   Compound\nNAME        %s\n///\n"
+                           % (id.split(":", 1)[1], id) for id in ids)
+        else:
+            self.send_error(500)
+            return
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class TestPreCache(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingServer(("127.0.0.1", 0), StubKeggHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.failed = False
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.cache_path = tempfile.mkdtemp()
+        self._old_cache_path = conf.params["cache.path"]
+        conf.params["cache.path"] = self.cache_path
+        url = "http://127.0.0.1:%i/" % self.server.server_address[1]
+        self._mock = mock.patch(
+            "orangecontrib.bio.kegg.api.web_service",
+            lambda: service.urllib_service(url, timeout=10))
+        self._mock.start()
+
+    def tearDown(self):
+        self._mock.stop()
+        conf.params["cache.path"] = self._old_cache_path
+        shutil.rmtree(self.cache_path)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_pre_cache(self):
+        compounds = databases.Compound()
+        keys = list(compounds.keys())
+        self.assertEqual(len(keys), 95)
+
+        progress = []
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            compounds.pre_cache(keys[:-5], max_workers=4, backoff=0,
+                                write_batch=20,
+                                progress_callback=progress.append)
+        gets = [r for r in self.server.requests if r.startswith("/get/")]
+        # 9 batches and one retried failure
+        self.assertEqual(len(gets), 10)
+        self.assertEqual(len(progress), 9)
+        self.assertEqual(progress[-1], 100.0)
+
+        # only the remaining keys are requested
+        compounds.pre_cache(keys)
+        gets = [r for r in self.server.requests if r.startswith("/get/")]
+        self.assertEqual(len(gets), 11)
+
+        del self.server.requests[:]
+        entries = compounds.batch_get(keys)
+        self.assertEqual([e.entry_key for e in entries],
+                         [k.split(":")[1] for k in keys])
+        self.assertFalse(any(r.startswith("/get/")
+                             for r in self.server.requests))
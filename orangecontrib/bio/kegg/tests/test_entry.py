@@ -33,6 +33,36 @@ class TestEntry(unittest.TestCase):
         self.assertEqual(entry.ENTRY.TITLE, "ENTRY")
         self.assertEqual(str(entry), TEST_ENTRY[:-4])
 
+    def test_lazy_entry(self):
+        """
+        Test that sections are parsed on first access.
+        """
+        entry = Entry(TEST_ENTRY)
+        self.assertNotIn("DESCRIPTION", entry.__dict__)
+        description = entry.DESCRIPTION
+        self.assertNotIn("NAME", entry.__dict__)
+        self.assertEqual(description.format(),
+                         Entry(TEST_ENTRY).fields[2].format())
+        self.assertEqual(description.subsections[0].TITLE, "SUB")
+        self.assertEqual(entry.NAME.text, "test\n")
+        self.assertFalse(hasattr(entry, "COMMENT"))
+        self.assertEqual(str(entry), TEST_ENTRY[:-4])
+
+    def test_lazy_multiple_fields(self):
+        @entry_decorate
+        class MultipleEntry(DBEntry):
+            FIELDS = [("ENTRY", fields.DBEntryField),
+                      ("NAME", fields.DBSimpleField),
+                      ("DESCRIPTION", fields.DBSimpleField)]
+            MULTIPLE_FIELDS = ["NAME"]
+
+        text = TEST_ENTRY.replace("NAME        test\n",
+                                  "NAME        test\nNAME        other\n")
+        entry = MultipleEntry(text)
+        self.assertEqual(entry.name, ["test", "other"])
+        self.assertEqual(len(entry.fields), 4)
+        self.assertEqual(entry.name, ["test", "other"])
+
 
 class TestParser(unittest.TestCase):
     def test_parser(self):
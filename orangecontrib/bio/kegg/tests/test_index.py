@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import backports.unittest_mock
+    backports.unittest_mock.install()
+    from unittest import mock
+
+import numpy
+
+from orangecontrib.bio.kegg import conf
+from orangecontrib.bio.kegg.index import GenePathwayIndex
+
+LINKS = [
+    ("hsa:1", "path:hsa00010"),
+    ("hsa:2", "path:hsa00010"),
+    ("hsa:2", "path:hsa00020"),
+    ("hsa:3", "path:hsa00020"),
+    ("hsa:4", "path:hsa00030"),
+]
+
+
+class LinkApi(object):
+    calls = 0
+
+    def get_genes_pathway_organism(self, org):
+        self.calls += 1
+        return list(LINKS)
+
+
+class TestGenePathwayIndex(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_index(self):
+        index = GenePathwayIndex.from_links(LINKS)
+        self.assertEqual(index.genes, ["hsa:1", "hsa:2", "hsa:3", "hsa:4"])
+        self.assertEqual(index.pathways_of("hsa:2"),
+                         ["path:hsa00010", "path:hsa00020"])
+        self.assertEqual(index.pathways_of("hsa:5"), [])
+        self.assertEqual(index.genes_of("path:hsa00020"), ["hsa:2", "hsa:3"])
+        numpy.testing.assert_array_equal(
+            index.counts(["hsa:1", "hsa:2", "hsa:2", "x"]), [2, 1, 0])
+
+        mapped = index.mapped_genes(["hsa:3", "x", "hsa:2", "hsa:3"])
+        self.assertEqual(
+            [(index.pathways[j], genes) for j, genes in mapped],
+            [("path:hsa00010", ["hsa:2"]),
+             ("path:hsa00020", ["hsa:3", "hsa:2", "hsa:3"])])
+        self.assertEqual(index.mapped_genes(["x"]), [])
+
+    def test_for_organism(self):
+        api = LinkApi()
+        index = GenePathwayIndex.for_organism("hsa", api, self.path)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.path, "gene_pathway_hsa.bin")))
+        loaded = GenePathwayIndex.for_organism("hsa", api, self.path)
+        self.assertEqual(api.calls, 1)
+        self.assertEqual(loaded.genes, index.genes)
+        self.assertEqual(loaded.pathways, index.pathways)
+        self.assertEqual((loaded.matrix != index.matrix).nnz, 0)
+
+    def test_for_organism_release(self):
+        api = LinkApi()
+        api.default_release = "Release 80.0"
+        GenePathwayIndex.for_organism("hsa", api, self.path)
+        GenePathwayIndex.for_organism("hsa", api, self.path)
+        self.assertEqual(api.calls, 1)
+
+        # a new KEGG release invalidates the cached index
+        api.default_release = "Release 81.0"
+        GenePathwayIndex.for_organism("hsa", api, self.path)
+        self.assertEqual(api.calls, 2)
+        GenePathwayIndex.for_organism("hsa", api, self.path,
+                                      release="Release 80.0")
+        self.assertEqual(api.calls, 3)
+
+    def test_for_organism_outdated(self):
+        api = LinkApi()
+        GenePathwayIndex.for_organism("hsa", api, self.path)
+        with mock.patch.dict(conf.params, {"cache.invalidate": "always"}):
+            GenePathwayIndex.for_organism("hsa", api, self.path)
+        self.assertEqual(api.calls, 2)
+
+    def test_for_organism_readonly(self):
+        api = LinkApi()
+        with mock.patch.object(GenePathwayIndex, "save",
+                               side_effect=OSError("Read-only file system")):
+            index = GenePathwayIndex.for_organism("hsa", api, self.path)
+        self.assertEqual(index.genes, ["hsa:1", "hsa:2", "hsa:3", "hsa:4"])
+        self.assertFalse(
+            os.path.exists(os.path.join(self.path, "gene_pathway_hsa.bin")))
@@ -3,16 +3,22 @@ import sqlite3
 import tarfile
 import shutil
 import tempfile
-import collections
 import textwrap
 
 from collections import namedtuple
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 try:
     from urllib2 import urlopen
 except ImportError:
     from urllib.request import urlopen
 
+import numpy
+
 import six
 
 __all__ = ["Taxonomy"]
@@ -45,11 +51,14 @@ class taxon(_taxon):
     _repr_pretty_ = namedtuple_repr_pretty
 
 
-class Taxonomy(collections.Mapping):
+class Taxonomy(Mapping):
     SCHEMA_VERSION = (0, 0, 1)
 
-    def __init__(self, taxdb):
-        self._con = sqlite3.connect(taxdb, timeout=15)
+    def __init__(self, taxdb, check_same_thread=True):
+        self._con = sqlite3.connect(taxdb, timeout=15,
+                                    check_same_thread=check_same_thread)
+        self._parents = None
+        self._search_indexed = False
         self._con.execute("""
             CREATE INDEX IF NOT EXISTS
                 index_names_tax_id ON names(tax_id)
@@ -61,10 +70,11 @@ class Taxonomy(collections.Mapping):
             FROM nodes INNER JOIN ranks USING(rank_id)
             WHERE tax_id = ?
         """, (tax_id,))
-        if not c:
+        node = c.fetchone()
+        if node is None:
             raise KeyError(tax_id)
         else:
-            return next(c)
+            return node
 
     def __getitem__(self, tax_id):
         if not isinstance(tax_id, six.string_types):
@@ -98,35 +108,133 @@ class Taxonomy(collections.Mapping):
         return next(c)[0]
 
     def search(self, name, exact=True):
-        # First ensure the name column is indexed.
-        self._con.execute("""
-            CREATE INDEX IF NOT EXISTS
-                index_names_name ON names(name)""")
+        """
+        Return an iterator over tax ids of taxa with a `name` (or a name
+        starting with `name` if not `exact`). Case is ignored. The best
+        matches come first (see :func:`search_many`).
+        """
+        return iter(self.search_many([name], exact)[0])
 
-        if not exact:
-            name = "{0}%".format(name)
-            operator = "LIKE"
-        else:
-            operator = "="
+    def search_many(self, names, exact=True, ranks=None):
+        """
+        Search for many `names` at once. Return a list of lists of tax ids
+        (one for each name).
 
-        c = self._con.execute("""
-            SELECT DISTINCT(tax_id)
-            FROM names
-            WHERE names.name {operator} ?
-            """.format(operator=operator), (name,))
-        return (str(r[0]) for r in c)
+        The tax ids are ordered by relevance: exact matches before prefix
+        matches, scientific names before other names and shorter names
+        before longer ones.
+
+        :param list names: Names (or name prefixes) to search for.
+        :param bool exact: Match whole names (otherwise name prefixes).
+        :param list ranks: If given, return only taxa with these ranks
+            (e.g. ``["species"]``).
+
+        """
+        self._ensure_search_index()
+        names = list(names)
+        results = [[] for _ in names]
+        if not names:
+            return results
+
+        if exact:
+            condition = "names.name = q.name"
+        else:
+            # A range scan over the (case insensitive) index of names
+            # instead of 'LIKE' so '%' and '_' are not wildcards.
+            condition = "names.name >= q.name AND names.name < q.upper"
+        join_ranks = rank_filter = ""
+        ranks = list(ranks) if ranks is not None else None
+        if ranks is not None:
+            join_ranks = ("INNER JOIN nodes ON nodes.tax_id = names.tax_id "
+                          "INNER JOIN ranks USING(rank_id)")
+            rank_filter = "WHERE ranks.rank IN ({0})".format(
+                ", ".join("?" * len(ranks)))
+
+        scientific = self._con.execute("""
+            SELECT name_class_id FROM name_classes
+            WHERE name_class = 'scientific name'
+        """).fetchone()
+        scientific = scientific[0] if scientific is not None else -1
+
+        # query in chunks to stay within the limit on sql parameters
+        chunk_size = 250
+        for offset in range(0, len(names), chunk_size):
+            chunk = names[offset: offset + chunk_size]
+            values = ", ".join(["(?, ?, ?)"] * len(chunk))
+            params = []
+            for i, name in enumerate(chunk):
+                params.extend([offset + i, name, name + u"\U0010ffff"])
+            params.extend(ranks or [])
+            params.append(scientific)
+            c = self._con.execute("""
+                WITH q(idx, name, upper) AS (VALUES {values})
+                SELECT q.idx, names.tax_id
+                FROM q INNER JOIN names ON {condition}
+                {join_ranks}
+                {rank_filter}
+                ORDER BY q.idx,
+                         names.name != q.name,
+                         names.name_class_id != ?,
+                         length(names.name),
+                         names.tax_id
+                """.format(values=values, condition=condition,
+                           join_ranks=join_ranks, rank_filter=rank_filter),
+                params)
+            current, seen = None, set()
+            for idx, tax_id in c:
+                if idx != current:
+                    current, seen = idx, set()
+                if tax_id not in seen:
+                    seen.add(tax_id)
+                    results[idx].append(str(tax_id))
+        return results
+
+    def _ensure_search_index(self):
+        # Databases created by older versions of init_db lack the index
+        if not self._search_indexed:
+            self._con.execute("""
+                CREATE INDEX IF NOT EXISTS
+                    index_names_name ON names(name)""")
+            self._search_indexed = True
 
     def lineage(self, tax_id):
+        if not isinstance(tax_id, six.string_types):
+            raise TypeError("Expected a string")
+
+        parents = self.parent_array()
+        try:
+            node = int(tax_id)
+        except ValueError:
+            raise KeyError(tax_id)
+        if not 0 <= node < len(parents) or parents[node] < 0:
+            raise KeyError(tax_id)
+
         lineage = []
-        while True:
-            parent = self.parent_tax_id(tax_id)
-            if parent is not None:
-                lineage.append(parent)
-                tax_id = parent
-            else:
-                break
+        parent = int(parents[node])
+        while parent != node:
+            lineage.append(str(parent))
+            node, parent = parent, int(parents[parent])
         return list(reversed(lineage))
 
+    def parent_array(self):
+        """
+        Return an array of parent tax ids indexed by (integer) tax id
+        (-1 for ids not in the taxonomy). The root is its own parent.
+        """
+        if self._parents is None:
+            c = self._con.execute("SELECT MAX(tax_id) FROM nodes")
+            size = (c.fetchone()[0] or 0) + 1
+            parents = numpy.full(size, -1, dtype=numpy.int32)
+            c = self._con.execute("SELECT tax_id, parent_tax_id FROM nodes")
+            while True:
+                rows = c.fetchmany(100000)
+                if not rows:
+                    break
+                rows = numpy.array(rows, dtype=numpy.int64)
+                parents[rows[:, 0]] = rows[:, 1]
+            self._parents = parents
+        return self._parents
+
     def parent_tax_id(self, tax_id):
         if not isinstance(tax_id, six.string_types):
             raise TypeError("Expected a string")
@@ -268,5 +376,8 @@ class Taxonomy(collections.Mapping):
                            ((int(tax_id), name, name_class_id[name_class])
                             for tax_id, name, name_class in names))
 
+        cursor.execute("CREATE INDEX index_names_tax_id ON names(tax_id)")
+        cursor.execute("CREATE INDEX index_names_name ON names(name)")
+
         con.commit()
         con.close()
@@ -19,7 +19,10 @@ from io import StringIO
 from collections import defaultdict, namedtuple
 from operator import itemgetter
 
-from .utils import serverfiles
+import numpy
+import scipy.sparse
+
+from .utils import serverfiles, arrayfile
 try:
     from Orange.utils import ConsoleProgressBar, wget
 except ImportError:
@@ -40,6 +43,154 @@ def mkdir_p(path, mode=0o777):
             raise
 
 
+def _query_ids_table(db, ids, name="ppi_query_ids"):
+    """
+    Create (or replace) a temporary table `name` (id, idx) in the `db`
+    connection holding `ids` and their positions (for repeated ids the
+    first position is kept). Return the qualified table name.
+    """
+    db.execute("DROP TABLE IF EXISTS temp.%s" % name)
+    db.execute("CREATE TEMP TABLE %s (id TEXT PRIMARY KEY, idx INTEGER)"
+               % name)
+    db.executemany("INSERT OR IGNORE INTO temp.%s VALUES (?, ?)" % name,
+                   ((id, i) for i, id in enumerate(ids)))
+    return "temp." + name
+
+
+def _edge_arrays(rows):
+    """
+    Return a (src, dst, score) tuple of arrays from a sequence of
+    (src index, dst index, score) rows (missing scores are NaN).
+    """
+    rows = list(rows)
+    src = numpy.array([r[0] for r in rows], dtype=numpy.int64)
+    dst = numpy.array([r[1] for r in rows], dtype=numpy.int64)
+    score = numpy.array([numpy.nan if r[2] is None else r[2] for r in rows],
+                        dtype=float)
+    return src, dst, score
+
+
+class LinkIndex(object):
+    """
+    A compact (CSR) representation of directed links between proteins.
+
+    :param list ids: Sorted protein ids.
+    :param indptr: Links of the i-th protein are at
+        ``indptr[i]:indptr[i + 1]`` in `neighbors` and `scores`.
+    :param neighbors: Indices (into `ids`) of linked proteins.
+    :param scores: Link scores (NaN if missing).
+
+    """
+    #: Version of the on disk format
+    VERSION = 1
+
+    def __init__(self, ids, indptr, neighbors, scores):
+        self.ids = ids
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.scores = scores
+        self._ids_array = None
+
+    @classmethod
+    def from_links(cls, links):
+        """
+        Build the index from a sequence of (id1, id2, score) links.
+        """
+        codes = {}
+        src, dst, scores = [], [], []
+        code = codes.setdefault
+        for id1, id2, score in links:
+            src.append(code(id1, len(codes)))
+            dst.append(code(id2, len(codes)))
+            scores.append(numpy.nan if score is None else score)
+
+        ids = sorted(codes)
+        # map insertion codes to positions in the sorted ids
+        recode = numpy.empty(len(ids), dtype=numpy.int32)
+        recode[[codes[id] for id in ids]] = numpy.arange(len(ids))
+        src = recode[numpy.array(src, dtype=numpy.int32)]
+        dst = recode[numpy.array(dst, dtype=numpy.int32)]
+        order = numpy.argsort(src, kind="mergesort")
+        indptr = numpy.zeros(len(ids) + 1, dtype=numpy.int64)
+        indptr[1:] = numpy.cumsum(numpy.bincount(src, minlength=len(ids)))
+        return cls(ids, indptr, dst[order],
+                   numpy.array(scores, dtype=float)[order])
+
+    @classmethod
+    def for_database(cls, db, query, filename=None):
+        """
+        Return the index of links selected by `query` (id1, id2, score)
+        from the `db` connection. If `filename` (of the database) is
+        given the index is stored in (and loaded from) a file next to it.
+        """
+        if filename is None:
+            return cls.from_links(db.execute(query))
+
+        idxname = filename + ".links.idx"
+        st = os.stat(filename)
+        meta = {"version": cls.VERSION, "query": query,
+                "source_size": st.st_size, "source_mtime": int(st.st_mtime)}
+        try:
+            saved_meta, arrays = arrayfile.load(idxname)
+            if saved_meta != meta:
+                raise arrayfile.FormatError("Outdated index")
+            return cls(arrayfile.load_strings(arrays, "ids"),
+                       arrays["indptr"], arrays["neighbors"],
+                       arrays["scores"])
+        except Exception:
+            pass
+
+        index = cls.from_links(db.execute(query))
+        arrays = {"indptr": index.indptr, "neighbors": index.neighbors,
+                  "scores": index.scores}
+        arrayfile.save_strings(arrays, "ids", index.ids)
+        try:
+            arrayfile.save(idxname, arrays, meta=meta)
+        except (IOError, OSError):
+            pass
+        return index
+
+    def positions(self, ids):
+        """
+        Return an array of positions of `ids` in :obj:`ids` (-1 for ids
+        not in the index).
+        """
+        if self._ids_array is None:
+            self._ids_array = numpy.array(list(self.ids), dtype=object)
+        all_ids = self._ids_array
+        query = numpy.empty(len(ids), dtype=object)
+        query[:] = ids
+        if not len(all_ids):
+            return numpy.full(len(query), -1, dtype=numpy.int64)
+        pos = numpy.searchsorted(all_ids, query)
+        pos[pos == len(all_ids)] = 0
+        return numpy.where(all_ids[pos] == query, pos, -1)
+
+    def subnetwork(self, ids):
+        """
+        Return the links between `ids` as (src, dst, score) arrays where
+        `src` and `dst` are indices into `ids`.
+        """
+        pos = self.positions(ids)
+        # position in ids of each indexed protein (the first if repeated)
+        lookup = numpy.full(len(self.indptr) - 1, -1, dtype=numpy.int64)
+        found = numpy.flatnonzero(pos >= 0)[::-1]
+        lookup[pos[found]] = found
+        # links only from the first occurrences of repeated ids
+        found = found[::-1]
+        found = found[lookup[pos[found]] == found]
+
+        starts = self.indptr[pos[found]]
+        counts = self.indptr[pos[found] + 1] - starts
+        src = numpy.repeat(found, counts)
+        # positions of all links of found proteins
+        links = numpy.repeat(starts - numpy.cumsum(counts) + counts, counts) + \
+            numpy.arange(counts.sum())
+        dst = lookup[self.neighbors[links]]
+        mask = dst >= 0
+        return src[mask], dst[mask], self.scores[links[mask]].astype(float)
+
+
 class PPIDatabase(object):
     """
     A general interface for protein-protein interaction database access.
@@ -104,10 +255,7 @@ class PPIDatabase(object):
         return the edges for this organism only.
 
         """
-        res = []
-        for id in self.ids(taxid):
-            res.extend(self.edges_annotated(id))
-        return res
+        return self.edges_annotated_many(self.ids(taxid))
 
     def edges_annotated(self, id=None):
         """
@@ -115,6 +263,61 @@ class PPIDatabase(object):
         """
         raise NotImplementedError
 
+    def synonyms_many(self, ids):
+        """
+        Return a dictionary mapping all `ids` to lists of their synonyms.
+        """
+        return dict((id, self.synonyms(id)) for id in ids)
+
+    def edges_many(self, ids):
+        """
+        Return a list of all edges where any of the `ids` is a
+        participant (a list of 3-tuples (id1, id2, score)).
+        """
+        edges = set()
+        for id in ids:
+            edges.update(self.edges(id))
+        return list(edges)
+
+    def edges_annotated_many(self, ids):
+        """
+        Return a list of all annotated edges for `ids`.
+        """
+        res = []
+        for id in ids:
+            res.extend(self.edges_annotated(id))
+        return res
+
+    def subnetwork(self, ids):
+        """
+        Return the subnetwork of edges between `ids` as a tuple of arrays
+        (src, dst, score), where `src` and `dst` are indices into `ids`
+        and missing scores are NaN.
+        """
+        index = {}
+        for i, id in enumerate(ids):
+            index.setdefault(id, i)
+        return _edge_arrays(
+            (index[id1], index[id2], score)
+            for id1, id2, score in self.edges_many(index)
+            if id1 in index and id2 in index)
+
+    def adjacency_matrix(self, ids):
+        """
+        Return the subnetwork between `ids` as a sparse (csr) adjacency
+        matrix of scores (missing scores are 1; for repeated edges the
+        maximum score is used).
+        """
+        n = len(ids)
+        src, dst, score = self.subnetwork(ids)
+        score = numpy.where(numpy.isnan(score), 1.0, score)
+        order = numpy.lexsort((-score, dst, src))
+        src, dst, score = src[order], dst[order], score[order]
+        first = numpy.ones(len(src), dtype=bool)
+        first[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        return scipy.sparse.csr_matrix(
+            (score[first], (src[first], dst[first])), shape=(n, n))
+
     def search_id(self, name, taxid=None):
         """
         Search the database for protein name. Return a list of matching
@@ -128,15 +331,14 @@ class PPIDatabase(object):
         """
         from Orange import network
 
+        ids = list(ids)
+        synonyms = self.synonyms_many(ids)
         graph = network.Graph()
         for id in ids:
-            graph.add_node(id, synonyms=",".join(self.synonyms(id)))
-
-        for id in ids:
-            edges = self.edges(id)
+            graph.add_node(id, synonyms=",".join(synonyms[id]))
 
-            for id1, id2, score in edges:
-                graph.add_edge(id1, id2, weight=score)
+        for id1, id2, score in self.edges_many(ids):
+            graph.add_edge(id1, id2, weight=score)
 
         return graph
 
@@ -360,6 +562,62 @@ class BioGRID(PPIDatabase):
         """, (id, id))
         return cur.fetchall()
 
+    def synonyms_many(self, ids):
+        table = _query_ids_table(self.db, ids)
+        cur = self.db.execute("""\
+            select biogrid_id_interactor,
+                   entrez_gene_interactor,
+                   systematic_name_interactor,
+                   official_symbol_interactor,
+                   synonyms_interactor
+            from proteins join %s on biogrid_id_interactor=id
+            """ % table)
+        synonyms = dict((id, []) for id in ids)
+        seen = set()
+        for rec in cur:
+            if rec[0] in seen:
+                continue  # use only the first record (as synonyms does)
+            seen.add(rec[0])
+            names = list(rec[1:-1]) + \
+                (rec[-1].split("|") if rec[-1] is not None else [])
+            synonyms[rec[0]] = [s for s in names if s is not None]
+        return synonyms
+
+    def edges_many(self, ids):
+        table = _query_ids_table(self.db, ids)
+        cur = self.db.execute("""\
+            select biogrid_id_interactor_a, biogrid_id_interactor_b, score
+            from links
+            where biogrid_id_interactor_a in (select id from {0}) or
+                  biogrid_id_interactor_b in (select id from {0})
+        """.format(table))
+        return cur.fetchall()
+
+    def edges_annotated_many(self, ids):
+        table = _query_ids_table(self.db, ids)
+        cur = self.db.execute("""\
+            select *
+            from links
+            where biogrid_id_interactor_a in (select id from {0}) or
+                  biogrid_id_interactor_b in (select id from {0})
+        """.format(table))
+        return cur.fetchall()
+
+    def link_index(self):
+        """
+        Return a :class:`LinkIndex` of all links (from interactor a to b).
+        """
+        if getattr(self, "_link_index", None) is None:
+            self._link_index = LinkIndex.for_database(
+                self.db,
+                "select biogrid_id_interactor_a, biogrid_id_interactor_b, "
+                "score from links",
+                getattr(self, "filename", None))
+        return self._link_index
+
+    def subnetwork(self, ids):
+        return self.link_index().subnetwork(list(ids))
+
     def search_id(self, name, taxid=None):
         """
         Search the database for protein name. Return a list of matching
@@ -687,11 +945,50 @@ class STRING(PPIDatabase):
             """, (id,))
         return cur.fetchall()
 
-    def all_edges_annotated(self, taxid=None):
-        res = []
-        for id in self.ids(taxid):
-            res.extend(self.edges_annotated(id))
-        return res
+    def synonyms_many(self, ids):
+        table = _query_ids_table(self.db, ids)
+        cur = self.db.execute("""\
+            select protein_id, alias
+            from aliases join %s on protein_id=id
+            """ % table)
+        synonyms = dict((id, []) for id in ids)
+        for id, alias in cur:
+            synonyms[id].append(alias)
+        return synonyms
+
+    def edges_many(self, ids):
+        table = _query_ids_table(self.db, ids)
+        cur = self.db.execute("""\
+            select protein_id1, protein_id2, score
+            from links join %s on protein_id1=id
+            """ % table)
+        return cur.fetchall()
+
+    def edges_annotated_many(self, ids):
+        table = _query_ids_table(self.db, ids)
+        cur = self.db.execute("""\
+            select links.protein_id1, links.protein_id2, links.score,
+                   actions.action, actions.mode, actions.score
+            from %s as q
+                 join links on links.protein_id1=q.id
+                 left join actions on
+                   links.protein_id1=actions.protein_id1 and
+                   links.protein_id2=actions.protein_id2
+        """ % table)
+        return list(map(STRINGInteraction._make, cur.fetchall()))
+
+    def link_index(self):
+        """
+        Return a :class:`LinkIndex` of all links.
+        """
+        if getattr(self, "_link_index", None) is None:
+            self._link_index = LinkIndex.for_database(
+                self.db, "select protein_id1, protein_id2, score from links",
+                self.filename)
+        return self._link_index
+
+    def subnetwork(self, ids):
+        return self.link_index().subnetwork(list(ids))
 
     def edges_annotated(self, id):
         cur = self.db.execute("""\
@@ -1014,6 +1311,24 @@ class STRINGDetailed(STRING):
             )
         return edges_nc
 
+    def edges_annotated_many(self, ids):
+        edges = STRING.edges_annotated_many(self, ids)
+        table = _query_ids_table(self.db_detailed, ids)
+        cur = self.db_detailed.execute("""
+            SELECT protein_id1, protein_id2, neighborhood, fusion,
+                   cooccurence, coexpression, experimental, database,
+                   textmining
+            FROM evidence JOIN %s ON protein_id1=id
+            """ % table)
+        evidence = {}
+        for row in cur:
+            evidence.setdefault(row[:2], row[2:])
+        return [STRINGDetailedInteraction(
+                    *(tuple(edge) +
+                      tuple(evidence.get((edge.protein_id1,
+                                          edge.protein_id2), [0] * 7))))
+                for edge in edges]
+
     @classmethod
     def init_db(cls, version, taxid, cache_dir=None, dbfilename=None):
         if cache_dir is None:
@@ -2,8 +2,11 @@ from __future__ import absolute_import, division
 
 import os
 import sys
+import threading
 import warnings
 
+from collections import OrderedDict
+
 try:
     import cPickle as pickle
 except ImportError:
@@ -178,70 +181,213 @@ def pickled_cache(filename=None, dependencies=[], version=1, maxSize=30,
     return cached
 
 
+class _LRUCache(object):
+    """
+    A bounded mapping discarding the least recently used items.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            # reinsert to mark the item as the most recently used
+            value = self._items.pop(key)
+            self._items[key] = value
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = value
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class TaxonomyService(object):
+    """
+    A process wide access to the NCBI taxonomy database.
+
+    All queries go through a single database connection (serialized
+    with a lock) and their results are kept in an in memory LRU cache.
+    Use :func:`taxonomy_service` to get the shared instance.
+
+    :param str filename: Taxonomy sqlite database file name.
+
+    """
+    #: Max number of cached query results
+    CACHE_SIZE = 10000
+
+    def __init__(self, filename):
+        from .ncbi.taxonomy import Taxonomy as NCBITaxonomy
+        self.filename = filename
+        self.lock = threading.RLock()
+        self.tax = NCBITaxonomy(filename, check_same_thread=False)
+        self._cache = _LRUCache(self.CACHE_SIZE)
+
+    def cached(self, key, func, *args):
+        """
+        Return the (cached) result of `func(*args)`.
+        """
+        key = (key,) + args
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        with self.lock:
+            value = func(*args)
+        self._cache[key] = value
+        return value
+
+    def entry(self, taxid):
+        """Return the :class:`ncbi.taxonomy.taxon` for `taxid`."""
+        try:
+            return self.cached("entry", self.tax.__getitem__, taxid)
+        except KeyError:
+            raise UnknownSpeciesIdentifier(taxid)
+
+    def name(self, taxid):
+        return self.entry(taxid).name
+
+    def other_names(self, taxid):
+        return [(name, q) for name, q in self.entry(taxid).synonyms
+                if q != "scientific name"]
+
+    def search(self, string, onlySpecies=True, exact=False):
+        return self.search_many([string], onlySpecies, exact)[0]
+
+    def search_many(self, strings, onlySpecies=True, exact=False):
+        strings = list(strings)
+        results = {}
+        for string in set(strings):
+            try:
+                results[string] = self._cache[
+                    ("search", string, onlySpecies, exact)]
+            except KeyError:
+                pass
+
+        missing = sorted(set(strings) - set(results))
+        if missing:
+            ranks = ["species"] if onlySpecies else None
+            with self.lock:
+                found = self.tax.search_many(missing, exact, ranks=ranks)
+            for string, ids in zip(missing, found):
+                results[string] = tuple(ids)
+                self._cache[("search", string, onlySpecies, exact)] = \
+                    results[string]
+        return [list(results[string]) for string in strings]
+
+    def lineage(self, taxid):
+        try:
+            return list(self.cached("lineage", self.tax.lineage, taxid))
+        except KeyError:
+            raise UnknownSpeciesIdentifier(taxid)
+
+    def close(self):
+        with self.lock:
+            self.tax._con.close()
+            self._cache.clear()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def taxonomy_service():
+    """
+    Return the shared :class:`TaxonomyService` (downloading the taxonomy
+    database if needed).
+
+    The service is recreated when the database file is updated and in
+    forked child processes (the sqlite connection can not be shared
+    between processes).
+    """
+    global _service
+    filename = serverfiles.localpath(Taxonomy.DOMAIN, Taxonomy.FILENAME)
+    if not os.path.exists(filename):
+        filename = serverfiles.localpath_download(Taxonomy.DOMAIN,
+                                                  Taxonomy.FILENAME)
+
+    def state():
+        st = os.stat(filename)
+        return (os.getpid(), filename, st.st_size, st.st_mtime)
+
+    with _service_lock:
+        if _service is None or _service[0] != state():
+            service = TaxonomyService(filename)
+            # (opening the database can update its indices)
+            _service = (state(), service)
+        return _service[1]
+
+
 class Taxonomy(object):
     DOMAIN = "Taxonomy"
     FILENAME = "ncbi-taxonomy.sqlite"
 
     def __init__(self):
-        from .ncbi.taxonomy import Taxonomy
-        # Ensure the taxonomy db is downloaded.
-        filename = serverfiles.localpath_download(self.DOMAIN, self.FILENAME)
-        self._tax = Taxonomy(filename)
+        # Share the connection (and the cached queries) of the process
+        # wide service.
+        self._service = taxonomy_service()
+        self._tax = self._service.tax
+        self._lock = self._service.lock
 
     def get_entry(self, id):
-        try:
-            return self._tax[id]
-        except KeyError:
-            raise UnknownSpeciesIdentifier(id)
+        return self._service.entry(id)
 
     def search(self, string, onlySpecies=True, exact=False):
-        res = self._tax.search(string, exact)
-        if onlySpecies:
-            res = [taxid for taxid in res
-                   if self._tax[taxid].rank == "species"]
-        return res
+        return self._service.search(string, onlySpecies, exact)
 
     def __iter__(self):
-        return iter(self._tax)
+        return iter(self.taxids())
 
     def __getitem__(self, id):
         return self.get_entry(id).name
 
     def other_names(self, id):
-        return [(name, q) for name, q in self._tax[id].synonyms
-                if q != "scientific name"]
+        return self._service.other_names(id)
 
     def rank(self, id):
-        return self._tax[id].rank
+        return self.get_entry(id).rank
 
     def parent(self, id):
-        return self._tax[id].parent_tax_id
+        return self.get_entry(id).parent_tax_id
 
     def subnodes(self, id, levels=1):
-        res = self._tax.child_tax_ids(id)
+        with self._lock:
+            res = self._tax.child_tax_ids(id)
         if levels > 1:
-            for child_id in res:
+            for child_id in list(res):
                 res.extend(self.subnodes(child_id, levels - 1))
         return res
 
     def taxids(self):
-        return list(self._tax)
+        with self._lock:
+            return list(self._tax)
 
 
-@pickled_cache(None, [("Taxonomy", "ncbi-taxonomy.sqlite")], version=2)
 def name(taxid):
     """
     Return the scientific name for organism with taxid.
     """
     # Most of the lookups will be for the common names, so in most
     # situations we can avoid loading the taxonomy.
-    if taxid in _COMMON_NAMES:
-        return _COMMON_NAMES[taxid]
+    if taxid in _COMMON_NAMES_MAPPING:
+        return _COMMON_NAMES_MAPPING[taxid]
     else:
-        return Taxonomy()[taxid]
+        return taxonomy_service().name(taxid)
 
 
-@pickled_cache(None, [("Taxonomy", "ncbi-taxonomy.sqlite")], version=2)
 def other_names(taxid):
     """
     Return a list of (name, name_type) tuples excluding the scientific name.
@@ -249,10 +395,9 @@ def other_names(taxid):
     Use :func:`name` to retrieve the scientific name.
 
     """
-    return  Taxonomy().other_names(taxid)
+    return taxonomy_service().other_names(taxid)
 
 
-@pickled_cache(None, [("Taxonomy", "ncbi-taxonomy.sqlite")], version=2)
 def search(string, onlySpecies=True, exact=False):
     """ Search the NCBI taxonomy database for an organism.
 
@@ -260,15 +405,22 @@ def search(string, onlySpecies=True, exact=False):
     :param onlySpecies: Return only taxids of species (and subspecies).
     :param exact:  Return only taxids of organism that exactly match the string.
     """
-    ids = Taxonomy().search(string, onlySpecies, exact)
-    return list(ids)
+    return taxonomy_service().search(string, onlySpecies, exact)
+
+
+def search_many(strings, onlySpecies=True, exact=False):
+    """ Search the NCBI taxonomy database for many organisms at once.
+
+    Return a list of lists of taxids (best matches first), one for each
+    search string. See :func:`search` for parameters.
+    """
+    return taxonomy_service().search_many(strings, onlySpecies, exact)
 
 
-@pickled_cache(None, [("Taxonomy", "ncbi-taxonomy.sqlite")], version=2)
 def lineage(taxid):
     """ Return a list of taxids ordered from the topmost node (root) to taxid.
     """
-    return Taxonomy()._tax.lineage(taxid)
+    return taxonomy_service().lineage(taxid)
 
 
 def to_taxid(code, mapTo=None):
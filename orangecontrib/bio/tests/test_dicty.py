@@ -0,0 +1,41 @@
+import unittest
+
+import numpy
+
+from orangecontrib.bio import dicty
+from orangecontrib.bio.utils import compat
+
+
+@unittest.skipUnless(compat.OR3, "Orange 3 only")
+class TestAverage(unittest.TestCase):
+    def setUp(self):
+        from Orange.data import (Domain, ContinuousVariable, StringVariable,
+                                 Table)
+        atts = [ContinuousVariable("a%d" % i) for i in range(4)]
+        for i, a in enumerate(atts):
+            a.attributes.update({"id": "x%d" % i, "replicate": str(i % 2),
+                                 "time": str(i // 2)})
+        domain = Domain(atts, None, [StringVariable("DDB")])
+        X = numpy.array([[1, 2, 3, 4], [numpy.nan, 6, 7, 8],
+                         [9, 10, numpy.nan, numpy.nan]])
+        metas = numpy.array([["g1"], ["g2"], ["g1"]], dtype=object)
+        self.data = Table.from_numpy(domain, X, None, metas)
+
+    def test_average_attributes(self):
+        avg = dicty.averageAttributes(self.data)
+        numpy.testing.assert_array_equal(
+            avg.X, [[5, 6, 3, 4], [numpy.nan, 6, 7, 8]])
+        self.assertEqual(avg.metas.ravel().tolist(), ["g1", "g2"])
+
+        avg = dicty.averageAttributes(self.data, fn=lambda x: len(x))
+        numpy.testing.assert_array_equal(avg.X, [[2, 2, 1, 1], [0, 1, 1, 1]])
+
+    def test_join_replicates(self):
+        from Orange.data import Table
+        joined = dicty.join_replicates(self.data)
+        self.assertEqual(len(joined.domain.attributes), 2)
+        numpy.testing.assert_array_equal(
+            joined.X, [[1.5, 3.5], [6, 7.5], [9.5, numpy.nan]])
+        # the joined domain transforms other data
+        other = Table.from_table(joined.domain, self.data[1:])
+        numpy.testing.assert_array_equal(other.X, joined.X[1:])
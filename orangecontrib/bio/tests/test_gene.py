@@ -0,0 +1,233 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import backports.unittest_mock
+    backports.unittest_mock.install()
+    from unittest import mock
+
+from orangecontrib.bio import gene
+from orangecontrib.bio.utils import arrayfile, lineindex
+
+
+class TestAliases(unittest.TestCase):
+    def setUp(self):
+        self.groups = [set(["A", "b", "a"]), set(["B", "c"]), set(["d"])]
+
+    def test_alias_index(self):
+        for lower in [False, True]:
+            index = gene.create_alias_index(self.groups, lower=lower)
+            mapping = gene.create_mapping(self.groups, lower=lower)
+            self.assertEqual(sorted(index), sorted(mapping))
+            for alias in mapping:
+                self.assertIn(alias, index)
+                self.assertEqual(index[alias], sorted(mapping[alias]))
+            self.assertEqual(index["x"], [])
+            self.assertNotIn("x", index)
+
+        index = gene.create_alias_index([])
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index["a"], [])
+
+    def test_join_aliases(self):
+        sources = [[set(["a", "b"]), set(["c"])],
+                   [set(["B", "c"]), set(["d"])],
+                   [set(["x", "d"]), set(["y"])]]
+        joined = gene.join_aliases(sources, lower=True)
+        self.assertEqual(joined, [set(["a", "b", "B", "c"]),
+                                  set(["d", "x"]), set(["y"])])
+        joined = gene.join_aliases(sources)
+        self.assertEqual(joined, [set(["a", "b"]), set(["c", "B"]),
+                                  set(["d", "x"]), set(["y"])])
+
+    def test_matcher_aliases(self):
+        matcher = gene.MatcherAliases(self.groups)
+        matcher.set_targets(["c", "a", "d"])
+        self.assertEqual(sorted(matcher.match("b")), ["a", "c"])
+        self.assertEqual(matcher.umatch("A"), "a")
+        self.assertEqual(matcher.umatch("D"), "d")
+        self.assertEqual(matcher.match("x"), [])
+
+    def test_match_many(self):
+        matcher = gene.MatcherAliases(self.groups)
+        targets = ["c", "a", "d", "A", "d"]
+        matcher.set_targets(targets)
+        genes = ["b", "A", "d", "x", "C", "B"]
+        self.assertEqual([sorted(m) for m in matcher.match_many(genes)],
+                         [sorted(matcher.match(g)) for g in genes])
+        self.assertEqual(matcher.umatch_many(genes),
+                         [matcher.umatch(g) for g in genes])
+        indices, ambiguous = matcher.umatch_indices(genes)
+        self.assertEqual(indices.tolist(), [-1, -1, 2, -1, 0, -1])
+        self.assertEqual(ambiguous.tolist(),
+                         [True, True, False, False, False, True])
+
+    def test_match_many_sequence(self):
+        matcher = gene.MatcherSequence(
+            [gene.MatcherDirect(ignore_case=False),
+             gene.MatcherAliases(self.groups)])
+        targets = ["c", "a", "D"]
+        matcher.set_targets(targets)
+        genes = ["a", "A", "B", "d", "x"]
+        self.assertEqual([sorted(m) for m in matcher.match_many(genes)],
+                         [sorted(matcher.match(g)) for g in genes])
+        self.assertEqual(matcher.umatch_many(genes),
+                         ["a", "a", None, "D", None])
+        indices, ambiguous = matcher.umatch_indices(genes)
+        self.assertEqual(indices.tolist(), [1, 1, -1, 2, -1])
+        self.assertEqual(ambiguous.tolist(),
+                         [False, False, True, False, False])
+
+
+class CountingMatcher(gene.MatcherAliasesPickled):
+    created = 0
+
+    def create_aliases(self):
+        CountingMatcher.created += 1
+        return iter([set(["A", "b", "a"]), set(["B", "c"]), set(["d"])])
+
+    def create_aliases_version(self):
+        return "v1"
+
+    def filename(self):
+        return "counting"
+
+
+class TestAliasIndexFile(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self._buffer_path = gene.gene_matcher_path
+        gene.gene_matcher_path = self.path
+        CountingMatcher.created = 0
+
+    def tearDown(self):
+        gene.gene_matcher_path = self._buffer_path
+        shutil.rmtree(self.path)
+
+    def test_save_load(self):
+        aliases = [set(["A", "b", "a"]), set(["B", "c"]), set()]
+        index = gene.create_alias_index(aliases, lower=True)
+        filename = os.path.join(self.path, "aliases.bin")
+        gene.save_alias_index(filename, "v1", aliases, index, True)
+
+        loaded, lindex = gene.load_alias_index(filename, "v1", True)
+        self.assertEqual(list(loaded), aliases)
+        self.assertEqual(loaded[1], aliases[1])
+        self.assertEqual(len(loaded), 3)
+        self.assertEqual(list(lindex), list(index))
+        self.assertEqual(lindex["b"], [0, 1])
+        self.assertEqual(lindex["x"], [])
+        self.assertEqual(lindex.positions(["c", "x"]).tolist(), [2, -1])
+
+        with self.assertRaises(arrayfile.FormatError):
+            gene.load_alias_index(filename, "v2", True)
+        with self.assertRaises(arrayfile.FormatError):
+            gene.load_alias_index(filename, "v1", False)
+
+    def test_matcher(self):
+        matcher = CountingMatcher()
+        matcher.set_targets(["c", "a"])
+        self.assertEqual(matcher.umatch("A"), "a")
+        self.assertEqual(CountingMatcher.created, 1)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.path, "counting.bin")))
+
+        matcher = CountingMatcher()
+        matcher.set_targets(["c", "a"])
+        self.assertEqual(matcher.umatch("A"), "a")
+        self.assertEqual(sorted(matcher.match("b")), ["a", "c"])
+        self.assertEqual(matcher.umatch_many(["A", "C", "x"]),
+                         ["a", "c", None])
+        self.assertEqual(CountingMatcher.created, 1)
+        self.assertIsInstance(matcher.aliases, gene.AliasGroups)
+
+        matcher = pickle.loads(pickle.dumps(matcher))
+        self.assertEqual(matcher.saved_aliases, [])
+        self.assertEqual(matcher.umatch("A"), "a")
+        self.assertEqual(CountingMatcher.created, 1)
+
+
+GENE_INFO = """\
+#tax_id\tGeneID\tSymbol\tLocusTag\tSynonyms\tdbXrefs\tchromosome\tmap_location\tdescription\ttype_of_gene\tSymbol_from_nomenclature_authority\tFull_name_from_nomenclature_authority\tNomenclature_status\tOther_designations\tModification_date
+7\t5692769\tNEWENTRY\t-\t-\t-\t-\t-\tdescription\tother\t-\t-\t-\t-\t20130108
+9\t1246500\trepA1\tpLeuDn_01\tA1|B1\t-\t-\t-\tputative replication\tprotein-coding\t-\t-\t-\t-\t20110924
+9\t1246501\trepA2\tpLeuDn_03\t-\t-\t-\t-\tputative replication\tprotein-coding\t-\t-\t-\t-\t20110924
+"""
+
+GENE_HISTORY = """\
+#tax_id\tGeneID\tDiscontinued_GeneID\tDiscontinued_Symbol\tDiscontinue_Date
+9\t1246500\t100\toldA1\t20120101
+9\t-\t101\toldA2\t20120101
+"""
+
+
+class TestNCBIGeneInfo(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        for name, contents in [("gene_info.9.db", GENE_INFO),
+                               ("gene_history.9.db", GENE_HISTORY)]:
+            with open(os.path.join(self.path, name), "w") as f:
+                f.write(contents)
+        self._mock = mock.patch.object(
+            gene.serverfiles, "localpath_download",
+            lambda domain, filename: os.path.join(self.path, filename))
+        self._mock.start()
+        self._mock_search = mock.patch.object(
+            gene.NCBIGeneInfo, "organism_name_search",
+            staticmethod(lambda organism: organism))
+        self._mock_search.start()
+
+    def tearDown(self):
+        self._mock_search.stop()
+        self._mock.stop()
+        shutil.rmtree(self.path)
+
+    def test_gene_info(self):
+        info = gene.NCBIGeneInfo("9", genematcher=gene.GMDirect())
+        self.assertEqual(len(info), 3)
+        self.assertEqual(sorted(info.keys()),
+                         ["1246500", "1246501", "5692769"])
+        self.assertIn("1246500", info)
+        self.assertNotIn("1", info)
+
+        gi = info["1246500"]
+        self.assertEqual(gi.symbol, "repA1")
+        self.assertEqual(gi.synonyms, ["A1", "B1"])
+        self.assertEqual(gi.modification_date, "20110924")
+        self.assertIsNone(info.get("1"))
+        self.assertEqual(info.get_info("1246501").locus_tag, "pLeuDn_03")
+
+        self.assertEqual(
+            info.field_values("symbol", ["1246501", "1", "5692769"]),
+            ["repA2", None, "NEWENTRY"])
+        self.assertEqual(
+            info.field_values("locus_tag", ["1246501", "5692769"]),
+            ["pLeuDn_03", None])
+        self.assertEqual(info.field_values("synonyms", ["1246500", "1"]),
+                         [["A1", "B1"], None])
+
+        self.assertTrue(os.path.exists(
+            lineindex.index_filename(os.path.join(self.path,
+                                                  "gene_info.9.db"))))
+        # reuse the saved index
+        info = gene.NCBIGeneInfo("9", genematcher=gene.GMDirect())
+        self.assertEqual(info["5692769"].description, "description")
+
+        info["1"] = info["1246500"]
+        self.assertEqual(len(info), 4)
+        self.assertEqual(info["1"].symbol, "repA1")
+        self.assertEqual(info.field_values("symbol", ["1", "1246501"]),
+                         ["repA1", "repA2"])
+
+    def test_history(self):
+        info = gene.NCBIGeneInfo("9", genematcher=gene.GMDirect())
+        history = info.history()
+        self.assertEqual(len(history), 2)
+        self.assertEqual(history["100"].discontinued_symbol, "oldA1")
+        self.assertEqual(history["101"].gene_id, "-")
+        self.assertNotIn("1246500", history)
@@ -0,0 +1,187 @@
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import backports.unittest_mock
+    backports.unittest_mock.install()
+    from unittest import mock
+
+import numpy
+
+from orangecontrib.bio import geo
+
+
+SOFT = """\
+^DATABASE = Geo
+!Database_name = Gene Expression Omnibus (GEO)
+^DATASET = GDS1
+!dataset_title = Test
+!dataset_sample_organism = Homo sapiens
+!dataset_sample_count = 3
+!dataset_feature_count = 3
+^SUBSET = GDS1_1
+!subset_dataset_id = GDS1
+!subset_description = control
+!subset_sample_id = GSM1,GSM2
+!subset_type = agent
+^SUBSET = GDS1_2
+!subset_dataset_id = GDS1
+!subset_description = treated
+!subset_sample_id = GSM3
+!subset_type = agent
+^DATASET = GDS1
+#ID_REF = Platform reference identifier
+!dataset_table_begin
+ID_REF\tIDENTIFIER\tGSM1\tGSM2\tGSM3
+s3\tA\t1.0\t2.0\tnull
+s1\tB\t3.0\tnull\tnull
+s2\tA\t5.0\t6.0\t7.0
+s4\tC\tnull\tnull\tnull
+!dataset_table_end
+"""
+
+
+class TestParseSOFT(unittest.TestCase):
+    def test_parse(self):
+        data = geo.parse_soft(SOFT.splitlines(True))
+        self.assertEqual(data.info["dataset_id"], "GDS1")
+        self.assertEqual(data.info["samples"], ["GSM1", "GSM2", "GSM3"])
+        self.assertEqual(data.info["feature_count"], 3)
+        self.assertEqual([s["description"] for s in data.info["subsets"]],
+                         ["control", "treated"])
+        self.assertEqual(data.spots, ["s1", "s2", "s3", "s4"])
+        self.assertEqual(data.genes, ["A", "B", "C"])
+        self.assertEqual(data.gene_codes.tolist(), [1, 0, 0, 2])
+        self.assertEqual(data.X.dtype, numpy.float32)
+        numpy.testing.assert_array_equal(
+            data.X, [[3, numpy.nan, numpy.nan], [5, 6, 7],
+                     [1, 2, numpy.nan], [numpy.nan] * 3])
+        self.assertEqual(data.mask.sum(), 6)
+        self.assertEqual(data.gene2spots(),
+                         {"A": ["s2", "s3"], "B": ["s1"], "C": ["s4"]})
+        self.assertEqual(data.spot2gene()["s3"], "A")
+
+        sel = data.select([0, 3])
+        self.assertEqual(sel.spots, ["s1", "s4"])
+        self.assertEqual(sel.genes, ["B", "C"])
+        self.assertEqual(sel.gene_codes.tolist(), [0, 1])
+
+    def test_repeated_spots(self):
+        soft = SOFT.replace("s4\tC", "s1\tC")
+        data = geo.parse_soft(soft.splitlines(True))
+        self.assertEqual(data.spots, ["s1", "s2", "s3"])
+        self.assertEqual(data.genes, ["A", "C"])
+        self.assertTrue(numpy.isnan(data.X[0]).all())
+
+
+class TestGDS(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        with gzip.open(os.path.join(self.path, "GDS1.soft.gz"), "wb") as f:
+            f.write(SOFT.encode("utf-8"))
+        self._mocks = [
+            mock.patch.object(geo.serverfiles, "localpath",
+                              lambda *args: os.path.join(self.path,
+                                                         *args[1:])),
+            mock.patch.object(geo.taxonomy, "search",
+                              lambda name, exact: ["9606"])]
+        for m in self._mocks:
+            m.start()
+
+    def tearDown(self):
+        for m in self._mocks:
+            m.stop()
+        shutil.rmtree(self.path)
+
+    def test_getdata(self):
+        gds = geo.GDS("GDS1")
+        self.assertEqual(gds.info["taxid"], "9606")
+        self.assertEqual(gds.genes, ["A", "B", "C"])
+        self.assertEqual(gds.gene2spots["A"], ["s2", "s3"])
+
+        data = gds.getdata()
+        self.assertEqual(len(data), 3)
+        self.assertEqual([str(r.metas[0]) for r in data], ["A", "B", "C"])
+        numpy.testing.assert_array_equal(
+            data.X, [[3, 4, 7], [3, numpy.nan, numpy.nan], [numpy.nan] * 3])
+
+        data = gds.getdata(report_genes=False, remove_unknown=0.5)
+        self.assertEqual([str(r.metas[0]) for r in data], ["s2", "s3"])
+        self.assertEqual(sorted(gds.spot2gene), ["s2", "s3"])
+
+        data = gds.getdata(transpose=True, merge_function=geo.spots_max)
+        self.assertEqual([a.name for a in data.domain.attributes],
+                         ["A", "B", "C"])
+        numpy.testing.assert_array_equal(data.X[:, 0], [5, 6, 7])
+        self.assertEqual([str(r.get_class()) for r in data],
+                         ["control", "control", "treated"])
+
+    def test_cache(self):
+        gds = geo.GDS("GDS1")
+        data = gds.getdata()
+        cachepath = os.path.join(self.path, "cache")
+        datafile = os.path.join(cachepath, "GDS1.data.bin")
+        genesfile = os.path.join(cachepath, "GDS1.genes.mean.0.bin")
+        self.assertTrue(os.path.exists(datafile))
+        self.assertTrue(os.path.exists(genesfile))
+        # the caches do not count as (locally available) data sets
+        self.assertEqual(sorted(os.listdir(self.path)),
+                         ["GDS1.soft.gz", "cache"])
+
+        with mock.patch.object(geo, "parse_soft") as parse_soft, \
+                mock.patch.object(geo.GDS, "_merge_spots") as merge_spots:
+            cached = geo.GDS("GDS1")
+            self.assertEqual(cached.info, gds.info)
+            self.assertEqual(cached.spots, gds.spots)
+            cached_data = cached.getdata()
+            self.assertFalse(parse_soft.called)
+            self.assertFalse(merge_spots.called)
+        numpy.testing.assert_array_equal(cached_data.X, data.X)
+        self.assertEqual([str(r.metas[0]) for r in cached_data],
+                         ["A", "B", "C"])
+
+        # tables from the cached data are writable
+        for report_genes in [True, False]:
+            for transpose in [False, True]:
+                cached_data = geo.GDS("GDS1").getdata(
+                    report_genes=report_genes, transpose=transpose)
+                cached_data.X[0, 0] = 1.0
+                self.assertEqual(cached_data.X[0, 0], 1.0)
+
+        # None and 0 keep all spots and share the cache entry
+        gds = geo.GDS("GDS1")
+        with mock.patch.object(geo.GDS, "_merge_spots") as merge_spots:
+            for remove_unknown in [None, 0, 0.0, None]:
+                gds.getdata(remove_unknown=remove_unknown)
+            self.assertFalse(merge_spots.called)
+
+        # custom merge functions are not cached
+        geo.GDS("GDS1").getdata(merge_function=lambda x: 0)
+        self.assertEqual(len(os.listdir(cachepath)), 2)
+
+        # a changed source file invalidates the cache
+        os.utime(os.path.join(self.path, "GDS1.soft.gz"), (0, 0))
+        with mock.patch.object(geo, "parse_soft",
+                               wraps=geo.parse_soft) as parse_soft:
+            geo.GDS("GDS1")
+            self.assertTrue(parse_soft.called)
+
+    def test_cache_datasets(self):
+        with open(os.path.join(self.path, "GDS2.soft.gz"), "wb") as f:
+            f.write(b"corrupt")
+        failed = geo.cache_datasets(["GDS1", "GDS2"],
+                                    merge_functions=[geo.spots_median],
+                                    remove_unknown=[None, 0.5])
+        self.assertEqual(failed, ["GDS2"])
+        self.assertEqual(
+            sorted(os.listdir(self.path)),
+            ["GDS1.soft.gz", "GDS2.soft.gz", "cache"])
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.path, "cache"))),
+            ["GDS1.data.bin", "GDS1.genes.median.0.5.bin",
+             "GDS1.genes.median.0.bin"])
@@ -0,0 +1,289 @@
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+from six import StringIO
+
+from orangecontrib.bio import go
+from orangecontrib.bio.utils import stats
+
+
+ONTOLOGY = """\
+format-version: 1.2
+subsetdef: goslim_generic "Generic GO slim"
+
+[Term]
+id: GO:0000001
+name: root
+namespace: biological_process
+subset: goslim_generic
+
+[Term]
+id: GO:0000002
+name: a
+namespace: biological_process
+is_a: GO:0000001 ! root
+
+[Term]
+id: GO:0000003
+name: b
+namespace: biological_process
+alt_id: GO:0000013
+is_a: GO:0000001 ! root
+subset: goslim_generic
+
+[Term]
+id: GO:0000004
+name: c
+namespace: biological_process
+is_a: GO:0000002 ! a
+relationship: part_of GO:0000003 ! b
+
+[Term]
+id: GO:0000005
+name: function
+namespace: molecular_function
+
+[Typedef]
+id: part_of
+name: part of
+
+"""
+
+ANNOTATIONS = [
+    # gene, term, evidence, aspect
+    ("A", "GO:0000004", "IDA", "P"),
+    ("A", "GO:0000005", "IEA", "F"),
+    ("B", "GO:0000002", "IEA", "P"),
+    ("C", "GO:0000013", "TAS", "P"),
+    ("D", "GO:0000001", "IDA", "P"),
+    ("E", "GO:0000004", "IEA", "P"),
+    ("F", "GO:0000005", "IDA", "F"),
+]
+
+
+def annotation_line(gene, term, evidence, aspect, qualifier=""):
+    return "\t".join(
+        ["DB", "ID" + gene, gene, qualifier, term, "REF", evidence, "",
+         aspect, "", gene.lower(), "protein", "taxon:9606", "20100101", "DB",
+         "", ""])
+
+
+def annotations_file(annotations=ANNOTATIONS):
+    lines = ["!gaf-version: 2.0"]
+    lines.extend(annotation_line(*ann) for ann in annotations)
+    return StringIO("\n".join(lines) + "\n")
+
+
+class TestOntology(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self._cache_path = go.compiled_cache_path
+        go.compiled_cache_path = os.path.join(self.tmpdir, "compiled")
+        self.filename = os.path.join(self.tmpdir, "ontology.obo")
+        with open(self.filename, "w") as f:
+            f.write(ONTOLOGY)
+
+    def tearDown(self):
+        go.compiled_cache_path = self._cache_path
+        shutil.rmtree(self.tmpdir)
+
+    def test_compiled_cache(self):
+        parsed = go.Ontology(self.filename)
+        self.assertEqual(len(os.listdir(go.compiled_cache_path)), 1)
+        loaded = go.Ontology(self.filename)
+        self.assertIsInstance(loaded.terms, go._CompiledTerms)
+
+        self.assertEqual(list(parsed), list(loaded))
+        self.assertEqual(parsed.alias_mapper, loaded.alias_mapper)
+        self.assertEqual(parsed.reverse_alias_mapper,
+                         loaded.reverse_alias_mapper)
+        self.assertEqual(set(parsed.typedefs), set(loaded.typedefs))
+        self.assertEqual(parsed.header, loaded.header)
+        for term_id in parsed:
+            p, l = parsed[term_id], loaded[term_id]
+            self.assertEqual(p.name, l.name)
+            self.assertEqual(p.related, l.related)
+            self.assertEqual(p.related_to, l.related_to)
+        self.assertEqual(loaded["GO:0000013"].id, "GO:0000003")
+        self.assertIn("GO:0000013", loaded)
+        self.assertEqual(loaded.extract_sub_graph(["GO:0000003"]),
+                         set(["GO:0000003", "GO:0000004"]))
+
+        self.assertEqual(loaded.closure.ancestors.tolist(),
+                         parsed.closure.ancestors.tolist())
+
+        # a changed file must not be loaded from the stale cache
+        with open(self.filename, "a") as f:
+            f.write("[Term]\nid: GO:0000006\nname: new\n"
+                    "is_a: GO:0000001 ! root\n\n")
+        compiled = os.listdir(go.compiled_cache_path)
+        updated = go.Ontology(self.filename)
+        self.assertIn("GO:0000006", updated)
+        # and the compiled file of the old version is replaced
+        self.assertEqual(len(os.listdir(go.compiled_cache_path)), 1)
+        self.assertNotEqual(os.listdir(go.compiled_cache_path), compiled)
+        self.assertIsInstance(go.Ontology(self.filename).terms,
+                              go._CompiledTerms)
+
+        # other source files keep their own compiled files
+        other = os.path.join(self.tmpdir, "other.obo")
+        shutil.copy(self.filename, other)
+        go.Ontology(other)
+        self.assertEqual(len(os.listdir(go.compiled_cache_path)), 2)
+        go.Ontology(self.filename)
+        self.assertEqual(len(os.listdir(go.compiled_cache_path)), 2)
+
+
+class TestOntologyClosure(unittest.TestCase):
+    def setUp(self):
+        self.ontology = go.Ontology(StringIO(ONTOLOGY))
+
+    def test_graphs(self):
+        ontology = self.ontology
+        self.assertEqual(ontology.extract_super_graph(["GO:0000004"]),
+                         set(["GO:0000001", "GO:0000002", "GO:0000003",
+                              "GO:0000004"]))
+        self.assertEqual(ontology.extract_super_graph("GO:0000013"),
+                         set(["GO:0000001", "GO:0000013"]))
+        self.assertEqual(ontology.extract_sub_graph(["GO:0000002",
+                                                     "GO:0000005"]),
+                         set(["GO:0000002", "GO:0000004", "GO:0000005"]))
+        self.assertEqual(ontology.term_depth("GO:0000001"), 1)
+        self.assertEqual(ontology.term_depth("GO:0000004"), 3)
+        self.assertEqual(ontology.term_depth("GO:0000005"), 1)
+        with self.assertRaises(KeyError):
+            ontology.extract_super_graph(["GO:0000666"])
+
+    def test_closure(self):
+        closure = self.ontology.closure
+        root, a, b, c, f = closure.term_indices(
+            ["GO:0000001", "GO:0000002", "GO:0000003", "GO:0000004",
+             "GO:0000005"])
+        self.assertEqual(
+            closure.ancestor_indices([c]).tolist(), sorted([root, a, b, c]))
+        self.assertEqual(
+            closure.descendant_indices([b, f]).tolist(), sorted([b, c, f]))
+        self.assertEqual(
+            closure.is_ancestor([root, a, c, f, c], [c, c, c, c, root])
+            .tolist(),
+            [True, True, True, False, False])
+        order = closure.order.tolist()
+        self.assertLess(order.index(root), order.index(a))
+        self.assertLess(order.index(b), order.index(c))
+        self.assertEqual(closure.matrix()[root].sum(), 4)
+
+
+class TestAnnotations(unittest.TestCase):
+    def setUp(self):
+        self.ontology = go.Ontology(StringIO(ONTOLOGY))
+        self.annotations = go.Annotations(annotations_file(),
+                                          ontology=self.ontology)
+
+    def test_annotations(self):
+        annotations = self.annotations
+        self.assertEqual(annotations.header, "!gaf-version: 2.0\n")
+        self.assertEqual(len(annotations), len(ANNOTATIONS))
+        self.assertEqual(
+            [(a.geneName, a.GO_ID, a.evidence, a.aspect)
+             for a in annotations],
+            ANNOTATIONS)
+        self.assertIsInstance(annotations[0], go.AnnotationRecord)
+        self.assertEqual(annotations[-1].geneName, "F")
+        self.assertEqual([a.geneName for a in annotations.annotations[1:3]],
+                         ["A", "B"])
+        self.assertEqual(annotations.gene_names, set("ABCDEF"))
+        self.assertEqual(
+            [a.GO_ID for a in annotations.gene_annotations["A"]],
+            ["GO:0000004", "GO:0000005"])
+        self.assertEqual(annotations.gene_annotations["X"], [])
+        self.assertEqual(
+            [a.geneName for a in annotations.term_anotations["GO:0000005"]],
+            ["A", "F"])
+        self.assertNotIn("GO:0000003", annotations.term_anotations)
+
+        annotations.add_annotation(
+            go.AnnotationRecord.from_string(
+                annotation_line("G", "GO:0000005", "IDA", "F")))
+        # negative annotations are skipped
+        annotations.add_annotation(
+            annotation_line("H", "GO:0000005", "IDA", "F", "NOT"))
+        self.assertEqual(len(annotations), len(ANNOTATIONS) + 1)
+        self.assertEqual(
+            [a.geneName for a in annotations.term_anotations["GO:0000005"]],
+            ["A", "F", "G"])
+        self.assertIn("G", annotations.get_term_gene_index().genes)
+        self.assertEqual(
+            sorted(annotations.get_all_genes("GO:0000005")),
+            ["A", "F", "G"])
+
+    def test_term_gene_index(self):
+        index = self.annotations.get_term_gene_index()
+        self.assertEqual(index.genes, list("ABCDEF"))
+        self.assertEqual(sorted(index.term_genes("GO:0000001")),
+                         list("ABCDE"))
+        self.assertEqual(sorted(index.term_genes("GO:0000003")),
+                         list("ACE"))
+        self.assertEqual(sorted(index.term_genes("GO:0000013")),
+                         list("ACE"))
+        self.assertIs(index, self.annotations.get_term_gene_index())
+
+        index = self.annotations.get_term_gene_index(
+            evidence_codes=["IDA"], aspect=["P"])
+        self.assertEqual(sorted(index.term_genes("GO:0000001")),
+                         ["A", "D"])
+        self.assertEqual(index.term_genes("GO:0000005"), [])
+        mask = index.genes_mask(["A", "B", "D", "X"])
+        counts = index.counts(mask, index.term_ids(["GO:0000001",
+                                                    "GO:0000004"]))
+        self.assertEqual(counts.tolist(), [2, 1])
+
+    def test_get_all_genes(self):
+        self.assertEqual(
+            sorted(self.annotations.get_all_genes("GO:0000002")),
+            ["A", "B", "E"])
+        self.assertEqual(
+            sorted(self.annotations.get_all_genes("GO:0000002", ["IEA"])),
+            ["B", "E"])
+
+    def test_enriched_terms(self):
+        res = self.annotations.get_enriched_terms(
+            ["A", "b", "X"], use_fdr=False, prob=stats.Hypergeometric())
+        self.assertEqual(
+            set(res), set(["GO:0000001", "GO:0000002", "GO:0000003",
+                           "GO:0000004", "GO:0000005"]))
+        genes, p, ref = res["GO:0000002"]
+        self.assertEqual(sorted(genes), ["A", "b"])
+        self.assertEqual(ref, 3)
+        self.assertAlmostEqual(
+            p, stats.Hypergeometric().p_value(2, 6, 3, 2))
+
+        res = self.annotations.get_enriched_terms(
+            ["A", "B"], reference=["A", "C", "D", "E"], aspect="P",
+            evidence_codes=["IDA", "TAS", "IEA"], use_fdr=False)
+        genes, p, ref = res["GO:0000001"]
+        self.assertEqual(genes, ["A"])
+        self.assertEqual(ref, 4)
+        self.assertNotIn("GO:0000005", res)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            res = self.annotations.get_enriched_terms(["A"], slims_only=True)
+        self.assertEqual(set(res), set(["GO:0000001", "GO:0000003"]))
+
+    def test_enriched_terms_batch(self):
+        lists = [["A", "B"], ["C", "E", "F"], []]
+        expected = [
+            go.EnrichedTerm(i, term, genes, p, ref)
+            for i, genes in enumerate(lists)
+            for term, (genes, p, ref) in sorted(
+                self.annotations.get_enriched_terms(genes).items())
+        ]
+        res = self.annotations.get_enriched_terms_batch(lists)
+        self.assertEqual(res, expected)
+        self.assertEqual(set(r.list_index for r in res), set([0, 1]))
+
+        res = self.annotations.get_enriched_terms_batch(lists, n_jobs=2)
+        self.assertEqual(res, expected)
@@ -0,0 +1,147 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import numpy
+
+from orangecontrib.bio import ppi
+
+
+LINKS = [("9.a", "9.b", 900), ("9.b", "9.a", 900), ("9.a", "9.c", 400),
+         ("9.c", "9.a", 400), ("9.c", "9.d", 150), ("9.d", "9.c", 150)]
+ALIASES = [("9.a", "A", "src"), ("9.a", "A1", "src"), ("9.b", "B", "src")]
+
+
+class TestSTRING(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        filename = os.path.join(self.path, "string.sqlite")
+        con = sqlite3.connect(filename)
+        ppi.STRING.clear_db(con)
+        con.executemany("INSERT INTO links VALUES (?, ?, ?)", LINKS)
+        con.executemany("INSERT INTO proteins VALUES (?, '9')",
+                        [(id,) for id in ["9.a", "9.b", "9.c", "9.d"]])
+        con.executemany("INSERT INTO aliases VALUES (?, ?, ?)", ALIASES)
+        con.execute("INSERT INTO actions VALUES "
+                    "('9.a', '9.b', 'binding', '', 900)")
+        ppi.STRING.create_db_index(con)
+        con.commit()
+        con.close()
+        self.string = ppi.STRING(database=filename)
+
+    def tearDown(self):
+        self.string.db.close()
+        shutil.rmtree(self.path)
+
+    def test_many(self):
+        string = self.string
+        ids = ["9.a", "9.c", "9.x"]
+        synonyms = string.synonyms_many(ids)
+        self.assertEqual(synonyms,
+                         dict((id, string.synonyms(id)) for id in ids))
+
+        edges = string.edges_many(ids)
+        self.assertEqual(sorted(edges),
+                         sorted(sum((string.edges(id) for id in ids), [])))
+
+        annotated = string.edges_annotated_many(ids)
+        self.assertEqual(
+            sorted(annotated),
+            sorted(sum((list(string.edges_annotated(id)) for id in ids),
+                       [])))
+        self.assertEqual(len(string.all_edges_annotated("9")), len(LINKS))
+
+    def test_subnetwork(self):
+        ids = ["9.c", "9.a", "9.b", "9.x"]
+        src, dst, score = self.string.subnetwork(ids)
+        edges = sorted(zip(src.tolist(), dst.tolist(), score.tolist()))
+        self.assertEqual(edges, [(0, 1, 400), (1, 0, 400), (1, 2, 900),
+                                 (2, 1, 900)])
+
+        adj = self.string.adjacency_matrix(ids)
+        self.assertEqual(adj.shape, (4, 4))
+        expected = numpy.zeros((4, 4))
+        expected[[0, 1, 1, 2], [1, 0, 2, 1]] = [400, 400, 900, 900]
+        numpy.testing.assert_array_equal(adj.toarray(), expected)
+
+        src, dst, score = self.string.subnetwork([])
+        self.assertEqual(len(src), 0)
+
+        # repeated ids map to their first occurrence
+        repeated = ["9.a", "9.b", "9.a"]
+        src, dst, score = self.string.subnetwork(repeated)
+        self.assertEqual(sorted(zip(src.tolist(), dst.tolist())),
+                         [(0, 1), (1, 0)])
+        adj = self.string.adjacency_matrix(repeated)
+        self.assertEqual(adj.nnz, 2)
+        self.assertEqual(adj[2].nnz, 0)
+
+        # the link index is saved next to the database
+        filename = self.string.filename
+        self.assertTrue(os.path.exists(filename + ".links.idx"))
+        string = ppi.STRING(database=filename)
+        src, dst, score = string.subnetwork(ids)
+        self.assertEqual(sorted(zip(src.tolist(), dst.tolist(),
+                                    score.tolist())), edges)
+        string.db.close()
+
+    def test_base_subnetwork(self):
+        # the generic implementation based on edges
+        for ids in [["9.c", "9.a", "9.b", "9.x"],
+                    ["9.a", "9.b", "9.a"],
+                    ["9.c", "9.c", "9.a", "9.d", "9.a"]]:
+            expected = self.string.subnetwork(ids)
+            result = ppi.PPIDatabase.subnetwork(self.string, ids)
+            self.assertEqual(
+                sorted(zip(*[a.tolist() for a in result])),
+                sorted(zip(*[a.tolist() for a in expected])))
+
+
+class TestBioGRID(unittest.TestCase):
+    def setUp(self):
+        self.biogrid = ppi.BioGRID.__new__(ppi.BioGRID)
+        con = self.biogrid.db = sqlite3.connect(":memory:")
+        con.execute("CREATE TABLE links (%s)" % ppi.BioGRID.SCHEMA[0][1])
+        con.execute("CREATE TABLE proteins (%s)" %
+                    ppi.BioGRID.SCHEMA[1][1].rstrip().rstrip(","))
+        links = [("1", "a", "b", 0.5), ("2", "b", "c", None),
+                 ("3", "a", "b", 0.7)]
+        con.executemany(
+            "INSERT INTO links (biogrid_interaction_id, "
+            "biogrid_id_interactor_a, biogrid_id_interactor_b, score) "
+            "VALUES (?, ?, ?, ?)", links)
+        con.executemany(
+            "INSERT INTO proteins VALUES (?, ?, ?, ?, ?, '9606')",
+            [("a", "1", None, "A", "A1|A2"), ("b", "2", "sb", "B", None)])
+        self.biogrid.init_db_index()
+
+    def test_many(self):
+        biogrid = self.biogrid
+        ids = ["a", "b", "x"]
+        self.assertEqual(biogrid.synonyms_many(ids),
+                         dict((id, biogrid.synonyms(id)) for id in ids))
+        self.assertEqual(sorted(biogrid.edges_many(["a", "c"])),
+                         [("a", "b", 0.5), ("a", "b", 0.7),
+                          ("b", "c", None)])
+        self.assertEqual(len(biogrid.edges_annotated_many(["b"])), 3)
+
+    def test_subnetwork(self):
+        src, dst, score = self.biogrid.subnetwork(["b", "a", "c"])
+        edges = sorted(zip(src.tolist(), dst.tolist()))
+        self.assertEqual(edges, [(0, 2), (1, 0), (1, 0)])
+        self.assertTrue(numpy.isnan(score[src == 0]).all())
+
+        adj = self.biogrid.adjacency_matrix(["b", "a", "c"])
+        self.assertEqual(adj[1, 0], 0.7)
+        self.assertEqual(adj[0, 2], 1.0)
+        self.assertEqual(adj.nnz, 2)
+
+        ids = ["b", "a", "b", "c"]
+        src, dst, score = self.biogrid.subnetwork(ids)
+        self.assertEqual(sorted(zip(src.tolist(), dst.tolist())),
+                         [(0, 3), (1, 0), (1, 0)])
+        base = ppi.PPIDatabase.subnetwork(self.biogrid, ids)
+        self.assertEqual(sorted(zip(base[0].tolist(), base[1].tolist())),
+                         sorted(zip(src.tolist(), dst.tolist())))
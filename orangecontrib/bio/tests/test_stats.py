@@ -0,0 +1,130 @@
+import unittest
+
+import numpy
+
+from orangecontrib.bio.utils import stats
+
+
+class TestPValues(unittest.TestCase):
+    def setUp(self):
+        rng = numpy.random.RandomState(42)
+        N = rng.randint(1, 2000, size=500)
+        m = (rng.rand(500) * (N + 1)).astype(int)
+        n = (rng.rand(500) * (N + 1)).astype(int)
+        k = (rng.rand(500) * (numpy.minimum(n, m) + 2)).astype(int)
+        # degenerate cases
+        k = numpy.r_[k, 0, 1, 5, 4, 0]
+        N = numpy.r_[N, 10, 10, 10, 10, 1]
+        m = numpy.r_[m, 0, 0, 10, 10, 1]
+        n = numpy.r_[n, 5, 5, 5, 5, 0]
+        self.args = k, N, m, n
+
+    def _test_prob(self, prob):
+        k, N, m, n = self.args
+        p = prob.p_values(k, N, m, n)
+        expected = [prob.p_value(*args)
+                    for args in zip(k.tolist(), N.tolist(),
+                                    m.tolist(), n.tolist())]
+        numpy.testing.assert_allclose(p, expected, rtol=1e-7, atol=1e-14)
+
+    def test_binomial(self):
+        self._test_prob(stats.Binomial())
+
+    def test_hypergeometric(self):
+        self._test_prob(stats.Hypergeometric())
+
+    def test_broadcast(self):
+        prob = stats.Hypergeometric()
+        p = prob.p_values([0, 1, 2, 3], 100, [10, 20, 30, 40], 10)
+        self.assertEqual(p.shape, (4,))
+        self.assertEqual(p[0], 1.0)
+        self.assertAlmostEqual(p[3], prob.p_value(3, 100, 40, 10))
+        self.assertEqual(prob.p_values([], 10, [], 5).shape, (0,))
+
+    def test_p_values_fallback(self):
+        class Prob(object):
+            def p_value(self, k, N, m, n):
+                return 1.0 * k / n
+
+        p = stats.p_values(Prob(), [1, 2], 10, [3, 4], 4)
+        numpy.testing.assert_allclose(p, [0.25, 0.5])
+
+
+class TestCorrections(unittest.TestCase):
+    p = [0.01, 0.04, 0.03, 0.005]
+
+    def test_fdr(self):
+        numpy.testing.assert_allclose(stats.FDR(self.p),
+                                      [0.02, 0.04, 0.04, 0.02])
+        numpy.testing.assert_allclose(stats.FDR(sorted(self.p), ordered=True),
+                                      [0.02, 0.02, 0.04, 0.04])
+        numpy.testing.assert_allclose(stats.FDR(self.p, m=400),
+                                      [2, 4, 4, 2])
+        numpy.testing.assert_allclose(stats.FDR(self.p, dependent=True),
+                                      numpy.array([0.02, 0.04, 0.04, 0.02]) *
+                                      (1 + 1. / 2 + 1. / 3 + 1. / 4))
+        self.assertEqual(stats.FDR([]), [])
+
+    def test_benjamini(self):
+        bh = stats.benjamini_hochberg(numpy.array(self.p))
+        self.assertIsInstance(bh, numpy.ndarray)
+        numpy.testing.assert_allclose(bh, stats.FDR(self.p))
+        numpy.testing.assert_allclose(
+            stats.benjamini_yekutieli(self.p),
+            stats.FDR(self.p, dependent=True))
+        numpy.testing.assert_allclose(
+            stats.benjamini_hochberg(self.p, m=400), [1, 1, 1, 1])
+        self.assertEqual(stats.benjamini_hochberg([]).shape, (0,))
+
+    def test_bonferroni_holm(self):
+        numpy.testing.assert_allclose(stats.bonferroni(self.p),
+                                      [0.04, 0.16, 0.12, 0.02])
+        numpy.testing.assert_allclose(stats.holm(self.p),
+                                      [0.03, 0.06, 0.06, 0.02])
+        numpy.testing.assert_allclose(stats.holm([0.5, 0.4]), [0.8, 0.8])
+
+    def test_storey(self):
+        p = [0.01, 0.02, 0.3, 0.9]
+        numpy.testing.assert_allclose(
+            stats.storey(p), 0.5 * stats.benjamini_hochberg(p))
+        numpy.testing.assert_allclose(
+            stats.storey(p, lambda_=0.0), stats.benjamini_hochberg(p))
+
+    def test_harmonic_number(self):
+        self.assertEqual(stats.harmonic_number(1), 1.0)
+        self.assertAlmostEqual(stats.harmonic_number(4), 25. / 12)
+        self.assertAlmostEqual(stats.harmonic_number(10 ** 6),
+                               sum(1.0 / i for i in range(1, 10 ** 6 + 1)),
+                               places=5)
+
+
+class TestGroupReduce(unittest.TestCase):
+    def test_group_reduce(self):
+        rng = numpy.random.RandomState(0)
+        X = rng.rand(200, 7)
+        X[rng.rand(200, 7) < 0.3] = numpy.nan
+        X[:3] = numpy.nan
+        groups = rng.randint(0, 30, size=200)
+        groups[:3] = 30
+        functions = {"mean": numpy.mean, "median": numpy.median,
+                     "min": numpy.min, "max": numpy.max}
+        for how, f in functions.items():
+            result = stats.group_reduce(X, groups, how, ngroups=32)
+            self.assertEqual(result.shape, (32, 7))
+            for g in range(32):
+                for j in range(7):
+                    x = X[groups == g, j]
+                    x = x[~numpy.isnan(x)]
+                    expected = f(x) if len(x) else numpy.nan
+                    numpy.testing.assert_allclose(result[g, j], expected)
+
+    def test_group_reduce_1d(self):
+        x = [1.0, numpy.nan, 3, 4, 0]
+        numpy.testing.assert_array_equal(
+            stats.group_reduce(x, [1, 1, 0, 1, 1], "median"), [3, 1])
+        numpy.testing.assert_array_equal(
+            stats.group_reduce(x, [2, 2, 2, 2, 2], "max"),
+            [numpy.nan, numpy.nan, 4])
+        self.assertEqual(stats.group_reduce([], [], "mean").shape, (0,))
+        with self.assertRaises(ValueError):
+            stats.group_reduce(x, [0] * 5, "sum")
@@ -1,9 +1,21 @@
 import os
+import io
+import shutil
+import tarfile
+import tempfile
 import unittest
 import errno
 
+try:
+    from unittest import mock
+except ImportError:
+    import backports.unittest_mock
+    backports.unittest_mock.install()
+    from unittest import mock
+
 from orangecontrib.bio import taxonomy
 from orangecontrib.bio.utils import serverfiles
+from orangecontrib.bio.ncbi import taxonomy as ncbi_taxonomy
 
 
 def islocal():
@@ -50,3 +62,111 @@ class TestTaxonomy(unittest.TestCase):
         lineage = tax._tax.lineage("9606")
         self.assertEqual(lineage[0], "1")
         self.assertEqual(lineage[-1], "9605")
+
+
+NODES = [("1", "1", "no rank"), ("2", "1", "superkingdom"),
+         ("9", "2", "genus"), ("10", "9", "species"), ("11", "9", "species")]
+NAMES = [("1", "root", "", "scientific name"),
+         ("2", "Bacteria", "", "scientific name"),
+         ("9", "Buchnera", "", "scientific name"),
+         ("10", "Buchnera aphidicola", "", "scientific name"),
+         ("10", "aphid endosymbiont", "", "common name"),
+         ("11", "Buchnera sp.", "", "scientific name")]
+
+
+def taxdump(path):
+    filename = os.path.join(path, "taxdump.tar.gz")
+    with tarfile.open(filename, "w:gz") as tar:
+        for name, rows in [("nodes.dmp", NODES), ("names.dmp", NAMES)]:
+            data = "".join("\t|\t".join(row) + "\t|\n" for row in rows)
+            data = data.encode("utf-8")
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return tarfile.open(filename)
+
+
+class TestTaxonomyService(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, "taxonomy.sqlite")
+        ncbi_taxonomy.Taxonomy.init_db(self.filename, taxdump(self.path))
+        self._mock = mock.patch.object(
+            taxonomy.serverfiles, "localpath",
+            lambda domain, filename: self.filename)
+        self._mock.start()
+        taxonomy._service = None
+
+    def tearDown(self):
+        taxonomy.taxonomy_service().close()
+        taxonomy._service = None
+        self._mock.stop()
+        shutil.rmtree(self.path)
+
+    def test_lineage(self):
+        tax = ncbi_taxonomy.Taxonomy(self.filename)
+        self.assertEqual(tax.lineage("10"), ["1", "2", "9"])
+        self.assertEqual(tax.lineage("1"), [])
+        self.assertEqual(tax.parent_array().tolist(),
+                         [-1, 1, 1, -1, -1, -1, -1, -1, -1, 2, 9, 9])
+        for taxid in ["3", "100", "x"]:
+            with self.assertRaises(KeyError):
+                tax.lineage(taxid)
+
+    def test_search_many(self):
+        tax = ncbi_taxonomy.Taxonomy(self.filename)
+        self.assertEqual(
+            tax.search_many(["buchnera", "Buchnera sp.", "x", "bu%"],
+                            exact=False),
+            [["9", "11", "10"], ["11"], [], []])
+        self.assertEqual(tax.search_many(["BUCHNERA", "root"]),
+                         [["9"], ["1"]])
+        self.assertEqual(tax.search_many(["aphid", "buchnera"], exact=False,
+                                         ranks=["species"]),
+                         [["10"], ["11", "10"]])
+        self.assertEqual(list(tax.search("bacteria")), ["2"])
+        self.assertEqual(tax.search_many([]), [])
+        self.assertEqual(taxonomy.search_many(["buchnera", "aphid"]),
+                         [["11", "10"], ["10"]])
+
+    def test_service(self):
+        service = taxonomy.taxonomy_service()
+        self.assertIs(taxonomy.taxonomy_service(), service)
+        self.assertEqual(taxonomy.name("10"), "Buchnera aphidicola")
+        self.assertEqual(taxonomy.name("9606"), "Homo sapiens")
+        self.assertEqual(taxonomy.other_names("10"),
+                         [("aphid endosymbiont", "common name")])
+        self.assertEqual(taxonomy.lineage("11"), ["1", "2", "9"])
+        self.assertEqual(taxonomy.search("buchnera"), ["11", "10"])
+        self.assertEqual(taxonomy.search("buchnera", onlySpecies=False,
+                                         exact=True), ["9"])
+        with self.assertRaises(taxonomy.UnknownSpeciesIdentifier):
+            taxonomy.name("3")
+
+        # results are cached
+        with mock.patch.object(service.tax, "lineage") as lineage:
+            self.assertEqual(taxonomy.lineage("11"), ["1", "2", "9"])
+            self.assertFalse(lineage.called)
+
+        tax = taxonomy.Taxonomy()
+        self.assertEqual(tax["11"], "Buchnera sp.")
+        self.assertEqual(sorted(tax.subnodes("9")), ["10", "11"])
+        self.assertEqual(len(tax.taxids()), len(NODES))
+
+    def test_reload(self):
+        service = taxonomy.taxonomy_service()
+        ncbi_taxonomy.Taxonomy.init_db(self.filename, taxdump(self.path))
+        os.utime(self.filename, (0, 0))
+        self.assertIsNot(taxonomy.taxonomy_service(), service)
+        service.close()
+
+    def test_lru_cache(self):
+        cache = taxonomy._LRUCache(2)
+        cache["a"] = 1
+        cache["b"] = 2
+        self.assertEqual(cache["a"], 1)
+        cache["c"] = 3
+        self.assertNotIn("b", cache)
+        self.assertEqual(len(cache), 2)
+        with self.assertRaises(KeyError):
+            cache["b"]
@@ -0,0 +1,187 @@
+"""
+A simple binary file format for storing a set of named numpy arrays
+(along with some JSON serializable metadata) which can be memory mapped
+on load.
+
+The file layout is::
+
+    MAGIC | uint32 header length | JSON header | padding | array data ...
+
+where each array's data is aligned to :obj:`ALIGNMENT` bytes.
+
+"""
+from __future__ import absolute_import
+
+import os
+import json
+import struct
+import hashlib
+import tempfile
+
+import numpy
+
+MAGIC = b"OBARR\x00\x01\x00"
+ALIGNMENT = 64
+
+
+# os.rename does not overwrite existing files on Windows
+_replace = getattr(os, "replace", os.rename)
+
+
+if str is bytes:
+    def native_str(data):
+        """Return utf-8 encoded `data` as a native `str`."""
+        return data
+else:
+    def native_str(data):
+        """Return utf-8 encoded `data` as a native `str`."""
+        return data.decode("utf-8")
+
+
+class FormatError(ValueError):
+    """Not a (compatible) array file."""
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save(filename, arrays, meta=None):
+    """
+    Save a dictionary of numpy `arrays` (and JSON serializable `meta`
+    data) to `filename`.
+
+    The file is first written to a temporary file in the same directory
+    and then renamed, so concurrent readers never see a partial file.
+
+    """
+    arrays = dict((name, numpy.ascontiguousarray(a))
+                  for name, a in arrays.items())
+    layout = {}
+    offset = 0
+    for name in sorted(arrays):
+        a = arrays[name]
+        layout[name] = {"dtype": a.dtype.str, "shape": list(a.shape),
+                        "offset": offset}
+        offset = _aligned(offset + a.nbytes)
+
+    header = json.dumps({"arrays": layout, "meta": meta}).encode("utf-8")
+    data_start = _aligned(len(MAGIC) + 4 + len(header))
+
+    dirname = os.path.dirname(os.path.abspath(filename))
+    fd, tmpname = tempfile.mkstemp(dir=dirname, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            for name in sorted(arrays):
+                f.seek(data_start + layout[name]["offset"])
+                f.write(arrays[name].tobytes())
+            f.truncate(data_start + offset)
+        _replace(tmpname, filename)
+    except BaseException:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+
+def load(filename, mmap=True):
+    """
+    Load the arrays saved with :func:`save`. Return a (meta, arrays)
+    tuple. If `mmap` is `True` the arrays are read-only memory maps
+    of the file.
+
+    """
+    with open(filename, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise FormatError("%r is not an array file" % filename)
+        header_len, = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_len).decode("utf-8"))
+        data_start = _aligned(len(MAGIC) + 4 + header_len)
+
+        arrays = {}
+        for name, desc in header["arrays"].items():
+            dtype = numpy.dtype(str(desc["dtype"]))
+            shape = tuple(desc["shape"])
+            offset = data_start + desc["offset"]
+            count = int(numpy.prod(shape))
+            if count == 0:
+                arrays[name] = numpy.zeros(shape, dtype=dtype)
+            elif mmap:
+                arrays[name] = numpy.memmap(f, dtype=dtype, mode="r",
+                                            offset=offset, shape=shape)
+            else:
+                f.seek(offset)
+                arrays[name] = numpy.fromfile(
+                    f, dtype=dtype, count=count).reshape(shape)
+    return header["meta"], arrays
+
+
+def file_hash(filename, blocksize=2 ** 20):
+    """
+    Return the (hex) sha1 digest of the contents of `filename`.
+    """
+    sha1 = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(blocksize), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def pack_strings(strings):
+    """
+    Pack a sequence of strings into a (data, offsets) pair of arrays
+    where `data` holds the concatenated utf-8 encoded strings and the
+    i-th string is ``data[offsets[i]:offsets[i + 1]]``.
+    """
+    encoded = [s if isinstance(s, bytes) else s.encode("utf-8")
+               for s in strings]
+    offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.int64)
+    offsets[1:] = numpy.cumsum([len(s) for s in encoded])
+    data = numpy.frombuffer(b"".join(encoded), dtype=numpy.uint8)
+    return data, offsets
+
+
+class StringArray(object):
+    """
+    A read only sequence of strings packed with :func:`pack_strings`.
+    The strings are only decoded on access.
+    """
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return native_str(self.data[start:end].tobytes())
+
+    def __iter__(self):
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield native_str(data[start:end])
+
+    def tolist(self):
+        return list(self)
+
+
+def save_strings(arrays, name, strings):
+    """
+    Pack `strings` into `arrays` dict (as `name` and `name + "_offsets"`).
+    """
+    arrays[name], arrays[name + "_offsets"] = pack_strings(strings)
+
+
+def load_strings(arrays, name):
+    """
+    Return a :class:`StringArray` for `name` saved with
+    :func:`save_strings`.
+    """
+    return StringArray(arrays[name], arrays[name + "_offsets"])
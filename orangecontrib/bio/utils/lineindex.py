@@ -0,0 +1,204 @@
+"""
+An index of lines in a tab separated text file keyed by one of its
+columns.
+
+The index (sorted keys, byte offsets and lengths of lines and optionally
+the values of some other columns) is stored in an array file next to the
+indexed file and memory mapped on load, so opening an indexed file takes
+constant time and only the requested lines are read and parsed.
+
+"""
+from __future__ import absolute_import
+
+import os
+import mmap
+from bisect import bisect_left
+
+import numpy
+
+from . import arrayfile
+
+#: Version of the index file format
+VERSION = 1
+
+
+def index_filename(filename):
+    """Return the name of the index file for `filename`."""
+    return filename + ".idx"
+
+
+def _source_meta(filename):
+    st = os.stat(filename)
+    return {"source_size": st.st_size, "source_mtime": int(st.st_mtime)}
+
+
+def _map_file(filename):
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class LineIndex(object):
+    """
+    An index of (non comment) lines in `filename` keyed by values in the
+    `key_column`. If a key is repeated the last line is indexed.
+
+    Use :func:`LineIndex.open` to load (or build) an index.
+
+    :param str filename: Indexed file name.
+    :param dict arrays: Index arrays (see :func:`LineIndex.build`).
+    :param int key_column: Key column index.
+    :param list columns: Indices of columns whose values are stored in
+        the index.
+
+    """
+    def __init__(self, filename, arrays, key_column, columns=()):
+        self.filename = filename
+        self.key_column = key_column
+        self.columns = list(columns)
+        self.keys = arrayfile.load_strings(arrays, "keys")
+        self.starts = arrays["starts"]
+        self.lengths = arrays["lengths"]
+        self._arrays = arrays
+        self._data = None
+        self._keys_array = None
+        self._column_lists = {}
+
+    @classmethod
+    def build(cls, filename, key_column, columns=()):
+        """
+        Scan `filename` and return the index arrays.
+        """
+        keys, starts, lengths = [], [], []
+        values = [[] for _ in columns]
+        offset = 0
+        with open(filename, "rb") as f:
+            for line in f:
+                start = offset
+                offset += len(line)
+                line = line.rstrip(b"\r\n")
+                if not line.strip() or line.startswith(b"#"):
+                    continue
+                fields = line.split(b"\t")
+                keys.append(fields[key_column])
+                starts.append(start)
+                lengths.append(len(line))
+                for col, vals in zip(columns, values):
+                    vals.append(fields[col] if col < len(fields) else b"-")
+
+        keys_array = numpy.empty(len(keys), dtype=object)
+        keys_array[:] = keys
+        order = numpy.argsort(keys_array, kind="mergesort")
+        keys_array = keys_array[order]
+        # keep the last of repeated keys
+        last = numpy.ones(len(order), dtype=bool)
+        last[:-1] = keys_array[1:] != keys_array[:-1]
+        order = order[last]
+
+        arrays = {"starts": numpy.array(starts, dtype=numpy.int64)[order],
+                  "lengths": numpy.array(lengths, dtype=numpy.int64)[order]}
+        arrayfile.save_strings(arrays, "keys", keys_array[last])
+        for col, vals in zip(columns, values):
+            arrayfile.save_strings(arrays, "column_%i" % col,
+                                   [vals[i] for i in order])
+        return arrays
+
+    @classmethod
+    def open(cls, filename, key_column, columns=()):
+        """
+        Return a :class:`LineIndex` for `filename`. The index is loaded
+        from the index file if it is up to date; otherwise it is built
+        and saved (if possible).
+        """
+        columns = list(columns)
+        meta = dict(_source_meta(filename), version=VERSION,
+                    key_column=key_column, columns=columns)
+        idxname = index_filename(filename)
+        try:
+            saved_meta, arrays = arrayfile.load(idxname)
+            if saved_meta != meta:
+                raise arrayfile.FormatError("Outdated index")
+        except Exception:
+            arrays = cls.build(filename, key_column, columns)
+            try:
+                arrayfile.save(idxname, arrays, meta=meta)
+            except (IOError, OSError):
+                pass
+        return cls(filename, arrays, key_column, columns)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def __contains__(self, key):
+        return self.position(key) >= 0
+
+    def position(self, key):
+        """Return the position of `key` in :obj:`keys` (or -1)."""
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return i
+        return -1
+
+    def positions(self, keys):
+        """
+        Return an array of positions of `keys` in :obj:`keys` (-1 for
+        missing keys).
+        """
+        if self._keys_array is None:
+            self._keys_array = numpy.array(list(self.keys), dtype=object)
+        all_keys = self._keys_array
+        keys_ = numpy.empty(len(keys), dtype=object)
+        keys_[:] = keys
+        if not len(all_keys):
+            return numpy.full(len(keys_), -1, dtype=int)
+        pos = numpy.searchsorted(all_keys, keys_)
+        pos[pos == len(all_keys)] = 0
+        return numpy.where(all_keys[pos] == keys_, pos, -1)
+
+    def line_at(self, i):
+        """Return the i-th indexed line (in :obj:`keys` order)."""
+        if self._data is None:
+            self._data = _map_file(self.filename)
+        start = int(self.starts[i])
+        return arrayfile.native_str(
+            self._data[start:start + int(self.lengths[i])])
+
+    def line(self, key):
+        """Return the line for `key`. Raise KeyError if not found."""
+        i = self.position(key)
+        if i < 0:
+            raise KeyError(key)
+        return self.line_at(i)
+
+    def column(self, col):
+        """
+        Return a sequence of values in the (stored) column `col` in
+        :obj:`keys` order.
+        """
+        return arrayfile.load_strings(self._arrays, "column_%i" % col)
+
+    def column_values(self, col, keys, default=None):
+        """
+        Return a list of values in the stored column `col` for `keys`
+        (`default` for missing keys).
+        """
+        if col not in self._column_lists:
+            self._column_lists[col] = self.column(col).tolist()
+        values = self._column_lists[col]
+        return [values[i] if i >= 0 else default
+                for i in self.positions(keys).tolist()]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # the file map and decoded caches are recreated when needed
+        state.update(_data=None, _keys_array=None, _column_lists={})
+        return state
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = None
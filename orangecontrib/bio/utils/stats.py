@@ -2,6 +2,8 @@ import math
 import threading
 import six
 
+import numpy
+
 
 def _lngamma(z):
     x = 0
@@ -18,9 +20,103 @@ def _lngamma(z):
     return math.log(x) - 5.58106146679532777 - z + (z - 0.5) * math.log(z + 6.5)
         
 
+def _segment_ranges(start, stop):
+    """
+    Flatten the integer ranges ``[start[i], stop[i])`` into one array.
+
+    Return a tuple ``(values, offsets)`` where ``offsets`` are the
+    positions at which each (non empty) range starts in ``values``.
+
+    """
+    lengths = stop - start
+    offsets = numpy.cumsum(lengths) - lengths
+    values = numpy.arange(lengths.sum()) - numpy.repeat(offsets - start, lengths)
+    return values, offsets
+
+
+def _segment_logsumexp(values, offsets):
+    """
+    Return ``log(sum(exp(values)))`` for each segment of `values` starting
+    at `offsets` (all segments must be non empty).
+    """
+    lengths = numpy.diff(numpy.append(offsets, len(values)))
+    vmax = numpy.maximum.reduceat(values, offsets)
+    s = numpy.add.reduceat(numpy.exp(values - numpy.repeat(vmax, lengths)),
+                           offsets)
+    return vmax + numpy.log(s)
+
+
+#: Reductions supported by :func:`group_reduce`
+GROUP_REDUCTIONS = ("mean", "median", "min", "max")
+
+
+def group_reduce(X, groups, how="mean", ngroups=None):
+    """
+    Reduce the rows of `X` in groups ignoring the unknown (NaN) values.
+
+    Return an array whose i-th row is the `how` ("mean", "median", "min"
+    or "max") of the rows of `X` with ``groups == i``. The result is NaN
+    where a group has no known values.
+
+    :param X: A 1 or 2 dimensional array.
+    :param groups: Group index (a non negative integer) for each row.
+    :param str how: The reduction.
+    :param int ngroups: Number of groups (default ``max(groups) + 1``).
+
+    """
+    if how not in GROUP_REDUCTIONS:
+        raise ValueError("Unknown reduction %r" % (how,))
+    X = numpy.asarray(X, dtype=float)
+    groups = numpy.asarray(groups, dtype=int)
+    if ngroups is None:
+        ngroups = groups.max() + 1 if len(groups) else 0
+    shape = (ngroups,) + X.shape[1:]
+    X = X.reshape((X.shape[0], int(numpy.prod(X.shape[1:]))))
+
+    # sort the rows by group once; each group is then a segment of rows
+    order = numpy.argsort(groups, kind="mergesort")
+    X, groups = X[order], groups[order]
+    counts = numpy.bincount(groups, minlength=ngroups)
+    nonempty = counts > 0
+    offsets = (numpy.cumsum(counts) - counts)[nonempty]
+
+    result = numpy.full((ngroups, X.shape[1]), numpy.nan)
+    if not len(offsets) or not X.shape[1]:
+        return result.reshape(shape)
+
+    known = ~numpy.isnan(X)
+    nknown = numpy.add.reduceat(known.astype(int), offsets)
+    if how == "mean":
+        sums = numpy.add.reduceat(numpy.where(known, X, 0), offsets)
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            values = sums / nknown
+    elif how == "min":
+        values = numpy.minimum.reduceat(
+            numpy.where(known, X, numpy.inf), offsets)
+    elif how == "max":
+        values = numpy.maximum.reduceat(
+            numpy.where(known, X, -numpy.inf), offsets)
+    else:
+        # sort the values within groups (NaN are sorted last) and take
+        # the middle known value(s) of each segment
+        by_value = numpy.argsort(X, axis=0, kind="mergesort")
+        by_group = numpy.argsort(groups[by_value], axis=0, kind="mergesort")
+        rows = numpy.take_along_axis(by_value, by_group, axis=0)
+        sorted_X = numpy.take_along_axis(X, rows, axis=0)
+        starts = offsets[:, numpy.newaxis]
+        low = starts + numpy.maximum(nknown - 1, 0) // 2
+        high = starts + nknown // 2
+        values = (numpy.take_along_axis(sorted_X, low, axis=0) +
+                  numpy.take_along_axis(sorted_X, high, axis=0)) / 2
+    values[nknown == 0] = numpy.nan
+    result[nonempty] = values
+    return result.reshape(shape)
+
+
 class LogBin(object):
     _max = 2
     _lookup = [0.0, 0.0]
+    _lookup_array = numpy.array(_lookup)
     _max_factorial = 1
     _lock = threading.Lock()
 
@@ -55,6 +151,89 @@ class LogBin(object):
         else:
             return _lngamma(n + 1)
 
+    @staticmethod
+    def _logfactorials(max):
+        """
+        Return the (shared) log factorial table as a numpy array with
+        at least `max` + 1 elements.
+        """
+        LogBin._extend(max + 1)
+        with LogBin._lock:
+            if len(LogBin._lookup_array) < max + 1:
+                LogBin._lookup_array = numpy.array(LogBin._lookup)
+            return LogBin._lookup_array
+
+    def _logbin_array(self, n, k):
+        """
+        Vectorized :func:`_logbin` (`n` and `k` must satisfy 0 <= k <= n).
+        """
+        lf = self._logfactorials(int(numpy.max(n, initial=0)))
+        return lf[n] - lf[n - k] - lf[k]
+
+    def _support(self, N, m, n):
+        """
+        Return the (inclusive) bounds of the distribution's support.
+        """
+        raise NotImplementedError
+
+    def _log_pmf(self, k, N, m, n):
+        """
+        Vectorized log of :func:`__call__` for `k` within the support.
+        """
+        raise NotImplementedError
+
+    def _log_tail(self, rows, start, stop, N, m, n):
+        """
+        Return the log of the probability mass in ``[start, stop)`` for
+        each of the `rows` (the ranges must be non empty).
+        """
+        k, offsets = _segment_ranges(start, stop)
+        lengths = stop - start
+        rows = numpy.repeat(rows, lengths)
+        logp = self._log_pmf(k, N[rows], m[rows], n[rows])
+        return _segment_logsumexp(logp, offsets)
+
+    def p_values(self, k, N, m, n):
+        """
+        Vectorized :func:`p_value`. Return an array of probabilities that
+        `k` or more tests are positive for all (`k`, `N`, `m`, `n`)
+        (the arguments are broadcast against each other).
+
+        The tails are computed in a single pass over all rows using a shared
+        log factorial table and log-sum-exp.
+
+        """
+        k, N, m, n = numpy.broadcast_arrays(
+            *[numpy.asarray(a, dtype=numpy.int64) for a in (k, N, m, n)])
+        shape = k.shape
+        k, N, m, n = k.ravel(), N.ravel(), m.ravel(), n.ravel()
+
+        lo, hi = self._support(N, m, n)
+        p = numpy.where(k <= lo, 1.0, 0.0)
+        inner = (k > lo) & (k <= hi)
+
+        # Sum the shorter of the two tails.
+        upper = inner & (hi - k + 1 <= k - lo)
+        lower = inner & ~upper
+
+        if numpy.any(lower):
+            rows = numpy.flatnonzero(lower)
+            value = 1.0 - numpy.exp(
+                self._log_tail(rows, lo[rows], k[rows], N, m, n))
+            # If the value is small it is probably inexact due to the
+            # limited precision of floats (1 - (1 - 1e-20) -> 0), so
+            # compute those without subtraction.
+            inexact = value < 1e-3
+            p[rows] = value
+            upper[rows[inexact]] = True
+
+        if numpy.any(upper):
+            rows = numpy.flatnonzero(upper)
+            p[rows] = numpy.exp(
+                self._log_tail(rows, k[rows], hi[rows] + 1, N, m, n))
+
+        return numpy.clip(p, 0.0, 1.0).reshape(shape)
+
 class Binomial(LogBin):
     """ `Binomial distribution 
     <http://en.wikipedia.org/wiki/Binomial_distribution>`_ is a discrete
@@ -102,6 +281,21 @@ class Binomial(LogBin):
             else:
                 return value
 
+    def _support(self, N, m, n):
+        # with p == 0 (or p == 1) all the mass is at k == 0 (or k == n)
+        lo = numpy.where(m >= N, n, 0)
+        hi = numpy.where(m <= 0, 0, n)
+        return lo, hi
+
+    def _log_pmf(self, k, N, m, n):
+        p = 1.0 * m / N
+        degenerate = (p <= 0.0) | (p >= 1.0)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            logp = (self._logbin_array(n, k) + k * numpy.log(p) +
+                    (n - k) * numpy.log(1.0 - p))
+        return numpy.minimum(numpy.where(degenerate, 0.0, logp), 0.0)
+
+
 class Hypergeometric(LogBin):
     """ `Hypergeometric distribution
     <http://en.wikipedia.org/wiki/Hypergeometric_distribution>`_ is
@@ -144,14 +338,144 @@ class Hypergeometric(LogBin):
             else:
                 return value
 
-## to speed-up FDR, calculate ahead sum([1/i for i in range(1, m+1)]), for m in [1,100000]. For higher values of m use an approximation, with error less or equal to 4.99999157277e-006. (sum([1/i for i in range(1, m+1)])  ~ log(m) + 0.5772..., 0.5572 is an Euler-Mascheroni constant) 
-c = [1.0]
-for m in range(2, 100000):
-    c.append( c[-1] + 1.0/m)
+    def _support(self, N, m, n):
+        return numpy.maximum(0, n + m - N), numpy.minimum(n, m)
+
+    def _log_pmf(self, k, N, m, n):
+        logp = (self._logbin_array(m, k) + self._logbin_array(N - m, n - k) -
+                self._logbin_array(N, n))
+        return numpy.minimum(logp, 0.0)
+
+
+def p_values(prob, k, N, m, n):
+    """
+    Return an array of `prob`'s p-values for all (`k`, `N`, `m`, `n`).
+
+    Uses the vectorized :func:`LogBin.p_values` if `prob` supports it
+    and falls back to calling `prob.p_value` for each element otherwise.
+
+    """
+    if hasattr(prob, "p_values"):
+        return prob.p_values(k, N, m, n)
+    k, N, m, n = numpy.broadcast_arrays(k, N, m, n)
+    return numpy.array([prob.p_value(*args)
+                        for args in zip(k.ravel(), N.ravel(),
+                                        m.ravel(), n.ravel())],
+                       dtype=float).reshape(k.shape)
+
+EULER_MASCHERONI = 0.57721566490153286060651209008240243104215933593992
+
+
+def harmonic_number(m):
+    """
+    Return ``sum([1.0/i for i in range(1, m+1)])``.
+
+    For m >= 100000 the approximation ``log(m) + 0.5772...`` (0.5772... is
+    the Euler-Mascheroni constant) is used, with an error less or equal
+    to 4.99999157277e-006.
+    """
+    if m < 100000:
+        return float(numpy.cumsum(1.0 / numpy.arange(1, m + 1))[-1])
+    else:
+        return math.log(m) + EULER_MASCHERONI
+
 
 def is_sorted(l):
     return all(l[i] <= l[i+1] for i in range(len(l)-1))
 
+
+def _step_up(p_values, m, ordered=False):
+    """
+    Return ``min(p[j] * m / (j + 1) for j >= i)`` for each i-th smallest
+    p-value (in the original order of `p_values`, unless `ordered`).
+    """
+    if not ordered:
+        order = numpy.argsort(p_values, kind="mergesort")
+        p_values = p_values[order]
+    q = p_values * m / numpy.arange(1.0, len(p_values) + 1)
+    q = numpy.minimum.accumulate(q[::-1])[::-1]
+    if not ordered:
+        q[order] = q.copy()
+    return q
+
+
+def _array_correction(p_values, m):
+    p_values = numpy.asarray(p_values, dtype=float)
+    if not m:
+        m = len(p_values)
+    return p_values, m
+
+
+def benjamini_hochberg(p_values, m=None):
+    """
+    Benjamini-Hochberg FDR adjusted p-values as an array.
+
+    :param p_values: an array of p-values.
+    :param m: number of hypotheses tested (default ``len(p_values)``).
+    """
+    p_values, m = _array_correction(p_values, m)
+    return numpy.minimum(_step_up(p_values, m), 1.0)
+
+
+def benjamini_yekutieli(p_values, m=None):
+    """
+    Benjamini-Yekutieli FDR adjusted p-values (for dependent
+    hypotheses) as an array.
+
+    :param p_values: an array of p-values.
+    :param m: number of hypotheses tested (default ``len(p_values)``).
+    """
+    p_values, m = _array_correction(p_values, m)
+    if m == 0:
+        return p_values.copy()
+    return numpy.minimum(_step_up(p_values, m * harmonic_number(m)), 1.0)
+
+
+def bonferroni(p_values, m=None):
+    """
+    Bonferroni adjusted p-values (``min(p * m, 1)``) as an array.
+
+    :param p_values: an array of p-values.
+    :param m: number of hypotheses tested (default ``len(p_values)``).
+    """
+    p_values, m = _array_correction(p_values, m)
+    return numpy.minimum(p_values * m, 1.0)
+
+
+def holm(p_values, m=None):
+    """
+    Holm-Bonferroni (step-down) adjusted p-values as an array.
+
+    :param p_values: an array of p-values.
+    :param m: number of hypotheses tested (default ``len(p_values)``).
+    """
+    p_values, m = _array_correction(p_values, m)
+    order = numpy.argsort(p_values, kind="mergesort")
+    q = p_values[order] * (m - numpy.arange(len(p_values)))
+    q = numpy.minimum(numpy.maximum.accumulate(q), 1.0)
+    adjusted = numpy.empty_like(q)
+    adjusted[order] = q
+    return adjusted
+
+
+def storey(p_values, m=None, lambda_=0.5):
+    """
+    Storey q-values as an array.
+
+    The proportion of true null hypotheses is estimated as
+    ``#(p > lambda_) / (m * (1 - lambda_))`` (at most 1).
+
+    :param p_values: an array of p-values.
+    :param m: number of hypotheses tested (default ``len(p_values)``).
+    :param float lambda_: tuning parameter of the estimate.
+    """
+    p_values, m = _array_correction(p_values, m)
+    if m == 0:
+        return p_values.copy()
+    pi0 = min(numpy.count_nonzero(p_values > lambda_) / (m * (1.0 - lambda_)), 1.0)
+    return numpy.minimum(_step_up(p_values, pi0 * m), 1.0)
+
+
 def FDR(p_values, dependent=False, m=None, ordered=False):
     """
     `False Discovery Rate <http://en.wikipedia.org/wiki/False_discovery_rate>`_ correction on a list of p-values.
@@ -160,41 +484,21 @@ def FDR(p_values, dependent=False, m=None, ordered=False):
     :param dependent: use correction for dependent hypotheses (default False).
     :param m: number of hypotheses tested (default ``len(p_values)``).
     :param ordered: prevent sorting of p-values if they are already sorted (default False).
-    """
-
-    if not ordered:
-        ordered = is_sorted(p_values)
-
-    if not ordered:
-        joined = [ (v,i) for i,v in enumerate(p_values) ]
-        joined.sort()
-        p_values = [ p[0] for p in joined ]
-        indices = [ p[1] for p in joined ]
 
+    Unlike :func:`benjamini_hochberg` and :func:`benjamini_yekutieli` the
+    values are not limited to 1.
+    """
     if not m:
         m = len(p_values)
-    if m <= 0 or not p_values:
+    if m <= 0 or len(p_values) == 0:
         return []
 
     if dependent: # correct q for dependent tests
-        k = c[m-1] if m <= len(c) else math.log(m) + 0.57721566490153286060651209008240243104215933593992
-        m = m * k
-
-    tmp_fdrs = [p*m/(i+1.0) for (i, p) in enumerate(p_values)]
-    fdrs = []
-    cmin = tmp_fdrs[-1]
-    for f in reversed(tmp_fdrs):
-        cmin = min(f, cmin)
-        fdrs.append( cmin)
-    fdrs.reverse()
+        m = m * harmonic_number(m)
 
-    if not ordered:
-        new = [ None ] * len(fdrs)
-        for v,i in zip(fdrs, indices):
-            new[i] = v
-        fdrs = new
+    return _step_up(numpy.asarray(p_values, dtype=float), m,
+                    ordered=ordered).tolist()
 
-    return fdrs
 
 def Bonferroni(p_values, m=None):
     """
@@ -15,6 +15,17 @@ if len(sys.argv) <= 1 or len(sys.argv) > 1 and "remove" not in sys.argv[1]:
         print ex
         pass
 
+    # GEO DataSets given on the command line are downloaded and converted
+    # into the binary cache for fast loading
+    gdsnames = [arg for arg in sys.argv[1:] if arg.startswith("GDS")]
+    if gdsnames:
+        print "Caching GEO DataSets:", ", ".join(gdsnames)
+        from orangecontrib.bio import geo
+        failed = geo.cache_datasets(
+            gdsnames, merge_functions=geo.CACHED_MERGE_FUNCTIONS.values())
+        if failed:
+            print "Could not cache:", ", ".join(failed)
+
     print "To download and/or update the databases needed by Orange"
     print "Bioinformatics please use the \"Update Genomics Databases\""
     print "widget in Orange Canvas or use the orngServerFiles module:"
@@ -4,7 +4,7 @@ import sys
 import os.path
 
 def usage():
-   print "%s geo-file-name orange-file-name" % os.path.basename(sys.argv[0])
+   print "%s (geo-file-name | GDS id) orange-file-name" % os.path.basename(sys.argv[0])
 
 if len(sys.argv)<>3:
    usage()
@@ -73,6 +73,15 @@ def geo_process_file(inname, choice=None):
       
    return subsets
 
+if re.match(r"GDS\d+$", inname) and not os.path.exists(inname):
+   # a GEO DataSet id; use (and fill) the binary cache of parsed data sets
+   from orangecontrib.bio import geo
+   print "Processing: %s" % inname
+   data = geo.GDS(inname).getdata(transpose=True)
+   print "Saving to:  %s" % outname
+   data.save(outname)
+   sys.exit(0)
+
 #rawdata, geneids = geo_process_file(inname, ['tumor grade IV', 'tumor grade II', 'tumor grade III'])
 #rawdata, geneids, classification = geo_process_file("GDS330.soft.txt")
 rawdata, geneids, classification = geo_process_file(inname)